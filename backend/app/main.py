@@ -1,12 +1,92 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, nullcontext
+import asyncio
+import logging
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv; import os
-from app.routers import recommendations, analytics
 load_dotenv()
-app = FastAPI(title="AI-ML Product Recommendation API", version="0.1.0")
+from app.routers import recommendations, analytics, admin
+from app.services import metrics
+logger = logging.getLogger(__name__)
+
+def load_state():
+    """Load the catalog, indexes and models; runs off the event loop after startup"""
+    try:
+        recommendations.init_models()
+        snap = recommendations.snapshot
+        analytics.load_dataset(snap.base_version if snap is not None else None)
+        admin.replay_changelog()
+        admin.watch_changelog()
+        admin.watch_catalog_file()
+        admin.watch_shared_state()
+    except Exception as e:
+        app.state.startup_error = str(e)
+        logger.error(f"Error loading application state: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve /health immediately; /ready flips once the background load finishes
+    app.state.startup_error = None
+    app.state.loader = asyncio.create_task(asyncio.to_thread(load_state))
+    yield
+    await recommendations.close_vector_store()
+    recommendations.close_description_service()
+    recommendations.close_image_search()
+
+app = FastAPI(title="AI-ML Product Recommendation API", version="0.1.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"])
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Record latency per route template and report stage timings in a Server-Timing header.
+
+    With PROFILER_ENABLED=1, a request sent with "X-Profile: 1" is sampled and
+    answered with the profile report instead of its normal body.
+    """
+    spans = []
+    token = metrics.request_spans.set(spans)
+    profiling = os.getenv('PROFILER_ENABLED') == '1' and request.headers.get('X-Profile') == '1'
+    profiler = metrics.SamplingProfiler(float(os.getenv('PROFILER_INTERVAL_MS', '1')) / 1000.0) if profiling else None
+    start = time.perf_counter()
+    status = 500
+    try:
+        with profiler or nullcontext():
+            response = await call_next(request)
+        status = response.status_code
+    except Exception as e:
+        metrics.errors_total.inc(route=_route_name(request), type=type(e).__name__)
+        raise
+    finally:
+        metrics.request_spans.reset(token)
+        elapsed = time.perf_counter() - start
+        route = _route_name(request)
+        metrics.request_duration.observe(elapsed, method=request.method, route=route)
+        metrics.requests_total.inc(method=request.method, route=route, status=str(status))
+
+    timing = metrics.server_timing(spans, elapsed)
+    if profiler is not None:
+        return PlainTextResponse(profiler.report(), headers={"Server-Timing": timing})
+    response.headers["Server-Timing"] = timing
+    return response
+
+def _route_name(request):
+    # The route template, not the raw path, so /similar/{uniq_id} is one series
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
 app.include_router(recommendations.router, prefix="/api")
 app.include_router(analytics.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 @app.get("/health")
 def health(): return {"status":"ok"}
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text format: latency histograms per route and stage, candidate counts, caches, dataset size"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+@app.get("/ready")
+def ready():
+    if recommendations.is_ready() and analytics.is_ready(): return {"status":"ready"}
+    status = "error" if app.state.startup_error else "loading"
+    return JSONResponse(status_code=503, content={"status":status, "detail":app.state.startup_error})
@@ -1,10 +1,44 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-class ChatRequest(BaseModel): message: str; top_k: int = 5
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional, Dict, Any
+class ChatRequest(BaseModel):
+    message: str; top_k: int = 5
+    # Optional cursor pagination; top_k <= 0 pages through every match
+    page_size: Optional[int] = Field(None, gt=0, le=1000); cursor: Optional[str] = None
+    # Structured filters; they override constraints parsed from the message ("under $50", "in white")
+    min_price: Optional[float] = Field(None, ge=0); max_price: Optional[float] = Field(None, ge=0)
+    brand: Optional[List[str]] = None; material: Optional[List[str]] = None
+    color: Optional[List[str]] = None; country_of_origin: Optional[List[str]] = None
+    category: Optional[List[str]] = None; parse_filters: bool = True
+    # Retrieval: auto (semantic when embeddings are loaded), keyword, semantic, or hybrid (both, fused);
+    # unset fields use the server defaults (SEARCH_MODE, HYBRID_FUSION, HYBRID_*_WEIGHT)
+    search_mode: Optional[Literal['auto', 'keyword', 'semantic', 'hybrid']] = None
+    fusion: Optional[Literal['rrf', 'weighted']] = None
+    keyword_weight: Optional[float] = Field(None, ge=0); semantic_weight: Optional[float] = Field(None, ge=0)
 class Product(BaseModel):
     uniq_id: str; title: str
     brand: Optional[str] = None; description: Optional[str] = None
     price: Optional[float] = None; categories: Optional[List[str]] = None
     image: Optional[str] = None; score: Optional[float] = None
     extra: Optional[Dict[str, Any]] = None
-class ChatResponse(BaseModel): query: str; recommendations: List[Product]
\ No newline at end of file
+class ChatResponse(BaseModel):
+    query: str; recommendations: List[Product]
+    next_cursor: Optional[str] = None; filters: Optional[Dict[str, Any]] = None
+class SimilarProductsResponse(BaseModel):
+    # source: "table" (precomputed neighbors), "vector" or "keyword" for products added since
+    uniq_id: str; recommendations: List[Product]; source: str
+class ImageSearchResponse(BaseModel): recommendations: List[Product]
+class BatchChatRequest(BaseModel): queries: List[ChatRequest]
+class BatchChatResponse(BaseModel): results: List[ChatResponse]
+class CatalogProduct(BaseModel):
+    # Fields left out of an upsert keep their current values
+    model_config = ConfigDict(extra='forbid')
+    uniq_id: str; title: Optional[str] = None
+    brand: Optional[str] = None; description: Optional[str] = None
+    price: Optional[float] = None; categories: Optional[List[str]] = None
+    images: Optional[List[str]] = None; manufacturer: Optional[str] = None
+    package_dimensions: Optional[str] = None; country_of_origin: Optional[str] = None
+    material: Optional[str] = None; color: Optional[str] = None
+class UpsertProductsRequest(BaseModel): products: List[CatalogProduct]
+class DeleteProductsRequest(BaseModel): uniq_ids: List[str]
+class IngestResponse(BaseModel):
+    version: str; upserted: int; deleted: int; products: int
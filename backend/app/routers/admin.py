@@ -0,0 +1,213 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from app.models.schemas import UpsertProductsRequest, DeleteProductsRequest, IngestResponse
+from app.routers import recommendations, analytics
+from app.services.catalog import catalog_fingerprint, load_catalog
+from app.services.shared_state import current_generation
+from app.services.snapshot import append_changelog, changelog_version, locked_changelog, read_changelog
+from typing import Optional
+import numpy as np
+import hmac
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Catalog changes are applied one at a time; readers never wait on them
+ingest_lock = threading.Lock()
+# Bytes of the changelog this worker has applied or skipped; guarded by ingest_lock
+changelog_offset = 0
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints stay disabled unless ADMIN_API_TOKEN is set"""
+    token = os.getenv('ADMIN_API_TOKEN')
+    if not token:
+        raise HTTPException(status_code=403, detail="Admin API disabled")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+def changelog_path():
+    return os.getenv('CATALOG_CHANGELOG_PATH', 'catalog_changes.jsonl')
+
+def _apply(current, upserts, deletes, version):
+    encode = recommendations.encode_texts if current.vector_engine is not None else None
+    return current.apply(upserts, deletes, encode=encode, version=version)
+
+def _swap(current, upserts, deletes, version):
+    """Build the next snapshot from current and swap it in; call under ingest_lock"""
+    updated = _apply(current, upserts, deletes, version)
+    recommendations.set_snapshot(updated)
+    removed = np.flatnonzero(current.live & ~updated.live[:len(current.live)])
+    analytics.apply_changes(current.rows(removed), updated.added.iloc[len(current.added):], version)
+    logger.info(f"Catalog {version}: {len(upserts)} upserted, {len(deletes)} deleted, {len(updated)} products")
+    return updated
+
+def catch_up():
+    """Apply changelog entries appended since this worker last read it (by other
+    workers, or before a restart); call under ingest_lock"""
+    global changelog_offset
+    snap = recommendations.snapshot
+    if snap is None:
+        return
+    upserts, deletes, last, changelog_offset = read_changelog(changelog_path(), snap.base_version,
+                                                              changelog_offset)
+    if last is not None:
+        _swap(snap, upserts, deletes, changelog_version(snap.base_version, last))
+
+def apply_changes(upserts, deletes):
+    """Record a change in the changelog and swap in the snapshot it produces.
+
+    Returns (snapshot, number of products deleted). Under the changelog lock,
+    changes other workers made first are applied, so every worker folds the
+    same entries in the same order. Versions are named by changelog offset,
+    so they mean the same catalog in every worker. Unknown deletes are
+    dropped, and a change left empty records nothing. The new snapshot is
+    built from the current one without touching it, so requests keep serving
+    the old catalog until the swap.
+    """
+    global changelog_offset
+    with ingest_lock, locked_changelog(changelog_path()) as log:
+        catch_up()
+        current = recommendations.snapshot
+        if current is None or not analytics.is_ready():
+            raise HTTPException(status_code=503, detail="Catalog not loaded")
+        deletes = [uniq_id for uniq_id in dict.fromkeys(deletes) if uniq_id in current.position_by_id]
+        if not upserts and not deletes:
+            return current, 0
+        for update in upserts:
+            if update['uniq_id'] not in current.position_by_id and not update.get('title'):
+                raise HTTPException(status_code=422, detail=f"New product {update['uniq_id']} needs a title")
+
+        offset = append_changelog(log, current.base_version, upserts, deletes)
+        changelog_offset = log.tell()
+        return _swap(current, upserts, deletes, changelog_version(current.base_version, offset)), len(deletes)
+
+def replay_changelog():
+    """Re-apply every change recorded against the loaded catalog, e.g. after a restart"""
+    global changelog_offset
+    with ingest_lock:
+        changelog_offset = 0
+        catch_up()
+
+def _serve_replayed(attach):
+    """Serve the snapshot attach(prepare) builds with its catalog's recorded changes on top.
+
+    The changes are applied by prepare before the snapshot is swapped in, so
+    requests never see it without them; call under ingest_lock, so no ingest
+    lands between the replay and the swap. Analytics gets the same catalog.
+    """
+    global changelog_offset
+    read_to, changes = 0, None
+
+    def replay(built):
+        nonlocal read_to, changes
+        upserts, deletes, last, read_to = read_changelog(changelog_path(), built.base_version, 0)
+        if last is None:
+            return built
+        updated = _apply(built, upserts, deletes, changelog_version(built.base_version, last))
+        removed = np.flatnonzero(built.live & ~updated.live[:len(built.live)])
+        changes = (built.rows(removed), updated.added, updated.version)
+        return updated
+
+    snap = attach(replay)
+    changelog_offset = read_to
+    analytics.set_dataset(snap.df, snap.base_version, changes)
+    return snap
+
+def switch_generation(root, number):
+    """Serve a newly published shared build with this catalog's recorded changes on top"""
+    with ingest_lock:
+        _serve_replayed(lambda prepare: recommendations.attach_generation(root, number, prepare=prepare))
+
+def reload_catalog(path):
+    """Serve a changed catalog file in both routers; changes recorded against the old file are not replayed"""
+    with ingest_lock:
+        _serve_replayed(lambda prepare: recommendations.reload_catalog(path, prepare=prepare))
+
+def _poll(name, interval, check):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                check()
+            except Exception as e:
+                logger.error(f"Error in {name}: {e}")
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+def watch_changelog():
+    """Poll the changelog for changes ingested by other workers and apply them"""
+    def check():
+        path = changelog_path()
+        if os.path.exists(path) and os.path.getsize(path) > changelog_offset:
+            with ingest_lock:
+                catch_up()
+    _poll('changelog-watcher', float(os.getenv('CATALOG_CHANGELOG_POLL_SECONDS', '1')), check)
+
+def watch_catalog_file():
+    """Without SHARED_STATE_DIR, poll the catalog file's fingerprint and reload both routers when it changes"""
+    if os.getenv('SHARED_STATE_DIR'):
+        return
+
+    def check():
+        snap = recommendations.snapshot
+        _, path = load_catalog()
+        if snap is None or not os.path.exists(path) or catalog_fingerprint(path) == snap.base_version:
+            return
+        reload_catalog(path)
+    _poll('catalog-watcher', float(os.getenv('CATALOG_POLL_SECONDS', '5')), check)
+
+def watch_shared_state():
+    """With SHARED_STATE_DIR set, poll for newly published generations and switch to them.
+
+    Each worker polls on its own; until it switches it keeps serving the
+    generation it has mapped, whose files stay readable after pruning.
+    """
+    root = os.getenv('SHARED_STATE_DIR')
+    if not root:
+        return
+    failed = None
+
+    def check():
+        nonlocal failed
+        latest = current_generation(root)
+        if latest is None or latest in (recommendations.shared_generation, failed):
+            return
+        failed = latest
+        switch_generation(root, latest)
+        failed = None
+    _poll('shared-state-watcher', float(os.getenv('SHARED_STATE_POLL_SECONDS', '2')), check)
+
+def ingest_response(snap, upserted, deleted):
+    return IngestResponse(version=snap.version, upserted=upserted, deleted=deleted, products=len(snap))
+
+@router.post("/products", response_model=IngestResponse)
+def upsert_products(payload: UpsertProductsRequest):
+    """Add products or update fields of existing ones, matched by uniq_id"""
+    upserts = [product.model_dump(exclude_unset=True) for product in payload.products]
+    snap, _ = apply_changes(upserts, [])
+    return ingest_response(snap, len(upserts), 0)
+
+@router.post("/products/delete", response_model=IngestResponse)
+def delete_products(payload: DeleteProductsRequest):
+    """Delete products by uniq_id; unknown ids are ignored"""
+    snap, deleted = apply_changes([], payload.uniq_ids)
+    return ingest_response(snap, 0, deleted)
+
+@router.delete("/products/{uniq_id}", response_model=IngestResponse)
+def delete_product(uniq_id: str):
+    snap, deleted = apply_changes([], [uniq_id])
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return ingest_response(snap, 0, 1)
+
+@router.get("/catalog")
+def catalog_status():
+    """Current snapshot version and size; rows counts replaced and deleted rows until the next rebuild"""
+    snap = recommendations.snapshot
+    if snap is None:
+        raise HTTPException(status_code=503, detail="Catalog not loaded")
+    return {"version": snap.version, "base_version": snap.base_version,
+            "products": len(snap), "rows": len(snap.live)}
@@ -1,58 +1,198 @@
 from fastapi import APIRouter, HTTPException
 import pandas as pd
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional
+import logging
+import os
+import threading
+from collections import Counter
+from app.services.cache import LRUCache
+from app.services.catalog import catalog_fingerprint, load_catalog
+from app.services.categories import explode_categories, update_exploded, category_counts, category_breakdown
+from app.services.metrics import cache_gauges, registry, span
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
-# Global variable for dataset
+# Global variables for dataset and its precomputed aggregates
 df = None
+prices = None
+categories = None
+# The catalog fingerprint the recommendations snapshot is built from, or the snapshot version after an admin ingest
+dataset_version = None
+# Aggregate name -> dataset version it last changed at, part of its cache key, so an
+# ingest only invalidates the aggregates over columns it changed
+aggregate_versions = {}
+# Ingested changes not yet folded into df: row labels removed and frames of rows added
+pending_removed = []
+pending_added = []
+row_count = 0
+aggregates = LRUCache(maxsize=int(os.getenv('ANALYTICS_CACHE_SIZE', '256')))
+# Held while the dataset changes and while a missing aggregate computes, so none sees a half-updated dataset
+dataset_lock = threading.RLock()
+_missing = object()
+
+def _clean_prices(data):
+    """Numeric price series with missing values dropped, computed once per dataset version"""
+    # Use cleaned_price column if available, otherwise clean price column
+    if 'cleaned_price' in data.columns:
+        price = pd.to_numeric(data['cleaned_price'], errors='coerce')
+    else:
+        price = pd.to_numeric(data['price'].astype(str).str.replace('$', '').str.replace(',', ''), errors='coerce')
+    return price.dropna()
+
+def _aggregate_columns(data):
+    """Aggregate name -> the catalog columns it is computed from"""
+    price = 'cleaned_price' if 'cleaned_price' in data.columns else 'price'
+    category = 'parsed_categories' if 'parsed_categories' in data.columns else 'categories'
+    return {
+        "summary": ('brand', 'material', 'color', 'images', price),
+        "price-distribution": (price,),
+        "top-brands": ('brand',),
+        "top-categories": (category,),
+        "material-distribution": ('material',),
+        "color-distribution": ('color',),
+        "country-origin": ('country_of_origin',),
+        "price-by-category": (category, price),
+    }
+
+def _row_values(frame, columns):
+    return Counter(zip(*([str(value) for value in frame[column]] for column in columns)))
+
+def set_dataset(data, version, changes=None):
+    """Serve analytics over a new catalog; the recommendations router swaps in the same one.
+
+    changes are apply_changes() arguments for ingests already applied on top of it.
+    """
+    global df, prices, categories, dataset_version, row_count
+    with dataset_lock:
+        df = data
+        prices = _clean_prices(df)
+        categories = explode_categories(df)
+        dataset_version = version
+        aggregate_versions.clear()
+        aggregate_versions.update(dict.fromkeys(_aggregate_columns(df), version))
+        pending_removed.clear()
+        pending_added.clear()
+        row_count = len(df)
+        if changes is not None:
+            apply_changes(*changes)
+        aggregates.clear()
+        warm_aggregates()
+
+def apply_changes(removed, added, version):
+    """Record an admin ingest instead of reloading the dataset.
+
+    removed is a frame of the rows dropped, labelled by row, and added a frame
+    of new rows. Only aggregates whose columns hold different values in the
+    two get a new cache key; the dataset itself is patched when one of them
+    is next computed.
+    """
+    global dataset_version, row_count
+    with dataset_lock:
+        for name, columns in _aggregate_columns(added).items():
+            if _row_values(removed, columns) != _row_values(added, columns):
+                aggregate_versions[name] = version
+        pending_removed.extend(removed.index)
+        pending_added.append(added)
+        row_count += len(added) - len(removed)
+        dataset_version = version
+
+def _fold_pending():
+    """Patch df, prices and categories with the recorded ingests; call under dataset_lock.
 
-def load_dataset():
-    global df
+    Only the new rows have their prices and categories parsed.
+    """
+    global df, prices, categories
+    if not pending_added:
+        return
+    added = pd.concat(pending_added)
+    # Rows both added and removed since the last fold never reach df
+    added_labels = set(added.index)
+    added = added[~added.index.isin(pending_removed)]
+    removed = [label for label in pending_removed if label not in added_labels]
+    df = pd.concat([df.drop(index=removed), added])
+    prices = pd.concat([prices.drop(index=removed, errors='ignore'), _clean_prices(added)])
+    categories = update_exploded(categories, removed, explode_categories(added))
+    pending_removed.clear()
+    pending_added.clear()
+
+def load_dataset(version=None):
+    """Serve analytics over the shared catalog; version is the recommendations snapshot's
+    base version, so both routers key on the same catalog, else the file's fingerprint"""
     if df is None:
-        dataset_paths = [
-            '../data/furniture_dataset_processed.csv',
-            'data/furniture_dataset_processed.csv',
-            '../data/furniture_dataset_cleaned.csv',
-            'data/furniture_dataset_cleaned.csv'
-        ]
-        for path in dataset_paths:
-            try:
-                df = pd.read_csv(path)
-                print(f"Loaded dataset from {path} with {len(df)} products")
-                break
-            except FileNotFoundError:
-                continue
-        else:
+        try:
+            # Shares the catalog loaded by the recommendations router
+            data, path = load_catalog()
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="Dataset not found")
+        set_dataset(data, catalog_fingerprint(path) if version is None else version)
+        logger.info(f"Loaded dataset from {path} with {len(df)} products")
 
-load_dataset()
+def is_ready():
+    return df is not None
 
-@router.get("/summary")
-def get_dataset_summary() -> Dict[str, Any]:
-    """Get basic dataset statistics"""
+@registry.gauges
+def collect_metrics():
+    """Dataset size and aggregate cache counters for /metrics"""
+    samples = cache_gauges("analytics", aggregates.stats())
+    if df is not None:
+        samples.append(("analytics_dataset_rows", "Rows in the analytics dataset", {}, row_count))
+    return samples
+
+def cached_aggregate(name, compute, *params):
+    """Serve an aggregate from the cache for the current dataset version.
+
+    Hits never take the lock; a miss computes under it so a concurrent
+    catalog change can't swap the dataset mid-computation.
+    """
     if df is None:
         raise HTTPException(status_code=500, detail="Dataset not loaded")
+    cached = aggregates.get(_aggregate_key(name, params), _missing)
+    if cached is not _missing:
+        return cached
 
-    # Use cleaned_price column if available, otherwise clean price column
-    df_clean = df.copy()
-    if 'cleaned_price' in df_clean.columns:
-        df_clean['price'] = df_clean['cleaned_price']
-    else:
-        df_clean['price'] = pd.to_numeric(df_clean['price'], errors='coerce')
-    df_clean = df_clean.dropna(subset=['price'])
+    def timed_compute():
+        _fold_pending()
+        with span(f"analytics_{name}"):
+            return compute(*params)
+    with dataset_lock:
+        return aggregates.get_or_compute(_aggregate_key(name, params), timed_compute)
+
+def _aggregate_key(name, params):
+    return (aggregate_versions[name], name) + params
+
+def warm_aggregates():
+    """Precompute the aggregates the Analytics page requests on load; call under dataset_lock"""
+    _fold_pending()
+    for name, compute, params in [
+        ("summary", _compute_summary, ()),
+        ("price-distribution", _compute_price_distribution, (20,)),
+        ("top-brands", _compute_top_brands, (10,)),
+        ("top-categories", _compute_top_categories, (15, None)),
+        ("material-distribution", _compute_material_distribution, ()),
+        ("color-distribution", _compute_color_distribution, ()),
+        ("country-origin", _compute_country_origin, ()),
+        ("price-by-category", _compute_price_by_category, (5, None)),
+    ]:
+        aggregates.set(_aggregate_key(name, params), compute(*params))
+
+@router.get("/summary")
+def get_dataset_summary() -> Dict[str, Any]:
+    """Get basic dataset statistics"""
+    return cached_aggregate("summary", _compute_summary)
 
+def _compute_summary():
     summary = {
         "total_products": len(df),
         "unique_brands": df['brand'].nunique(),
         "unique_materials": df['material'].nunique(),
         "unique_colors": df['color'].nunique(),
         "price_range": {
-            "min": float(df_clean['price'].min()) if not df_clean.empty else 0.0,
-            "max": float(df_clean['price'].max()) if not df_clean.empty else 0.0,
-            "mean": float(df_clean['price'].mean()) if not df_clean.empty else 0.0,
-            "median": float(df_clean['price'].median()) if not df_clean.empty else 0.0
+            "min": float(prices.min()) if not prices.empty else 0.0,
+            "max": float(prices.max()) if not prices.empty else 0.0,
+            "mean": float(prices.mean()) if not prices.empty else 0.0,
+            "median": float(prices.median()) if not prices.empty else 0.0
         },
         "products_with_images": int(df['images'].notnull().sum()),
         "image_percentage": float(df['images'].notnull().sum() / len(df) * 100)
@@ -62,21 +202,13 @@ def get_dataset_summary() -> Dict[str, Any]:
 @router.get("/price-distribution")
 def get_price_distribution(bins: int = 20) -> Dict[str, Any]:
     """Get price distribution data"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
-
-    # Use cleaned_price column if available, otherwise clean price column
-    df_clean = df.copy()
-    if 'cleaned_price' in df_clean.columns:
-        df_clean['price'] = df_clean['cleaned_price']
-    else:
-        df_clean['price'] = pd.to_numeric(df_clean['price'].astype(str).str.replace('$', '').str.replace(',', ''), errors='coerce')
-    df_clean = df_clean.dropna(subset=['price'])
+    return cached_aggregate("price-distribution", _compute_price_distribution, bins)
 
-    if df_clean.empty:
+def _compute_price_distribution(bins):
+    if prices.empty:
         return {"bins": [], "counts": [], "labels": []}
 
-    hist, bin_edges = pd.cut(df_clean['price'], bins=bins, retbins=True)
+    hist, bin_edges = pd.cut(prices, bins=bins, retbins=True)
     distribution = hist.value_counts().sort_index()
 
     return {
@@ -88,114 +220,60 @@ def get_price_distribution(bins: int = 20) -> Dict[str, Any]:
 @router.get("/top-brands")
 def get_top_brands(limit: int = 10) -> List[Dict[str, Any]]:
     """Get top brands by product count"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
+    return cached_aggregate("top-brands", _compute_top_brands, limit)
 
+def _compute_top_brands(limit):
     brand_counts = df['brand'].value_counts().head(limit)
     return [{"brand": brand, "count": int(count)} for brand, count in brand_counts.items()]
 
 @router.get("/top-categories")
-def get_top_categories(limit: int = 15) -> List[Dict[str, Any]]:
-    """Get top categories by frequency"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
+def get_top_categories(limit: int = 15, level: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get top categories by frequency, optionally at one hierarchy level (0 = root, -1 = leaf)"""
+    return cached_aggregate("top-categories", _compute_top_categories, limit, level)
 
-    all_categories = []
-    for idx, row in df.iterrows():
-        cats = row['categories']
-        if isinstance(cats, str):
-            # Try to parse string representation of list
-            if cats.startswith('[') and cats.endswith(']'):
-                try:
-                    parsed_cats = eval(cats)
-                    all_categories.extend(parsed_cats)
-                except:
-                    # If eval fails, split by comma
-                    all_categories.extend([cat.strip().strip("'\"") for cat in cats.strip('[]').split(',') if cat.strip()])
-            else:
-                all_categories.extend([cat.strip() for cat in cats.split(',') if cat.strip()])
-        elif isinstance(cats, list):
-            all_categories.extend(cats)
-
-    category_counts = pd.Series(all_categories).value_counts().head(limit)
-    return [{"category": cat, "count": int(count)} for cat, count in category_counts.items()]
+def _compute_top_categories(limit, level):
+    counts = category_counts(categories, level).head(limit)
+    return [{"category": cat, "count": int(count)} for cat, count in counts.items()]
 
 @router.get("/material-distribution")
 def get_material_distribution() -> List[Dict[str, Any]]:
     """Get material distribution"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
+    return cached_aggregate("material-distribution", _compute_material_distribution)
 
+def _compute_material_distribution():
     material_counts = df['material'].value_counts().head(10)
     return [{"material": mat, "count": int(count)} for mat, count in material_counts.items()]
 
 @router.get("/color-distribution")
 def get_color_distribution() -> List[Dict[str, Any]]:
     """Get color distribution"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
+    return cached_aggregate("color-distribution", _compute_color_distribution)
 
+def _compute_color_distribution():
     color_counts = df['color'].value_counts().head(10)
     return [{"color": col, "count": int(count)} for col, count in color_counts.items()]
 
 @router.get("/country-origin")
 def get_country_origin() -> List[Dict[str, Any]]:
     """Get country of origin distribution"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
+    return cached_aggregate("country-origin", _compute_country_origin)
 
+def _compute_country_origin():
     country_counts = df['country_of_origin'].value_counts().head(10)
     return [{"country": country, "count": int(count)} for country, count in country_counts.items()]
 
 @router.get("/price-by-category")
-def get_price_by_category() -> List[Dict[str, Any]]:
-    """Get average price by top categories"""
-    if df is None:
-        raise HTTPException(status_code=500, detail="Dataset not loaded")
+def get_price_by_category(limit: int = 5, level: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get average price by top categories, optionally at one hierarchy level (0 = root, -1 = leaf)"""
+    return cached_aggregate("price-by-category", _compute_price_by_category, limit, level)
 
-    # Use cleaned_price column if available, otherwise clean price column
-    df_clean = df.copy()
-    if 'cleaned_price' in df_clean.columns:
-        df_clean['price'] = df_clean['cleaned_price']
-    else:
-        df_clean['price'] = pd.to_numeric(df_clean['price'].astype(str).str.replace('$', '').str.replace(',', ''), errors='coerce')
-    df_clean = df_clean.dropna(subset=['price'])
-
-    if df_clean.empty:
+def _compute_price_by_category(limit, level):
+    if prices.empty:
         return []
 
-    # Explode categories properly
-    df_exploded = []
-    for idx, row in df_clean.iterrows():
-        cats = row['categories']
-        if isinstance(cats, str):
-            # Parse string categories
-            if cats.startswith('[') and cats.endswith(']'):
-                try:
-                    parsed_cats = eval(cats)
-                except:
-                    parsed_cats = [cat.strip().strip("'\"") for cat in cats.strip('[]').split(',') if cat.strip()]
-            else:
-                parsed_cats = [cat.strip() for cat in cats.split(',') if cat.strip()]
-        elif isinstance(cats, list):
-            parsed_cats = cats
-        else:
-            parsed_cats = []
-
-        for cat in parsed_cats:
-            df_exploded.append({
-                'category': cat,
-                'price': row['price']
-            })
-
-    if not df_exploded:
-        return []
-
-    df_exploded = pd.DataFrame(df_exploded)
-    top_categories = df_exploded['category'].value_counts().head(5).index
-    df_top_cat = df_exploded[df_exploded['category'].isin(top_categories)]
-
-    price_by_cat = df_top_cat.groupby('category')['price'].agg(['mean', 'count']).round(2)
+    stats = category_breakdown(categories, prices, level)
+    top = stats.sort_values('count', ascending=False, kind='stable').head(limit)
+    price_by_cat = top.sort_index().round(2)
     return [
         {
             "category": cat,
@@ -1,15 +1,31 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import ChatRequest, ChatResponse, Product
-import pandas as pd
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.models.schemas import ChatRequest, ChatResponse, Product, BatchChatRequest, BatchChatResponse, \
+    SimilarProductsResponse, ImageSearchResponse
+from app.services.bm25 import parse_field_weights
+from app.services.cache import LRUCache, SQLiteCache
+from app.services.catalog import DATA_DIR, catalog_fingerprint, find_catalog_path, load_catalog, read_catalog, set_catalog
+from app.services.descriptions import DEFAULT_CACHE_PATH, DEFAULT_MODEL, DescriptionService, DescriptionStore, \
+    LLMDescriber, template_description
+from app.services.filters import FILTER_FIELDS
+from app.services.fusion import DEFAULT_RRF_K, FUSION_METHODS, display_scores, fuse
+from app.services.image_search import INDEX_FILE as IMAGE_INDEX_FILE, ImageEmbeddingIndex, ImageEncoderPool
+from app.services.metrics import cache_gauges, candidates, errors_total, registry, span
+from app.services.neighbors import INDICES_FILE, NeighborTable
+from app.services.shared_state import CATALOG_FILE, EMBEDDINGS_FILE, FAISS_FILE, ensure_generation, \
+    generation_dir, read_manifest
+from app.services.snapshot import CatalogSnapshot
+from app.services.vector_search import VectorSearchEngine, read_faiss_index
+from app.services.vector_store import AsyncVectorStoreClient, resolve_index_host
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
 import numpy as np
+import asyncio
+import base64
+import contextvars
 import os
-# from sentence_transformers import SentenceTransformer  # Removed due to torch dependency issues
-import pinecone
-# from langchain.llms import HuggingFacePipeline  # LangChain API changed
-# from langchain.prompts import PromptTemplate
-# from langchain.chains import LLMChain
-from transformers import pipeline
-import joblib
+# Heavy ML/vector DB libraries (sentence_transformers, pinecone, faiss, transformers)
+# are imported lazily inside init_models so importing this module stays fast
 import logging
 
 # Setup logging
@@ -20,51 +36,377 @@ router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
 # Global variables for models
 sentence_model = None
-kmeans_model = None
 pinecone_index = None
-description_chain = None
-df = None
+# Cached creative descriptions, with optional background LLM generation
+description_service = None
+# Precomputed item-to-item neighbors, aligned with the catalog rows loaded at startup
+neighbor_table = None
+# Image embeddings keyed by uniq_id, and the worker processes that embed uploaded photos
+image_index = None
+image_encoder = None
+# Catalog plus its search index, product store and vector engine; swapped whole by admin ingest
+snapshot = None
+# Generation of the SHARED_STATE_DIR build being served, None when state is built in-process
+shared_generation = None
+vector_min_score = 0.0
+query_cache = None
+# Retrieval used when a request leaves search_mode/fusion/weights unset: (mode, fusion, keyword, semantic weight)
+search_defaults = ('auto', 'rrf', 1.0, 1.0)
+rrf_k = DEFAULT_RRF_K
+# Candidates each retriever contributes to the hybrid pool
+hybrid_candidates = 100
+# Hybrid search scores keyword candidates here while the calling thread encodes the query
+keyword_pool = ThreadPoolExecutor(max_workers=int(os.getenv('HYBRID_KEYWORD_WORKERS', '4')),
+                                  thread_name_prefix='hybrid-keyword')
+
+SEARCH_MODES = ('auto', 'keyword', 'semantic', 'hybrid')
+
+# Page size used when a request sends a cursor without page_size
+DEFAULT_PAGE_SIZE = 20
+
+def load_sentence_model():
+    """Load the query encoder once; sentence-transformers needs torch, so it stays optional"""
+    global sentence_model
+    if sentence_model is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            logger.warning("sentence-transformers not installed. Using keyword search.")
+            return None
+        sentence_model = SentenceTransformer(os.getenv('SENTENCE_MODEL', 'all-MiniLM-L6-v2'))
+    return sentence_model
+
+def find_embeddings_path():
+    for path in ['models/text_embeddings.npy', '../models/text_embeddings.npy']:
+        if os.path.exists(path):
+            return path
+    return None
+
+def init_vector_search(df, path=None, faiss_index_path=None):
+    """Load the local embedding matrix and query encoder; returns the engine or None.
+
+    A shared build passes its own embeddings file and the FAISS index built with it.
+    """
+    global vector_min_score
+
+    path = path or find_embeddings_path()
+    if path is None:
+        logger.warning("Text embeddings not found. Using keyword search.")
+        return None
 
-def init_models():
-    global sentence_model, kmeans_model, pinecone_index, description_chain, df
+    try:
+        embeddings = np.load(path, mmap_mode='r')
+        if len(embeddings) != len(df):
+            logger.warning(f"Embeddings in {path} have {len(embeddings)} rows but dataset has {len(df)}. "
+                           "Using keyword search.")
+            return None
+        if load_sentence_model() is None:
+            return None
+
+        vector_engine = VectorSearchEngine(
+            embeddings,
+            backend=os.getenv('VECTOR_SEARCH_BACKEND', 'auto'),
+            brute_force_max_rows=int(os.getenv('VECTOR_BRUTE_FORCE_MAX_ROWS', '50000')),
+            faiss_index=read_faiss_index(faiss_index_path) if faiss_index_path else None
+        )
+        vector_min_score = float(os.getenv('VECTOR_MIN_SCORE', '0.2'))
+        logger.info(f"Semantic search enabled with embeddings from {path}")
+        return vector_engine
+    except Exception as e:
+        logger.error(f"Error initializing vector search: {e}")
+        return None
+
+def find_neighbor_dir():
+    for directory in ['models', '../models']:
+        if os.path.exists(os.path.join(directory, INDICES_FILE)):
+            return directory
+    return None
+
+def init_neighbor_table(df):
+    """Load the precomputed similar-products table built by scripts/build_neighbors.py"""
+    directory = find_neighbor_dir()
+    if directory is None:
+        logger.warning("Neighbor table not found. /similar uses live search.")
+        return None
 
     try:
-        # Load dataset - try multiple paths
-        dataset_paths = ['data/furniture_dataset_final.csv', '../data/furniture_dataset_final.csv',
-                        'data/furniture_dataset_cleaned.csv', '../data/furniture_dataset_cleaned.csv']
-
-        for path in dataset_paths:
-            if os.path.exists(path):
-                df = pd.read_csv(path)
-                logger.info(f"Loaded dataset from {path} with {len(df)} products")
-                break
-        else:
-            raise FileNotFoundError("No dataset file found")
+        table = NeighborTable.load(directory)
+    except Exception as e:
+        logger.error(f"Error loading neighbor table: {e}")
+        return None
+    if not table.fits(df['uniq_id'].tolist()):
+        logger.warning(f"Neighbor table in {directory} was not built for this catalog's rows "
+                       "(rerun scripts/build_neighbors.py). /similar uses live search.")
+        return None
+    logger.info(f"Loaded {table.n_neighbors} precomputed neighbors per product from {directory}")
+    return table
+
+def init_image_search():
+    """Load the image embeddings built by scripts/build_image_embeddings.py and start the
+    encoder processes; IMAGE_SEARCH_WORKERS=0 turns photo search off"""
+    global image_index, image_encoder
+    workers = int(os.getenv('IMAGE_SEARCH_WORKERS', '1'))
+    if workers <= 0:
+        return
+    for directory in ['models', '../models']:
+        if os.path.exists(os.path.join(directory, IMAGE_INDEX_FILE)):
+            break
+    else:
+        logger.warning("Image embeddings not found. Image search disabled.")
+        return
 
-        # Initialize sentence transformer (commented out due to torch issues)
-        # sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+    try:
+        image_index = ImageEmbeddingIndex.load(
+            directory, search=True,
+            backend=os.getenv('VECTOR_SEARCH_BACKEND', 'auto'),
+            brute_force_max_rows=int(os.getenv('VECTOR_BRUTE_FORCE_MAX_ROWS', '50000'))
+        )
+        # Uploads are embedded with the model the index was built with
+        image_encoder = ImageEncoderPool(image_index.model_name, workers)
+        image_encoder.warm(timeout=float(os.getenv('IMAGE_SEARCH_WARM_TIMEOUT', '300')))
+        logger.info(f"Image search enabled over {len(image_index)} product images "
+                    f"with {workers} {image_index.model_name} workers")
+    except Exception as e:
+        logger.error(f"Error initializing image search: {e!r}. Image search disabled.")
+        disable_image_search()
+
+def disable_image_search():
+    """Stop the encoder processes; /image-search answers 503 from then on"""
+    global image_index, image_encoder
+    encoder, image_index, image_encoder = image_encoder, None, None
+    if encoder is not None:
+        encoder.close()
+
+def close_image_search():
+    if image_encoder is not None:
+        image_encoder.close()
+
+def init_vector_store():
+    """Connect the async Pinecone client; local search stays the fallback"""
+    global pinecone_index
+
+    api_key = os.getenv('PINECONE_API_KEY', '')
+    host = os.getenv('PINECONE_INDEX_HOST')
+    if not api_key and not host:
+        logger.warning("Pinecone API key not set. Using fallback search.")
+        return
 
-        # Load K-means model if exists
-        # if os.path.exists('models/kmeans_model.pkl'):
-        #     kmeans_model = joblib.load('models/kmeans_model.pkl')
+    try:
+        if not host:
+            host = resolve_index_host(api_key, os.getenv('PINECONE_INDEX_NAME', 'furniture-recommendations'))
+            if host is None:
+                logger.warning("Pinecone index not found. Using fallback search.")
+                return
+        if load_sentence_model() is None:
+            return
+
+        pinecone_index = AsyncVectorStoreClient(
+            host, api_key,
+            namespaces=os.getenv('PINECONE_NAMESPACES', '').split(','),
+            timeout=float(os.getenv('VECTOR_STORE_TIMEOUT_MS', '250')) / 1000.0,
+            max_connections=int(os.getenv('VECTOR_STORE_MAX_CONNECTIONS', '20')),
+            failure_threshold=int(os.getenv('VECTOR_STORE_FAILURE_THRESHOLD', '5')),
+            cooldown=float(os.getenv('VECTOR_STORE_COOLDOWN_SECONDS', '30'))
+        )
+        logger.info(f"Pinecone vector store connected at {host}")
+    except Exception as e:
+        logger.error(f"Error connecting to Pinecone: {e}")
+        pinecone_index = None
+
+async def close_vector_store():
+    if pinecone_index is not None:
+        await pinecone_index.aclose()
+
+def init_description_service():
+    """Description cache from DESCRIPTION_CACHE_PATH ("" keeps templates only); DESCRIPTION_LLM=background
+    also generates missing descriptions with a local model in a background thread"""
+    path = os.getenv('DESCRIPTION_CACHE_PATH', DEFAULT_CACHE_PATH)
+    store = DescriptionStore(path) if path else None
+    generator = None
+    if store is not None and os.getenv('DESCRIPTION_LLM', 'off') == 'background':
+        try:
+            generator = LLMDescriber(os.getenv('DESCRIPTION_MODEL', DEFAULT_MODEL))
+            logger.info(f"Generating missing descriptions in the background with {generator.model_name}")
+        except Exception as e:
+            logger.warning(f"Description model unavailable ({e}). Using templates for cache misses.")
+    return DescriptionService(store, generator, batch_size=int(os.getenv('DESCRIPTION_BATCH_SIZE', '16')))
+
+def close_description_service():
+    if description_service is not None:
+        description_service.close()
+
+def init_query_cache():
+    """Create the /chat response cache; QUERY_CACHE_SIZE=0 disables it"""
+    global query_cache
+    size = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+    ttl = float(os.getenv('QUERY_CACHE_TTL_SECONDS', '300')) or None
+    if size <= 0:
+        query_cache = None
+    elif os.getenv('QUERY_CACHE_BACKEND', 'memory') == 'sqlite':
+        # Shared by all workers on the host; keys carry the catalog version so stale entries never match
+        query_cache = SQLiteCache(os.getenv('QUERY_CACHE_PATH', os.path.join(DATA_DIR, 'query_cache.sqlite3')),
+                                  maxsize=size, ttl=ttl)
+    else:
+        query_cache = LRUCache(maxsize=size, ttl=ttl)
+
+def init_search_defaults():
+    """Server-wide retrieval defaults: SEARCH_MODE, HYBRID_FUSION, HYBRID_KEYWORD_WEIGHT,
+    HYBRID_SEMANTIC_WEIGHT, HYBRID_RRF_K and HYBRID_CANDIDATES"""
+    global search_defaults, rrf_k, hybrid_candidates
+    mode = os.getenv('SEARCH_MODE', 'auto')
+    if mode not in SEARCH_MODES:
+        logger.warning(f"Unknown SEARCH_MODE {mode!r}. Using auto.")
+        mode = 'auto'
+    method = os.getenv('HYBRID_FUSION', 'rrf')
+    if method not in FUSION_METHODS:
+        logger.warning(f"Unknown HYBRID_FUSION {method!r}. Using rrf.")
+        method = 'rrf'
+    search_defaults = (mode, method, float(os.getenv('HYBRID_KEYWORD_WEIGHT', '1')),
+                       float(os.getenv('HYBRID_SEMANTIC_WEIGHT', '1')))
+    rrf_k = float(os.getenv('HYBRID_RRF_K', str(DEFAULT_RRF_K)))
+    hybrid_candidates = int(os.getenv('HYBRID_CANDIDATES', '100'))
+
+def resolve_search(payload):
+    """(mode, fusion, keyword weight, semantic weight) for a request; unset fields use the server defaults"""
+    mode, method, keyword_weight, semantic_weight = search_defaults
+    return (payload.search_mode or mode, payload.fusion or method,
+            keyword_weight if payload.keyword_weight is None else payload.keyword_weight,
+            semantic_weight if payload.semantic_weight is None else payload.semantic_weight)
+
+def effective_mode(mode, semantic):
+    """The retrieval a mode runs as: auto picks semantic when an embedding backend is available,
+    and semantic or hybrid degrade to keyword without one"""
+    if not semantic:
+        return 'keyword'
+    return 'semantic' if mode == 'auto' else mode
+
+def normalize_query(message):
+    """Cache key form of a query: every ranker lowercases, but whitespace is kept
+    because the legacy ranker's exact-phrase boost depends on it"""
+    return message.lower()
+
+def resolve_filters(snap, payload):
+    """(query to search, filters) for a request.
+
+    Constraints are parsed out of the message unless parse_filters is off,
+    and the request's explicit filter fields replace parsed ones field by
+    field. A message without constraints, or with nothing but constraints,
+    is searched as typed.
+    """
+    query, filters = snap.attributes.parse(payload.message) if payload.parse_filters else (payload.message, {})
+    if not filters:
+        query = payload.message
+    for field in FILTER_FIELDS + ('min_price', 'max_price'):
+        value = getattr(payload, field)
+        if value is not None:
+            filters[field] = value
+    return query or payload.message, filters
+
+def filters_key(filters):
+    return tuple(sorted((field, tuple(value) if isinstance(value, list) else value)
+                        for field, value in filters.items()))
+
+@registry.gauges
+def collect_metrics():
+    """Catalog size and cache counters for /metrics"""
+    snap = snapshot
+    samples = []
+    if snap is not None:
+        samples.append(("catalog_products", "Live products in the served catalog snapshot", {}, len(snap)))
+    if query_cache is not None:
+        samples.extend(cache_gauges("query", query_cache.stats()))
+    if description_service is not None:
+        samples.extend(cache_gauges("descriptions", description_service.memory.stats()))
+    return samples
+
+def shared_build_options():
+    """Settings a shared generation is built with; a published one built with others is rebuilt"""
+    weights = os.getenv('BM25_FIELD_WEIGHTS')
+    return dict(
+        ranker=os.getenv('KEYWORD_RANKER', 'bm25'),
+        field_weights=parse_field_weights(weights) if weights else None,
+        embeddings_path=find_embeddings_path(),
+        backend=os.getenv('VECTOR_SEARCH_BACKEND', 'auto'),
+        brute_force_max_rows=int(os.getenv('VECTOR_BRUTE_FORCE_MAX_ROWS', '50000')),
+        neighbors_dir=find_neighbor_dir(),
+    )
+
+def attach_generation(root, generation, prepare=None):
+    """Serve a shared build: its catalog, indexes and embeddings are memory-mapped
+    read-only, so every worker attached to it shares the same pages. prepare(snapshot)
+    may return a changed snapshot to serve instead. Returns the new snapshot;
+    requests already running keep the one they started with."""
+    global neighbor_table, shared_generation
+    directory = generation_dir(root, generation)
+    manifest = read_manifest(directory)
+    path = os.path.join(directory, CATALOG_FILE)
+    df = read_catalog(path)
+    vector_engine = None
+    if manifest['embeddings']:
+        vector_engine = init_vector_search(
+            df, os.path.join(directory, EMBEDDINGS_FILE),
+            os.path.join(directory, FAISS_FILE) if manifest['faiss_index'] else None)
+    new_snapshot = CatalogSnapshot.load(directory, df, manifest['catalog_version'], vector_engine,
+                                        ranker=manifest['ranker'])
+    if prepare is not None:
+        new_snapshot = prepare(new_snapshot)
+    set_catalog(df, path)
+    # Checked against the generation's catalog when it was built
+    neighbor_table = NeighborTable.load(directory) if manifest.get('neighbors') else None
+    set_snapshot(new_snapshot)
+    shared_generation = generation
+    if query_cache is not None:
+        query_cache.clear()
+    logger.info(f"Attached shared generation {generation} from {directory} with {len(df)} products")
+    return new_snapshot
+
+def build_snapshot(df, version):
+    """Snapshot with the keyword index, product store and vector search built in this worker"""
+    ranker = os.getenv('KEYWORD_RANKER', 'bm25')
+    weights = os.getenv('BM25_FIELD_WEIGHTS')
+    new_snapshot = CatalogSnapshot.build(df, version, init_vector_search(df), ranker=ranker,
+                                         field_weights=parse_field_weights(weights) if weights else None)
+    logger.info(f"Built {ranker} search index with {len(new_snapshot.search_index.vocabulary)} tokens")
+    return new_snapshot
+
+def reload_catalog(path, prepare=None):
+    """Serve a changed catalog file: rebuild the snapshot and neighbor table from it.
+    prepare works as in attach_generation; returns the new snapshot."""
+    global neighbor_table
+    version = catalog_fingerprint(path)
+    df = read_catalog(path)
+    new_snapshot = build_snapshot(df, version)
+    if prepare is not None:
+        new_snapshot = prepare(new_snapshot)
+    set_catalog(df, path)
+    neighbor_table = init_neighbor_table(df)
+    set_snapshot(new_snapshot)
+    if query_cache is not None:
+        query_cache.clear()
+    logger.info(f"Reloaded changed catalog {path} with {len(df)} products")
+    return new_snapshot
 
-        # Initialize Pinecone (you'll need to set environment variables)
-        pinecone_api_key = os.getenv('PINECONE_API_KEY')
-        pinecone_env = os.getenv('PINECONE_ENVIRONMENT', 'gcp-starter')
+def init_models():
+    global description_service, snapshot, neighbor_table
 
-        if pinecone_api_key:
-            pinecone.init(api_key=pinecone_api_key, environment=pinecone_env)
-            index_name = "furniture-recommendations"
-            if index_name in pinecone.list_indexes():
-                pinecone_index = pinecone.Index(index_name)
-                logger.info("Pinecone index connected")
-            else:
-                logger.warning("Pinecone index not found. Using fallback search.")
+    df = None
+    catalog_version = None
+    try:
+        shared_root = os.getenv('SHARED_STATE_DIR')
+        if shared_root:
+            # One process builds the generation under a file lock; every worker attaches to it
+            attach_generation(shared_root, ensure_generation(shared_root, find_catalog_path(),
+                                                             **shared_build_options()))
+            df, path = load_catalog()
+            catalog_version = snapshot.base_version
         else:
-            logger.warning("Pinecone API key not set. Using fallback search.")
+            # Load the shared catalog (binary artifact if built, else CSV)
+            df, path = load_catalog()
+            catalog_version = catalog_fingerprint(path)
+        logger.info(f"Loaded dataset from {path} with {len(df)} products")
 
-        # Initialize GenAI for descriptions (simplified)
-        # description_chain = "placeholder"  # Simplified for now
+        # Creative descriptions come from the persistent cache, falling back to templates
+        description_service = init_description_service()
 
         logger.info("Models initialized successfully")
 
@@ -72,168 +414,457 @@ def init_models():
         logger.error(f"Error initializing models: {e}")
         # Fallback: ensure df is loaded
         if df is None:
-            for path in dataset_paths:
-                if os.path.exists(path):
-                    df = pd.read_csv(path)
-                    logger.info(f"Fallback: Loaded dataset from {path}")
-                    break
-
-# Initialize models on startup
-init_models()
-
-def generate_creative_description(title, original_desc):
-    """Generate a creative description by enhancing the original to 20-30 words"""
-    if not original_desc:
-        return f"Discover the elegance of this {title}. A beautiful furniture piece perfect for enhancing your living space."
-
-    # Simple enhancement without ML - aim for 20-30 words
-    enhancements = [
-        "Discover the elegance of this",
-        "Experience the comfort and style of this",
-        "Transform your space with this beautiful",
-        "Add sophistication to your home with this"
-    ]
-
-    enhancement = enhancements[hash(title) % len(enhancements)]
-
-    # Create a concise description
-    creative_desc = f"{enhancement} {title}. {original_desc}"
-
-    # Add brief descriptive content to reach 20-30 words
-    if len(creative_desc.split()) < 20:
-        additions = [
-            " This modern piece combines elegant design with functional appeal, perfect for contemporary spaces.",
-            " Crafted with care, it offers both style and practicality for everyday use.",
-            " A versatile furniture item that brings comfort and elegance to any room.",
-            " Designed to enhance your decor with timeless style and quality craftsmanship."
-        ]
-        addition = additions[hash(title) % len(additions)]
-        creative_desc += addition
-
-    # Ensure it's not too long - truncate to ~30 words
-    words = creative_desc.split()
-    if len(words) > 30:
-        creative_desc = ' '.join(words[:30]) + '...'
-
-    return creative_desc
-
-def search_similar_products(query, top_k=5):
-    """Search for similar products using text matching"""
-    if df is None:
+            try:
+                df, path = load_catalog()
+                catalog_version = catalog_fingerprint(path)
+                logger.info(f"Fallback: Loaded dataset from {path}")
+            except FileNotFoundError:
+                pass
+
+    # Build the keyword search index and parsed product store once instead of per query
+    if df is not None and shared_generation is None:
+        snapshot = build_snapshot(df, catalog_version)
+        neighbor_table = init_neighbor_table(df)
+    if df is not None:
+        init_vector_store()
+        init_image_search()
+
+    # A fresh cache per catalog load, so results from the previous catalog are never served
+    init_query_cache()
+    init_search_defaults()
+
+def is_ready():
+    return snapshot is not None
+
+def set_snapshot(new_snapshot):
+    """Swap in a new catalog snapshot; requests already running keep the one they started with"""
+    global snapshot
+    snapshot = new_snapshot
+
+def encode_texts(texts):
+    return sentence_model.encode(list(texts))
+
+def describe_products(snap, positions):
+    """Creative descriptions for catalog rows: cached or generated ones when available, else templates"""
+    product_store = snap.product_store
+    items = [(product_store.uniq_ids[pos], product_store.titles[pos], product_store.descriptions[pos])
+             for pos in positions]
+    with span("describe"):
+        if description_service is None:
+            return [template_description(title, desc) for _, title, desc in items]
+        return description_service.describe_many(items)
+
+def build_product(snap, pos, score, description=None):
+    """Build a response Product from the snapshot's precomputed product store"""
+    product_store = snap.product_store
+    if description is None:
+        description = describe_products(snap, [pos])[0]
+    return Product(
+        uniq_id=product_store.uniq_ids[pos],
+        title=product_store.titles[pos],
+        description=description,
+        price=product_store.price(pos),
+        categories=product_store.categories(pos),
+        image=product_store.images[pos],
+        score=float(score)
+    )
+
+def candidate_depth(top_k):
+    """Candidates each retriever contributes to a hybrid query; top_k <= 0 takes every match"""
+    return 0 if top_k <= 0 else max(top_k, hybrid_candidates)
+
+def keyword_candidates(snap, query, top_k, mask=None):
+    with span("keyword"):
+        return snap.search_index.search(query, top_k, mask=mask)
+
+def semantic_candidates(snap, query_vector, top_k, mask=None):
+    """Local embedding search; empty without local embeddings"""
+    if snap.vector_engine is None:
         return []
-
-    # Simple fallback: search by title and description text matching
-    query_lower = query.lower()
-    import re
-    query_words = set(re.findall(r'\w+', query_lower))
-
-    matches = []
-
-    for idx, row in df.iterrows():
-        title = str(row['title']).lower() if pd.notnull(row['title']) else ""
-        description = str(row['description']).lower() if pd.notnull(row['description']) else ""
-
-        # Count matching words
-        title_words = set(re.findall(r'\w+', title))
-        desc_words = set(re.findall(r'\w+', description))
-
-        title_matches = len(query_words.intersection(title_words))
-        desc_matches = len(query_words.intersection(desc_words))
-
-        # Calculate score - prioritize exact matches and word frequency
-        score = (title_matches * 3 + desc_matches) / max(len(query_words), 1)
-
-        # Boost score for products that contain the entire query as substring
-        if query_lower in title or query_lower in description:
-            score *= 2
-
-        # Normalize score to be between 0 and 1 for percentage display
-        score = min(score / 10.0, 1.0)  # Assuming max reasonable score is 10
-
-        if score > 0:
-            matches.append({
-                'idx': idx,
-                'score': score,
-                'row': row
-            })
-
-    # Sort by score and take top_k
-    matches.sort(key=lambda x: x['score'], reverse=True)
-    if top_k <= 0:
-        top_matches = matches  # Return all matches if top_k <= 0
+    with span("semantic"):
+        return snap.vector_engine.search(query_vector, top_k, min_score=vector_min_score, mask=mask)[0]
+
+def fuse_candidates(snap, query_vector, keyword, semantic, top_k, search):
+    """Rank the union of keyword and semantic candidates with the request's fusion method.
+
+    With local embeddings the whole pool is re-scored by similarity first,
+    so a keyword-only hit still gets a semantic rank. Nothing outside the
+    pool is scored again.
+    """
+    _, method, keyword_weight, semantic_weight = search
+    pool = sorted({pos for pos, _ in keyword} | {pos for pos, _ in semantic})
+    candidates.observe(len(pool), stage="pool")
+    if snap.vector_engine is not None and pool:
+        pool_mask = np.zeros(len(snap.live), dtype=bool)
+        pool_mask[pool] = True
+        with span("rerank"):
+            semantic = snap.vector_engine.search(query_vector, 0, mask=pool_mask)[0]
+    with span("fuse"):
+        # Fused scores only order the results; responses carry the 0-1 display score
+        fused = fuse([keyword, semantic], [keyword_weight, semantic_weight], method, rrf_k, top_k)
+        return display_scores(fused, [keyword, semantic], [keyword_weight, semantic_weight], method, rrf_k)
+
+def hybrid_rank(snap, query, top_k, mask, search, query_vector=None):
+    """Keyword and local semantic candidates fetched concurrently, then fused"""
+    depth = candidate_depth(top_k)
+    # copy_context keeps the keyword span in this request's Server-Timing
+    keyword_future = keyword_pool.submit(contextvars.copy_context().run, keyword_candidates,
+                                         snap, query, depth, mask)
+    if query_vector is None:
+        with span("encode"):
+            query_vector = sentence_model.encode([query])[0]
+    semantic = semantic_candidates(snap, query_vector, depth, mask)
+    return fuse_candidates(snap, query_vector, keyword_future.result(), semantic, top_k, search)
+
+def rank_products(snap, query, top_k=5, filters=None, search=None):
+    """(position, score) pairs for a query, best first; top_k <= 0 ranks every match.
+
+    Rows failing the structured filters are pruned before scoring. search
+    is a resolve_search tuple (server defaults when None).
+    """
+    if snap is None:
+        return []
+    if filters:
+        with span("filter"):
+            mask = snap.filter_mask(filters)
+        candidates.observe(int(mask.sum()), stage="filtered")
+        if not mask.any():
+            return []
+    else:
+        mask = None
+
+    search = search or search_defaults
+    mode = effective_mode(search[0], snap.vector_engine is not None and sentence_model is not None)
+    if mode == 'hybrid':
+        ranked = hybrid_rank(snap, query, top_k, mask, search)
+    elif mode == 'semantic':
+        with span("encode"):
+            query_vector = sentence_model.encode([query])
+        with span("score"):
+            ranked = snap.vector_engine.search(query_vector, top_k, min_score=vector_min_score, mask=mask)[0]
     else:
-        top_matches = matches[:top_k]
+        # Fallback: search by title and description text matching
+        with span("score"):
+            ranked = snap.search_index.search(query, top_k, mask=mask)
+    candidates.observe(len(ranked), stage="returned")
+    return ranked
+
+async def remote_candidates(snap, query_vector, top_k, fallback):
+    """(position, score) pairs from the remote vector store, or from fallback() when it is slow"""
+    with span("remote_search"):
+        matches, source = await pinecone_index.search(query_vector, top_k, fallback=fallback)
+    if source == "local":
+        return matches
+    # Remote matches come back as uniq_ids; deleted products drop out here, and weak matches
+    # are cut at the same VECTOR_MIN_SCORE as local search
+    positions = snap.position_by_id
+    return [(positions[uniq_id], score) for uniq_id, score in matches
+            if uniq_id in positions and score >= vector_min_score]
+
+async def rank_products_async(snap, query, top_k=5, filters=None, search=None):
+    """rank_products for async handlers: a remote vector store query awaits on the
+    event loop instead of holding a worker thread, and local search answers when it is slow.
+
+    Filtered queries are answered locally, where the filter bitmaps live.
+    """
+    search = search or search_defaults
+    mode = effective_mode(search[0], True)
+    if pinecone_index is None or sentence_model is None or snap is None or filters or mode == 'keyword':
+        return await run_in_threadpool(rank_products, snap, query, top_k, filters, search)
+
+    if mode == 'semantic':
+        with span("encode"):
+            query_vector = (await run_in_threadpool(sentence_model.encode, [query]))[0]
+        return await remote_candidates(snap, query_vector, top_k,
+                                       lambda: run_in_threadpool(rank_products, snap, query, top_k, None, search))
+
+    # Hybrid: keyword candidates are scored in a worker thread while the query is encoded and sent
+    depth = candidate_depth(top_k)
+    keyword_task = asyncio.ensure_future(run_in_threadpool(keyword_candidates, snap, query, depth))
+    with span("encode"):
+        query_vector = (await run_in_threadpool(sentence_model.encode, [query]))[0]
+    semantic = await remote_candidates(snap, query_vector, depth,
+                                       lambda: run_in_threadpool(semantic_candidates, snap, query_vector, depth))
+    keyword = await keyword_task
+    return await run_in_threadpool(fuse_candidates, snap, query_vector, keyword, semantic, top_k, search)
+
+def build_products(snap, ranked):
+    with span("build_products"):
+        descriptions = describe_products(snap, [pos for pos, _ in ranked])
+        return [build_product(snap, pos, score, description)
+                for (pos, score), description in zip(ranked, descriptions)]
+
+def search_similar_products(query, top_k=5, filters=None, search=None):
+    """Search for similar products, semantically when embeddings are loaded, else by text matching"""
+    snap = snapshot
+    return build_products(snap, rank_products(snap, query, top_k, filters, search))
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+def build_page(snap, ranked, offset, page_size):
+    """One page of Products and the cursor of the next page (None on the last page).
+
+    Only the page itself is turned into Product objects.
+    """
+    end = offset + page_size
+    next_cursor = encode_cursor(end) if len(ranked) > end else None
+    return build_products(snap, ranked[offset:end]), next_cursor
+
+def search_similar_products_batch(snap, queries, top_ks, filters=None, searches=None):
+    """Search for many queries at once, scoring the whole batch in a single pass.
+
+    filters holds optional structured filters per query; filtered queries
+    are pruned to their own rows before scoring. searches holds a
+    resolve_search tuple per query: queries are encoded together, unfiltered
+    semantic and hybrid ones share one vector search, keyword and hybrid ones
+    one sparse multiply. Hybrid candidates are then fused per query.
+    """
+    if snap is None:
+        return [[] for _ in queries]
+    masks = [snap.filter_mask(f) for f in filters] if filters else [None] * len(queries)
+    searches = searches or [search_defaults] * len(queries)
+    semantic = snap.vector_engine is not None and sentence_model is not None
+    modes = [effective_mode(search[0], semantic) for search in searches]
+    # Hybrid queries take candidate_depth() candidates from each retriever before fusion
+    depths = [candidate_depth(top_k) if mode == 'hybrid' else top_k for top_k, mode in zip(top_ks, modes)]
+    ranked = [None] * len(queries)
+
+    encoded = [i for i, mode in enumerate(modes) if mode != 'keyword']
+    query_vectors = {}
+    if encoded:
+        query_vectors = dict(zip(encoded, sentence_model.encode([queries[i] for i in encoded])))
+        unfiltered = [i for i in encoded if masks[i] is None]
+        if unfiltered:
+            k = 0 if min(depths[i] for i in unfiltered) <= 0 else max(depths[i] for i in unfiltered)
+            batch_vectors = np.stack([query_vectors[i] for i in unfiltered])
+            for i, matches in zip(unfiltered, snap.vector_engine.search(batch_vectors, k,
+                                                                        min_score=vector_min_score)):
+                ranked[i] = matches if depths[i] <= 0 else matches[:depths[i]]
+        for i in encoded:
+            if masks[i] is not None:
+                ranked[i] = snap.vector_engine.search(query_vectors[i], depths[i], min_score=vector_min_score,
+                                                      mask=masks[i])[0]
+
+    lexical = [i for i, mode in enumerate(modes) if mode != 'semantic']
+    if lexical:
+        results = snap.search_index.search_batch([queries[i] for i in lexical], [depths[i] for i in lexical],
+                                                 [masks[i] for i in lexical])
+        for i, matches in zip(lexical, results):
+            if modes[i] == 'hybrid':
+                ranked[i] = fuse_candidates(snap, query_vectors[i], matches, ranked[i], top_ks[i], searches[i])
+            else:
+                ranked[i] = matches
+
+    return [build_products(snap, matches) for matches in ranked]
+
+def similar_positions(snap, pos, top_k):
+    """(position, score) pairs of the products most similar to the one at pos, and their source.
+
+    Products from the catalog file are answered from the precomputed neighbor
+    table; products added by ingest since then fall back to a live search
+    around their embedding, or their title without embeddings.
+    """
+    uniq_ids = snap.product_store.uniq_ids
+    seen = {uniq_ids[pos]}
+    ranked = []
+    if neighbor_table is not None and pos < len(neighbor_table):
+        candidates, source = neighbor_table.neighbors(pos), "table"
+    elif snap.vector_engine is not None:
+        vector = snap.vector_engine.vector(pos)
+        candidates, source = snap.vector_engine.search(vector, top_k + 5)[0], "vector"
+    else:
+        candidates, source = snap.search_index.search(snap.product_store.titles[pos], top_k + 5), "keyword"
+
+    for neighbor, score in candidates:
+        if not snap.live[neighbor]:
+            # Updated since the table was built: follow the product to its current row
+            neighbor = snap.position_by_id.get(uniq_ids[neighbor])
+            if neighbor is None:
+                continue
+        if uniq_ids[neighbor] in seen:
+            continue
+        seen.add(uniq_ids[neighbor])
+        ranked.append((neighbor, score))
+        if len(ranked) == top_k:
+            break
+    return ranked, source
+
+@router.get("/similar/{uniq_id}", response_model=SimilarProductsResponse)
+def similar_products(uniq_id: str, top_k: int = 10):
+    """Products similar to one product, for product detail pages"""
+    snap = snapshot
+    if snap is None:
+        raise HTTPException(status_code=500, detail="Dataset not loaded")
+    pos = snap.position_by_id.get(uniq_id)
+    if pos is None:
+        raise HTTPException(status_code=404, detail=f"Product {uniq_id} not found")
+
+    ranked, source = similar_positions(snap, pos, max(top_k, 0))
+    return SimilarProductsResponse(uniq_id=uniq_id, recommendations=build_products(snap, ranked), source=source)
+
+def image_positions(snap, index, vector, top_k):
+    """(position, score) pairs of the live products whose images in index are closest to vector"""
+    # Over-fetch: products deleted since the embeddings were built have no live row
+    matches = index.search(vector, 0 if top_k <= 0 else 2 * top_k + 10)
+    ranked = []
+    for uniq_id, score in matches:
+        pos = snap.position_by_id.get(uniq_id)
+        if pos is not None:
+            ranked.append((pos, score))
+            if len(ranked) == top_k:
+                break
+    return ranked
+
+async def read_upload(file):
+    """Bytes of an uploaded photo, refusing ones over IMAGE_UPLOAD_MAX_BYTES"""
+    max_bytes = int(os.getenv('IMAGE_UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image larger than {max_bytes} bytes")
+    data = await file.read(max_bytes + 1)
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    if len(data) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image larger than {max_bytes} bytes")
+    return data
+
+@router.post("/image-search", response_model=ImageSearchResponse)
+async def image_search(file: UploadFile = File(...), top_k: int = 10):
+    """Products that look like an uploaded photo ("shop the look").
+
+    The photo is embedded in a worker process and searched against the
+    precomputed product image embeddings.
+    """
+    snap = snapshot
+    if snap is None:
+        raise HTTPException(status_code=500, detail="Dataset not loaded")
+    encoder, index = image_encoder, image_index
+    if index is None or encoder is None:
+        raise HTTPException(status_code=503, detail="Image search not available")
+
+    data = await read_upload(file)
+    try:
+        with span("encode_image"):
+            vector = await encoder.encode(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BrokenExecutor as e:
+        logger.error(f"Image encoder workers died: {e!r}. Image search disabled.")
+        disable_image_search()
+        raise HTTPException(status_code=503, detail="Image search not available")
+    with span("score"):
+        ranked = await run_in_threadpool(image_positions, snap, index, vector, max(top_k, 0))
+    return ImageSearchResponse(recommendations=await run_in_threadpool(build_products, snap, ranked))
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_recommendations(payload: ChatRequest):
+    try:
+        snap = snapshot
+        if snap is None:
+            raise HTTPException(status_code=500, detail="Dataset not loaded")
 
-    recommendations = []
-    for match in top_matches:
-        row = match['row']
-        creative_desc = generate_creative_description(row['title'], row['description'])
+        with span("parse_filters"):
+            query, filters = resolve_filters(snap, payload)
+        paginated = payload.page_size is not None or payload.cursor is not None
+        offset = decode_cursor(payload.cursor) if payload.cursor else 0
+        page_size = payload.page_size or DEFAULT_PAGE_SIZE
+
+        search = resolve_search(payload)
+        # Pages of one query share an entry holding its whole ranking, sliced per page, so paging
+        # through a top_k <= 0 query ranks it once; unpaged responses are cached as built
+        cache_key = (snap.version, normalize_query(query), payload.top_k, filters_key(filters), search,
+                     paginated)
+        with span("cache_lookup"):
+            # Off the event loop: the sqlite backend does file I/O and unpickling
+            cached = await run_in_threadpool(query_cache.get, cache_key) if query_cache is not None else None
+        if cached is None:
+            ranked = await rank_products_async(snap, query, payload.top_k, filters, search)
+            cached = ranked if paginated else (await run_in_threadpool(build_products, snap, ranked), None)
+            if query_cache is not None:
+                await run_in_threadpool(query_cache.set, cache_key, cached)
+        if paginated:
+            recommendations, next_cursor = await run_in_threadpool(build_page, snap, cached, offset, page_size)
+        else:
+            recommendations, next_cursor = cached
 
-        # Clean price - convert to float if possible
-        price = None
-        if pd.notnull(row['price']) and str(row['price']).strip():
-            try:
-                # Remove currency symbols and convert
-                price_str = str(row['price']).replace('$', '').replace(',', '').strip()
-                if price_str:
-                    price = float(price_str)
-            except (ValueError, TypeError):
-                price = None
-
-        # Parse categories
-        categories = []
-        if pd.notnull(row['categories']):
-            cat_str = str(row['categories'])
-            if cat_str.startswith('[') and cat_str.endswith(']'):
-                try:
-                    categories = eval(cat_str)
-                except:
-                    categories = [cat.strip() for cat in cat_str.strip('[]').split(',') if cat.strip()]
-            else:
-                categories = [cat.strip() for cat in cat_str.split(',') if cat.strip()]
-
-        # Parse images - extract first image URL from list
-        image_url = None
-        if pd.notnull(row['images']):
-            img_str = str(row['images']).strip()
-            if img_str.startswith('[') and img_str.endswith(']'):
-                try:
-                    img_list = eval(img_str)
-                    if img_list and len(img_list) > 0:
-                        image_url = img_list[0].strip().strip("'\"")
-                except:
-                    # Fallback: try to extract URL from string
-                    import re
-                    urls = re.findall(r'https?://[^\s\'"]+', img_str)
-                    if urls:
-                        image_url = urls[0]
-            else:
-                # Single URL
-                image_url = img_str.strip().strip("'\"")
-
-        product = Product(
-            uniq_id=str(row['uniq_id']),
-            title=str(row['title']) if pd.notnull(row['title']) else "",
-            description=creative_desc,
-            price=price,
-            categories=categories,
-            image=image_url,
-            score=float(match['score'])
-        )
-        recommendations.append(product)
+        return ChatResponse(query=payload.message, recommendations=recommendations, next_cursor=next_cursor,
+                            filters=filters or None)
 
-    return recommendations
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error in chat_recommendations: {e}")
+        errors_total.inc(route="/recommendations/chat", type=type(e).__name__)
+        raise HTTPException(status_code=500, detail="Internal server error")
 
-@router.post("/chat", response_model=ChatResponse)
-def chat_recommendations(payload: ChatRequest):
+@router.post("/chat/batch", response_model=BatchChatResponse)
+def chat_recommendations_batch(payload: BatchChatRequest):
     try:
-        if df is None:
+        snap = snapshot
+        if snap is None:
             raise HTTPException(status_code=500, detail="Dataset not loaded")
+        if not payload.queries:
+            return BatchChatResponse(results=[])
 
-        recommendations = search_similar_products(payload.message, payload.top_k)
+        queries, filters = zip(*(resolve_filters(snap, item) for item in payload.queries))
+        top_ks = [item.top_k for item in payload.queries]
+        searches = [resolve_search(item) for item in payload.queries]
+        results = search_similar_products_batch(snap, list(queries), top_ks, list(filters), searches)
 
-        return ChatResponse(query=payload.message, recommendations=recommendations)
+        return BatchChatResponse(results=[
+            ChatResponse(query=item.message, recommendations=recommendations, filters=item_filters or None)
+            for item, recommendations, item_filters in zip(payload.queries, results, filters)
+        ])
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in chat_recommendations: {e}")
+        logger.exception(f"Error in chat_recommendations_batch: {e}")
+        errors_total.inc(route="/recommendations/chat/batch", type=type(e).__name__)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/chat/stream")
+def chat_recommendations_stream(payload: ChatRequest):
+    """Stream recommendations as NDJSON, one product per line, built lazily as they are sent"""
+    snap = snapshot
+    if snap is None:
+        raise HTTPException(status_code=500, detail="Dataset not loaded")
+
+    query, filters = resolve_filters(snap, payload)
+    ranked = rank_products(snap, query, payload.top_k, filters, resolve_search(payload))
+
+    def lines():
+        for pos, score in ranked:
+            yield build_product(snap, pos, score).model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/cache/stats")
+def query_cache_stats():
+    """Hit/miss/eviction counters for sizing the /chat response cache"""
+    if query_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **query_cache.stats()}
+
+@router.get("/descriptions/stats")
+def description_stats():
+    """Description cache size, background generation progress and in-memory hit rates"""
+    if description_service is None:
+        return {"enabled": False}
+    return {"enabled": True, **description_service.stats()}
+
+@router.get("/vector-store/stats")
+def vector_store_stats():
+    """Remote vector store health: circuit state, remote answers and local fallbacks"""
+    if pinecone_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **pinecone_index.stats()}
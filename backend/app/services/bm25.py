@@ -0,0 +1,312 @@
+import copy
+import json
+import os
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from app.services.search_index import TOKEN_PATTERN, _lower_text, tokenize
+
+# Title words matter most; brand/material/color catch queries like "walnut" or "ikea"
+DEFAULT_FIELD_WEIGHTS = {'title': 3.0, 'description': 1.0, 'brand': 1.0, 'material': 0.5, 'color': 0.5}
+
+
+def parse_field_weights(spec):
+    """Parse "title=3,description=1" into {'title': 3.0, 'description': 1.0}"""
+    weights = {}
+    for item in spec.split(','):
+        if item.strip():
+            field, _, weight = item.partition('=')
+            weights[field.strip()] = float(weight)
+    return weights
+
+
+class BM25FIndex:
+    """BM25F ranker over several weighted product fields.
+
+    Per-field term counts are kept as sparse token x row matrices. The
+    BM25F weight of every (token, row) pair is precomputed into one matrix,
+    so scoring a query is a single sparse product of its token vector with
+    that matrix. Scores are divided by the query's maximum attainable score
+    so they fall in 0-1 like the legacy scorer's. Rows are addressed by
+    position in the source DataFrame.
+
+    updated() is incremental: rows added by ingest are weighted with the
+    collection statistics of the last full build and kept in a small extra
+    matrix next to the built one, and removed rows are only marked in live,
+    so a write costs the size of the change rather than of the catalog.
+    """
+
+    def __init__(self, fields, weights=None, k1=1.2, b=0.75):
+        weights = DEFAULT_FIELD_WEIGHTS if weights is None else weights
+        self.weights = {field: weights[field] for field in fields if weights.get(field)}
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.extra_vocabulary = {}
+
+        counts = {field: [Counter(TOKEN_PATTERN.findall(_lower_text(text))) for text in fields[field]]
+                  for field in self.weights}
+        self.n_rows = len(next(iter(fields.values()))) if fields else 0
+        for field_counts in counts.values():
+            for row in field_counts:
+                for token in row:
+                    self.vocabulary.setdefault(token, len(self.vocabulary))
+        self.term_counts = {field: self._count_matrix(counts[field]) for field in self.weights}
+        self.lengths = {field: np.asarray([sum(row.values()) for row in counts[field]], dtype=np.float64)
+                        for field in self.weights}
+        self.live = np.ones(self.n_rows, dtype=bool)
+        self._build_weights()
+        self._clear_extra()
+
+    @classmethod
+    def from_dataframe(cls, df, weights=None, **kwargs):
+        weights = DEFAULT_FIELD_WEIGHTS if weights is None else weights
+        fields = {field: df[field].tolist() for field in weights if field in df.columns}
+        return cls(fields, weights, **kwargs)
+
+    def save(self, directory):
+        """Write the index as .npy arrays plus a JSON vocabulary; load() memory-maps them"""
+        arrays = {'bm25_idf': self.idf, 'bm25_max_term_scores': self.max_term_scores, 'bm25_live': self.live}
+        matrices = {'bm25_matrix': self.matrix}
+        for i, field in enumerate(self.weights):
+            matrices[f"bm25_counts_{i}"] = self.term_counts[field]
+            arrays[f"bm25_lengths_{i}"] = self.lengths[field]
+        for name, matrix in matrices.items():
+            for part in ('data', 'indices', 'indptr'):
+                arrays[f"{name}.{part}"] = getattr(matrix, part)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        with open(os.path.join(directory, 'bm25.json'), 'w') as f:
+            json.dump({'weights': self.weights, 'k1': self.k1, 'b': self.b, 'n_rows': self.n_rows,
+                       'vocabulary': list(self.vocabulary), 'n_stats': self.n_stats,
+                       'avg_lengths': self.avg_lengths}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'bm25.json')) as f:
+            meta = json.load(f)
+
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+        def matrix(name, n_rows):
+            # copy=False keeps the memory-mapped arrays as the matrix's storage
+            return sparse.csr_matrix(tuple(array(f"{name}.{part}") for part in ('data', 'indices', 'indptr')),
+                                     shape=(len(index.vocabulary), n_rows), copy=False)
+
+        index = cls.__new__(cls)
+        index.weights = meta['weights']
+        index.k1, index.b, index.n_rows = meta['k1'], meta['b'], meta['n_rows']
+        index.vocabulary = {token: i for i, token in enumerate(meta['vocabulary'])}
+        index.term_counts = {field: matrix(f"bm25_counts_{i}", index.n_rows) for i, field in enumerate(index.weights)}
+        index.lengths = {field: array(f"bm25_lengths_{i}") for i, field in enumerate(index.weights)}
+        index.live = array('bm25_live')
+        index.idf = array('bm25_idf')
+        index.max_term_scores = array('bm25_max_term_scores')
+        index.matrix = matrix('bm25_matrix', index.n_rows)
+        index.n_stats = meta['n_stats']
+        index.avg_lengths = meta['avg_lengths']
+        index.extra_vocabulary = {}
+        index._clear_extra()
+        return index
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def n_tokens(self):
+        return len(self.vocabulary) + len(self.extra_vocabulary)
+
+    def _token_id(self, token):
+        token_id = self.vocabulary.get(token)
+        return self.extra_vocabulary.get(token) if token_id is None else token_id
+
+    def _count_matrix(self, field_counts):
+        rows, cols, data = [], [], []
+        for pos, row in enumerate(field_counts):
+            for token, count in row.items():
+                rows.append(self._token_id(token))
+                cols.append(pos)
+                data.append(count)
+        return sparse.csr_matrix((np.asarray(data, dtype=np.float64), (rows, cols)),
+                                 shape=(self.n_tokens, len(field_counts)))
+
+    def _clear_extra(self):
+        # Pseudo-frequencies and weights of the rows added since the last full build
+        self.n_base = self.matrix.shape[1]
+        self.extra_tf = None
+        self.extra_matrix = None
+        self.extra_max_term_scores = np.empty(0, dtype=np.float64)
+
+    def _build_weights(self):
+        """Precompute idf(t) * tf(k1 + 1) / (k1 + tf) for every token/row pair.
+
+        tf is the BM25F pseudo-frequency: field counts normalized by field
+        length relative to the average, then combined with the field weights.
+        Removed rows are left out of the statistics and the matrix.
+        """
+        live = self.live.astype(np.float64)
+        n_live = max(live.sum(), 1.0)
+        self.n_stats = float(n_live)
+        self.avg_lengths = {}
+        combined = sparse.csr_matrix((len(self.vocabulary), self.n_rows))
+        for field, weight in self.weights.items():
+            lengths = self.lengths[field]
+            avg = (lengths * live).sum() / n_live or 1.0
+            self.avg_lengths[field] = float(avg)
+            norm = weight / (1.0 - self.b + self.b * lengths / avg)
+            combined = combined + self.term_counts[field] @ sparse.diags(norm * live)
+        combined = combined.tocsr()
+        combined.eliminate_zeros()
+
+        doc_freq = np.diff(combined.indptr)
+        self.idf = self._idf(doc_freq)
+        combined.data = combined.data * (self.k1 + 1) / (self.k1 + combined.data)
+        self.matrix = (sparse.diags(self.idf) @ combined).tocsr()
+        self.max_term_scores = self.idf * (self.k1 + 1)
+
+    def _idf(self, doc_freq):
+        return np.log1p((np.maximum(self.n_stats - doc_freq, 0) + 0.5) / (doc_freq + 0.5))
+
+    def updated(self, df, removed=()):
+        """Copy of the index with df's rows appended and the removed positions dropped.
+
+        Positions never move. New rows are weighted with the idf and average
+        field lengths of the last full build (tokens it never saw get an idf
+        from the added rows), and only the extra matrix of added rows is
+        rebuilt; this index is left as it was.
+        """
+        index = copy.copy(self)
+        index.extra_vocabulary = dict(self.extra_vocabulary)
+        counts = {field: [Counter(TOKEN_PATTERN.findall(_lower_text(text)))
+                          for text in (df[field] if field in df.columns else [None] * len(df))]
+                  for field in self.weights}
+        for field_counts in counts.values():
+            for row in field_counts:
+                for token in row:
+                    if token not in index.vocabulary and token not in index.extra_vocabulary:
+                        index.extra_vocabulary[token] = index.n_tokens
+
+        tf = sparse.csr_matrix((index.n_tokens, len(df)))
+        for field, weight in self.weights.items():
+            lengths = np.asarray([sum(row.values()) for row in counts[field]], dtype=np.float64)
+            norm = weight / (1.0 - self.b + self.b * lengths / (self.avg_lengths[field] or 1.0))
+            tf = tf + index._count_matrix(counts[field]) @ sparse.diags(norm)
+        if self.extra_tf is not None:
+            old = self.extra_tf
+            if old.shape[0] < index.n_tokens:
+                old = sparse.vstack([old, sparse.csr_matrix((index.n_tokens - old.shape[0], old.shape[1]))])
+            tf = sparse.hstack([old, tf])
+        index.extra_tf = tf.tocsr()
+        index.extra_tf.eliminate_zeros()
+
+        # Tokens of the full build keep its idf; the others count documents among the added rows
+        n_base_tokens = len(self.vocabulary)
+        extra_idf = self._idf(np.diff(index.extra_tf.indptr)[n_base_tokens:])
+        weights = index.extra_tf.copy()
+        weights.data = weights.data * (self.k1 + 1) / (self.k1 + weights.data)
+        index.extra_matrix = (sparse.diags(np.concatenate([self.idf, extra_idf])) @ weights).tocsr()
+        index.extra_max_term_scores = extra_idf * (self.k1 + 1)
+
+        index.n_rows = self.n_rows + len(df)
+        index.live = np.concatenate([self.live, np.ones(len(df), dtype=bool)])
+        index.live[list(removed)] = False
+        return index
+
+    def _upper_bounds(self, query_matrix):
+        """Best attainable score of each query row, the divisor that puts scores in 0-1"""
+        n_base_tokens = len(self.vocabulary)
+        upper = query_matrix[:, :n_base_tokens] @ self.max_term_scores
+        if len(self.extra_vocabulary):
+            upper = upper + query_matrix[:, n_base_tokens:] @ self.extra_max_term_scores
+        return upper
+
+    def search(self, query, top_k=5, mask=None):
+        """Return (position, score) pairs ordered by score, best first.
+
+        Ties keep catalog order. top_k <= 0 returns every match. mask is an
+        optional boolean row array; rows outside it are never scored.
+        """
+        return self.search_batch([query], [top_k], None if mask is None else [mask])[0]
+
+    def _query_tokens(self, query):
+        return [token_id for token_id in map(self._token_id, tokenize(query.lower())) if token_id is not None]
+
+    def search_batch(self, queries, top_ks, masks=None):
+        """Score many queries with one sparse matrix multiply.
+
+        masks holds an optional boolean row array per query. Masked queries
+        are scored on their own from the rows of their tokens, dropping the
+        filtered-out columns before any score is summed.
+        """
+        masks = masks or [None] * len(queries)
+        results = [None] * len(queries)
+        batch = [i for i, mask in enumerate(masks) if mask is None]
+        for i in range(len(queries)):
+            if masks[i] is not None:
+                results[i] = self._search_masked(queries[i], top_ks[i], masks[i])
+        if not batch:
+            return results
+
+        rows, cols = [], []
+        for row, i in enumerate(batch):
+            for token in self._query_tokens(queries[i]):
+                rows.append(row)
+                cols.append(token)
+        query_matrix = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(batch), self.n_tokens)
+        )
+        scores = query_matrix[:, :len(self.vocabulary)] @ self.matrix
+        if self.extra_matrix is not None:
+            scores = sparse.hstack([scores, query_matrix @ self.extra_matrix])
+        scores = scores.tocsr()
+        scores.sort_indices()
+        upper = self._upper_bounds(query_matrix)
+
+        for row, i in enumerate(batch):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            if upper[row] <= 0 or start == end:
+                results[i] = []
+                continue
+            positions, row_scores = scores.indices[start:end], scores.data[start:end]
+            keep = self.live[positions]
+            results[i] = _top_matches(positions[keep], row_scores[keep] / upper[row], top_ks[i])
+        return results
+
+    def _search_masked(self, query, top_k, mask):
+        tokens = self._query_tokens(query)
+        n_base_tokens = len(self.vocabulary)
+        base_tokens = [token for token in tokens if token < n_base_tokens]
+        upper = self.max_term_scores[base_tokens].sum() + \
+            self.extra_max_term_scores[[token - n_base_tokens for token in tokens if token >= n_base_tokens]].sum()
+        if upper <= 0:
+            return []
+        weights = self.matrix[base_tokens]
+        indices, data = weights.indices, weights.data
+        if self.extra_matrix is not None:
+            extra = self.extra_matrix[tokens]
+            indices = np.concatenate([indices, extra.indices + self.n_base])
+            data = np.concatenate([data, extra.data])
+        keep = mask[indices] & self.live[indices]
+        positions, inverse = np.unique(indices[keep], return_inverse=True)
+        if not len(positions):
+            return []
+        scores = np.bincount(inverse, weights=data[keep], minlength=len(positions))
+        return _top_matches(positions, scores / upper, top_k)
+
+
+def _top_matches(positions, scores, top_k):
+    """(position, score) pairs best first, ties in catalog order, without sorting every match"""
+    keep = scores > 0
+    positions, scores = positions[keep], scores[keep]
+    if 0 < top_k < len(scores):
+        threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        keep = scores >= threshold
+        positions, scores = positions[keep], scores[keep]
+    order = np.lexsort((positions, -scores))
+    if top_k > 0:
+        order = order[:top_k]
+    return list(zip(positions[order].tolist(), scores[order].tolist()))
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.services.product_store import parse_categories, parse_first_image, parse_price
+
+logger = logging.getLogger(__name__)
+
+# Binary columnar artifact written by scripts/build_catalog.py, preferred over the CSVs
+CATALOG_PATHS = ['data/furniture_catalog.arrow', '../data/furniture_catalog.arrow']
+CSV_PATHS = ['data/furniture_dataset_processed.csv', '../data/furniture_dataset_processed.csv',
+             'data/furniture_dataset_cleaned.csv', '../data/furniture_dataset_cleaned.csv']
+
+# The repository's data/ directory, wherever the server is started from
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data'))
+
+_lock = threading.Lock()
+catalog_df = None
+catalog_path = None
+
+
+def find_catalog_path():
+    """CATALOG_PATH if set, else the Arrow artifact, else the processed/cleaned CSV"""
+    if os.getenv('CATALOG_PATH'):
+        return os.getenv('CATALOG_PATH')
+    for path in CATALOG_PATHS + CSV_PATHS:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError("No dataset file found")
+
+
+def catalog_fingerprint(path):
+    """Cheap version id for a catalog file, identical across workers on the same host"""
+    st = os.stat(path)
+    return f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def _arrow_types(arrow_type):
+    """Keep string and list columns as Arrow-backed arrays so they stay zero-copy"""
+    import pyarrow as pa
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) or pa.types.is_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def read_catalog(path):
+    """Read a catalog file, memory-mapping it when it is the Arrow artifact"""
+    if not path.endswith('.arrow'):
+        return pd.read_csv(path)
+
+    import pyarrow as pa
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(types_mapper=_arrow_types)
+
+
+def load_catalog():
+    """Load the catalog once per process; both routers share the returned DataFrame"""
+    global catalog_df, catalog_path
+    with _lock:
+        if catalog_df is None:
+            path = find_catalog_path()
+            catalog_df = read_catalog(path)
+            catalog_path = path
+            logger.info(f"Loaded catalog from {path} with {len(catalog_df)} products")
+    return catalog_df, catalog_path
+
+
+def set_catalog(df, path):
+    """Serve another catalog (a shared-state generation) from load_catalog()"""
+    global catalog_df, catalog_path
+    with _lock:
+        catalog_df, catalog_path = df, path
+
+
+def build_catalog(csv_path, out_path):
+    """Convert a dataset CSV into the typed Arrow IPC artifact.
+
+    Parsed fields are stored typed: cleaned_price as float64, parsed_categories
+    as list<string> and cleaned_image as the first image URL. The file is
+    uncompressed so workers can memory-map it and share the page cache.
+    """
+    import pyarrow as pa
+
+    df = pd.read_csv(csv_path)
+    source = df['parsed_categories'] if 'parsed_categories' in df.columns else df['categories']
+    df['parsed_categories'] = [parse_categories(v) for v in source]
+    if 'cleaned_price' in df.columns:
+        df['cleaned_price'] = pd.to_numeric(df['cleaned_price'], errors='coerce')
+    else:
+        df['cleaned_price'] = np.array([parse_price(v) for v in df['price']], dtype=np.float64)
+    if 'cleaned_image' not in df.columns:
+        df['cleaned_image'] = [parse_first_image(v) for v in df['images']]
+
+    fields = []
+    for column in df.columns:
+        if column == 'parsed_categories':
+            fields.append(pa.field(column, pa.list_(pa.string())))
+        elif pd.api.types.is_float_dtype(df[column]):
+            fields.append(pa.field(column, pa.float64()))
+        elif pd.api.types.is_integer_dtype(df[column]):
+            fields.append(pa.field(column, pa.int64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    table = pa.Table.from_pandas(df, schema=pa.schema(fields), preserve_index=False)
+
+    tmp_path = out_path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, out_path)
+    logger.info(f"Wrote catalog with {len(df)} products to {out_path}")
+    return out_path
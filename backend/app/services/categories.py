@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from app.services.product_store import parse_categories
+
+
+def _category_source(data):
+    return data['parsed_categories'] if 'parsed_categories' in data.columns else data['categories']
+
+
+def _flatten_parsed_strings(source):
+    """Flatten a column of category strings, parsing each distinct string once"""
+    row_codes, distinct = pd.factorize(source)
+    # Missing values get code -1, which lands on the trailing empty path
+    parsed = [parse_categories(v) for v in distinct] + [[]]
+    path_lengths = np.array([len(cats) for cats in parsed], dtype=np.int64)
+    path_starts = np.concatenate([[0], np.cumsum(path_lengths)[:-1]]).astype(np.int64)
+    flat_names = np.asarray([cat for cats in parsed for cat in cats], dtype=object)
+
+    lengths = path_lengths[row_codes]
+    level = _levels(lengths)
+    flat_index = np.repeat(path_starts[row_codes], lengths) + level
+    return lengths, level, flat_names[flat_index]
+
+
+def _flatten_arrow_lists(source):
+    """Flatten an Arrow list<string> column (the binary catalog) without Python objects"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    lists = pa.array(source.array)
+    lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy().astype(np.int64)
+    names = pc.list_flatten(lists).to_numpy(zero_copy_only=False)
+    return lengths, _levels(lengths), names
+
+
+def _levels(lengths):
+    # Position of each flattened entry inside its product's category path
+    return np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+
+def explode_categories(data):
+    """One row per (product, category) pair, indexed by the product's row label.
+
+    Columns: category (categorical, categories in first-appearance order),
+    level (0 = root of the hierarchy) and depth (length of the product's
+    category path). Parse this once per dataset and filter it per request.
+
+    Category strings repeat heavily across a catalog, so each distinct string
+    is parsed once and the result is expanded to rows with array ops. The
+    binary catalog already stores typed lists, which are flattened directly.
+    """
+    source = _category_source(data)
+    if isinstance(source.dtype, pd.ArrowDtype):
+        lengths, level, names = _flatten_arrow_lists(source)
+    else:
+        lengths, level, names = _flatten_parsed_strings(source)
+
+    name_codes, categories = pd.factorize(names)
+    return pd.DataFrame({
+        'category': pd.Categorical.from_codes(name_codes, categories),
+        'level': level,
+        'depth': np.repeat(lengths, lengths),
+    }, index=data.index[np.repeat(np.arange(len(lengths)), lengths)])
+
+
+def update_exploded(exploded, removed, added):
+    """An explode_categories frame with the removed row labels dropped and the
+    rows of another explode_categories frame appended, without re-parsing the rest"""
+    kept = exploded[~exploded.index.isin(removed)]
+    kept_categories = kept['category'].array
+    added_categories = added['category'].array
+    # Union of both category lists, existing ones first so their codes stay valid
+    names = kept_categories.categories
+    names = names.append(added_categories.categories.difference(names, sort=False))
+    added_codes = names.get_indexer(added_categories.categories)[added_categories.codes]
+    return pd.DataFrame({
+        'category': pd.Categorical.from_codes(
+            np.concatenate([kept_categories.codes, added_codes]).astype(np.int64), names),
+        'level': np.concatenate([kept['level'].to_numpy(), added['level'].to_numpy()]),
+        'depth': np.concatenate([kept['depth'].to_numpy(), added['depth'].to_numpy()]),
+    }, index=kept.index.append(added.index))
+
+
+def select_level(exploded, level=None):
+    """Keep one hierarchy level: 0 is the root, -1 the leaf, None keeps every level"""
+    if level is None:
+        return exploded
+    if level >= 0:
+        return exploded[exploded['level'] == level]
+    return exploded[exploded['level'] == exploded['depth'] + level]
+
+
+def category_counts(exploded, level=None):
+    """Product count per category, most frequent first"""
+    counts = select_level(exploded, level)['category'].value_counts()
+    return counts[counts > 0]
+
+
+def category_breakdown(exploded, values, level=None):
+    """Mean and count of a per-row numeric Series for each category.
+
+    Rows missing from values (e.g. products without a price) are ignored, so
+    the same exploded frame serves price, rating or any other breakdown.
+    """
+    selected = select_level(exploded, level)
+    selected = selected[selected.index.isin(values.index)]
+    frame = pd.DataFrame({'category': selected['category'], 'value': values.reindex(selected.index).to_numpy()})
+    stats = frame.groupby('category', observed=True)['value'].agg(['mean', 'count'])
+    stats.index = stats.index.astype(str)
+    return stats
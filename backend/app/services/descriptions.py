@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app.services.cache import LRUCache
+from app.services.catalog import DATA_DIR
+from app.services.embedding_store import text_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'google/flan-t5-small'
+# Next to the catalog, so the API and scripts/build_descriptions.py share it wherever they run from
+DEFAULT_CACHE_PATH = os.path.join(DATA_DIR, 'descriptions.sqlite3')
+MAX_WORDS = 30
+
+ENHANCEMENTS = [
+    "Discover the elegance of this",
+    "Experience the comfort and style of this",
+    "Transform your space with this beautiful",
+    "Add sophistication to your home with this"
+]
+ADDITIONS = [
+    " This modern piece combines elegant design with functional appeal, perfect for contemporary spaces.",
+    " Crafted with care, it offers both style and practicality for everyday use.",
+    " A versatile furniture item that brings comfort and elegance to any room.",
+    " Designed to enhance your decor with timeless style and quality craftsmanship."
+]
+
+
+def _clip_words(text, max_words=MAX_WORDS):
+    words = text.split()
+    return ' '.join(words[:max_words]) + '...' if len(words) > max_words else text
+
+
+def template_description(title, original_desc):
+    """Enhance the original description to ~20-30 words from fixed templates.
+
+    Templates are picked by a stable hash of the title, so every worker and
+    every restart produces the same text for the same product.
+    """
+    if not original_desc:
+        return f"Discover the elegance of this {title}. A beautiful furniture piece perfect for enhancing your living space."
+
+    pick = int(hashlib.sha1(title.encode('utf-8')).hexdigest()[:8], 16)
+    creative_desc = f"{ENHANCEMENTS[pick % len(ENHANCEMENTS)]} {title}. {original_desc}"
+
+    # Add brief descriptive content to reach 20-30 words
+    if len(creative_desc.split()) < 20:
+        creative_desc += ADDITIONS[pick % len(ADDITIONS)]
+
+    return _clip_words(creative_desc)
+
+
+def description_key(uniq_id, title, original_desc):
+    """Cache key that changes when the product's title or description is edited"""
+    text = f"{title or ''}\n{original_desc or ''}"
+    return f"{uniq_id}:{text_hash(text)}"
+
+
+class DescriptionStore:
+    """Persistent key -> generated description table in a local SQLite file.
+
+    Shared by every worker on the host and by the offline generation script.
+    Entries are never evicted: keys carry a hash of the source text, so an
+    edited product simply gets a new key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS descriptions ("
+            "key TEXT PRIMARY KEY, description TEXT NOT NULL, model TEXT, created_at REAL NOT NULL)"
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+
+    def get_many(self, keys):
+        """{key: description} for the keys that are stored"""
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, description FROM descriptions WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def set_many(self, descriptions, model=None):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO descriptions (key, description, model, created_at) VALUES (?, ?, ?, ?)",
+                [(key, text, model, now) for key, text in descriptions.items()]
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LLMDescriber:
+    """Batched description generation with a small instruction-tuned model on CPU.
+
+    Slow (tens to hundreds of milliseconds per product), so it only runs in
+    scripts/build_descriptions.py or DescriptionService's background thread.
+    """
+
+    PROMPT = ("Write an appealing two-sentence product description for this furniture item.\n"
+              "Product: {title}\nDetails: {description}")
+
+    def __init__(self, model_name=DEFAULT_MODEL, max_new_tokens=64):
+        # The model and tokenizer directly: transformers 5 dropped the text2text-generation pipeline
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        self._torch = torch
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+
+    def generate(self, items):
+        """One description per (title, original description) pair; greedy decoding, so repeatable"""
+        prompts = [self.PROMPT.format(title=title, description=(desc or '')[:500]) for title, desc in items]
+        inputs = self.tokenizer(prompts, return_tensors='pt', padding=True, truncation=True)
+        with self._torch.inference_mode():
+            outputs = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, do_sample=False)
+        texts = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        return [_clip_words(text.strip()) for text in texts]
+
+
+class DescriptionService:
+    """Creative descriptions for API responses, never generated on the request path.
+
+    Lookups go through an in-memory LRU, then the persistent store. A miss
+    is answered with the deterministic template; with a generator, the miss
+    is also queued and a background thread fills the store in batches, so
+    the next request for that product gets the generated text.
+    """
+
+    def __init__(self, store=None, generator=None, batch_size=16, queue_size=10000, memory_size=10000,
+                 memory_ttl=300.0):
+        self.store = store
+        self.generator = generator
+        self.batch_size = batch_size
+        # The TTL lets workers pick up descriptions other processes generated since
+        self.memory = LRUCache(maxsize=memory_size, ttl=memory_ttl)
+        self.generated = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        if generator is not None:
+            self._worker = threading.Thread(target=self._run, name="description-generator", daemon=True)
+            self._worker.start()
+
+    def describe_many(self, items):
+        """Descriptions for (uniq_id, title, original description) triples, in order"""
+        keys = [description_key(*item) for item in items]
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing)
+            for key, text in stored.items():
+                self.memory.set(key, text)
+            found.update(stored)
+
+        descriptions = []
+        for key, (uniq_id, title, original_desc) in zip(keys, items):
+            if key not in found:
+                found[key] = template_description(title, original_desc)
+                self.memory.set(key, found[key])
+                self._enqueue(key, title, original_desc)
+            descriptions.append(found[key])
+        return descriptions
+
+    def describe(self, uniq_id, title, original_desc):
+        return self.describe_many([(uniq_id, title, original_desc)])[0]
+
+    def _enqueue(self, key, title, original_desc):
+        if self.generator is None or self.store is None:
+            return
+        with self._queued_lock:
+            if key in self._queued:
+                return
+            try:
+                self._queue.put_nowait((key, title, original_desc))
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._queued.add(key)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                texts = self.generator.generate([(title, desc) for _, title, desc in batch])
+                generated = {key: text for (key, _, _), text in zip(batch, texts) if text}
+                self.store.set_many(generated, getattr(self.generator, 'model_name', None))
+                for key, text in generated.items():
+                    self.memory.set(key, text)
+                self.generated += len(generated)
+            except Exception as e:
+                logger.error(f"Description generation failed for {len(batch)} products: {e}")
+            finally:
+                with self._queued_lock:
+                    self._queued.difference_update(key for key, _, _ in batch)
+
+    def stats(self):
+        return {
+            "persistent": self.store is not None,
+            "stored": len(self.store) if self.store is not None else 0,
+            "generator": getattr(self.generator, 'model_name', None),
+            "queued": self._queue.qsize(),
+            "generated": self.generated,
+            "dropped": self.dropped,
+            "memory": self.memory.stats(),
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5.0)
+        if self.store is not None:
+            self.store.close()
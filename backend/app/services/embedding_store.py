@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+# Rows copied per step when rewriting a matrix, so old and new files are never fully in memory
+COPY_CHUNK_ROWS = 65536
+
+
+def embedding_text(title, description):
+    """Text embedded for a product, as in notebooks/model_training.ipynb"""
+    return f"{title or ''}. {description or ''}"
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_texts(texts, model_name=DEFAULT_MODEL, workers=1, batch_size=64):
+    """Encode texts on CPU, spreading batches over worker processes when there are enough"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    if workers > 1 and len(texts) >= workers * batch_size:
+        pool = model.start_multi_process_pool(target_devices=['cpu'] * workers)
+        try:
+            embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=len(texts) > batch_size)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _write_rows(path, source, rows, extra=None):
+    """Atomically write source[rows] (+ extra rows) as a float32 .npy file, chunk by chunk"""
+    n_extra = 0 if extra is None else len(extra)
+    dimension = source.shape[1] if source is not None else extra.shape[1]
+    tmp_path = f"{path}.tmp.npy"
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(rows) + n_extra, dimension))
+    for start in range(0, len(rows), COPY_CHUNK_ROWS):
+        chunk = rows[start:start + COPY_CHUNK_ROWS]
+        out[start:start + len(chunk)] = source[chunk]
+    if n_extra:
+        out[len(rows):] = extra
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+class EmbeddingStore:
+    """On-disk embedding cache keyed by uniq_id + hash of the embedded text.
+
+    Vectors live in a memory-mappable float32 matrix next to a JSON id map, so
+    a catalog diff only encodes new or edited products; unchanged ones are
+    copied over, whatever their row order in the catalog.
+    """
+
+    MATRIX_FILE = 'embeddings.npy'
+    INDEX_FILE = 'embeddings_index.json'
+
+    def __init__(self, directory, model_name=DEFAULT_MODEL):
+        self.directory = directory
+        self.model_name = model_name
+        self.matrix_path = os.path.join(directory, self.MATRIX_FILE)
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.keys = []
+        self.rows = {}
+        self.matrix = None
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.matrix_path)):
+            return
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index.get('model') != self.model_name:
+            logger.info(f"Embedding store was built with {index.get('model')}; re-encoding with {self.model_name}")
+            return
+        matrix = np.load(self.matrix_path, mmap_mode='r')
+        if len(matrix) != len(index['keys']):
+            logger.warning(f"Embedding store in {self.directory} is inconsistent; re-encoding")
+            return
+        self.matrix = matrix
+        self.keys = index['keys']
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def key(uniq_id, text):
+        return f"{uniq_id}:{text_hash(text)}"
+
+    def update(self, uniq_ids, texts, encode=None, workers=1, batch_size=64):
+        """Encode products not stored yet, drop ones no longer listed, and save.
+
+        encode(texts) -> float32 matrix defaults to encode_texts with this
+        store's model. Returns (encoded, removed) counts.
+        """
+        text_by_key = {}
+        for uniq_id, text in zip(uniq_ids, texts):
+            text_by_key.setdefault(self.key(uniq_id, text), text)
+
+        new_keys = [key for key in text_by_key if key not in self.rows]
+        kept_rows = sorted(self.rows[key] for key in text_by_key if key in self.rows)
+        removed = len(self.keys) - len(kept_rows)
+        if not new_keys and not removed:
+            return 0, 0
+
+        encoded = None
+        if new_keys:
+            if encode is None:
+                def encode(batch):
+                    return encode_texts(batch, self.model_name, workers, batch_size)
+            logger.info(f"Encoding {len(new_keys)} new or changed products")
+            encoded = np.asarray(encode([text_by_key[key] for key in new_keys]), dtype=np.float32)
+
+        os.makedirs(self.directory, exist_ok=True)
+        kept_keys = [self.keys[row] for row in kept_rows]
+        _write_rows(self.matrix_path, self.matrix, np.asarray(kept_rows, dtype=np.int64), encoded)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'model': self.model_name, 'keys': kept_keys + new_keys}, f)
+        os.replace(tmp_path, self.index_path)
+
+        self._load()
+        return len(new_keys), removed
+
+    def write_aligned(self, uniq_ids, texts, path):
+        """Write the vectors for these products, in this order, as a .npy matrix.
+
+        This is the row-aligned text_embeddings.npy the API memory-maps.
+        """
+        try:
+            rows = np.asarray([self.rows[self.key(u, t)] for u, t in zip(uniq_ids, texts)], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"Product {e} has no stored embedding; update the store first") from None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _write_rows(path, self.matrix, rows)
+
+
+def embed_catalog(product_store, store_dir, out_path, model_name=DEFAULT_MODEL, workers=1, batch_size=64):
+    """Bring the embedding store up to date with the catalog and write its row-aligned matrix.
+
+    Returns the aligned matrix, memory-mapped.
+    """
+    texts = [embedding_text(t, d) for t, d in zip(product_store.titles, product_store.descriptions)]
+    store = EmbeddingStore(store_dir, model_name)
+    encoded, removed = store.update(product_store.uniq_ids, texts, workers=workers, batch_size=batch_size)
+    logger.info(f"Embedding store: {encoded} encoded, {removed} removed, {len(store)} stored")
+    store.write_aligned(product_store.uniq_ids, texts, out_path)
+    return np.load(out_path, mmap_mode='r')
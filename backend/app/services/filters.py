@@ -0,0 +1,356 @@
+import copy
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from app.services.search_index import TOKEN_PATTERN
+
+ATTRIBUTE_FIELDS = ('brand', 'material', 'color', 'country_of_origin')
+FILTER_FIELDS = ATTRIBUTE_FIELDS + ('category',)
+# Longest run of words indexed for whole-word filter matching; longer filter values are checked on the candidates
+MAX_NGRAM_WORDS = 4
+
+_AMOUNT = r'\$?(\d[\d,]*(?:\.\d+)?)(?!\d|[.,]\d)'
+# A bare number followed by one of these is a size or a count, not a price ("up to 300 lbs")
+_NOT_PRICE = r'(?!\s*(?:lbs?|pounds?|kg|oz|inch(?:es)?|cm|mm|ft|feet|foot|x\b|"|%|pcs|pieces?|pack|sets?|seats?|' \
+             r'people|persons?|shelves|shelf|tiers?|drawers?|doors?|hooks?|pairs?|years?))'
+_CURRENCY = r'(?:\s*(?:dollars|bucks|usd)\b)?'
+PRICE_PATTERNS = [
+    (re.compile(rf'\bbetween\s+{_AMOUNT}\s*(?:and|to|-)\s*{_AMOUNT}{_CURRENCY}{_NOT_PRICE}'), 'range'),
+    (re.compile(rf'\$(\d[\d,]*(?:\.\d+)?)(?!\d|[.,]\d)\s*(?:-|to)\s*{_AMOUNT}{_CURRENCY}'), 'range'),
+    (re.compile(rf'(?:\b(?:under|below|less\s+than|cheaper\s+than|up\s+to|at\s+most|no\s+more\s+than|max(?:imum)?)'
+                rf'\s+|<\s*){_AMOUNT}{_CURRENCY}{_NOT_PRICE}'), 'max'),
+    (re.compile(rf'(?:\b(?:over|above|more\s+than|at\s+least|min(?:imum)?)\s+|>\s*){_AMOUNT}{_CURRENCY}{_NOT_PRICE}'),
+     'min'),
+]
+# Phrases that introduce an attribute value, tried in order: the fields the value may belong to,
+# and whether the value comes before the phrase ("X-colored") rather than after it
+ATTRIBUTE_PATTERNS = [
+    (('country_of_origin',), re.compile(r'\bmade\s+in\s+(?:the\s+)?'), False),
+    (('color', 'material'), re.compile(r'\bin\s+'), False),
+    (('color',), re.compile(r'[\s-]colou?red\b'), True),
+    (('material',), re.compile(r'\bmade\s+(?:of|from|with)\s+'), False),
+    (('brand',), re.compile(r'\b(?:by|from)\s+'), False),
+]
+_PUNCTUATION = re.compile(r'[^\w\s]*')
+# Single words of multi-word values that are too generic to stand for a value on their own
+_GENERIC_WORDS = {'and', 'with', 'the', 'for', 'store', 'home', 'furniture', 'color', 'finish', 'multi', 'other'}
+
+
+def normalize_value(value):
+    return ' '.join(str(value).lower().split()) if pd.notnull(value) and str(value).strip() else None
+
+
+def _price(text):
+    return float(text.replace(',', ''))
+
+
+def _ngrams(words):
+    return {' '.join(words[i:j]) for i in range(len(words)) for j in range(i + 1, min(i + MAX_NGRAM_WORDS, len(words)) + 1)}
+
+
+def _group_positions(keys, positions):
+    """{key: sorted int32 positions} for parallel key/position arrays"""
+    if not len(keys):
+        return {}
+    names, codes = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    positions = np.asarray(positions, dtype=np.int32)[order]
+    return {name: positions[bounds[i]:bounds[i + 1]] for i, name in enumerate(names.tolist())}
+
+
+class _Layered:
+    """A mapping shared between index copies plus the entries changed since it was
+    built; copy() copies only the changes, so an ingest never copies the whole mapping"""
+
+    def __init__(self, base, changes=None):
+        self.base = base
+        self.changes = {} if changes is None else changes
+
+    def __contains__(self, key):
+        return key in self.changes or key in self.base
+
+    def __getitem__(self, key):
+        return self.changes[key] if key in self.changes else self.base[key]
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def copy(self):
+        return _Layered(self.base, dict(self.changes))
+
+
+def _layered(mapping):
+    return mapping.copy() if isinstance(mapping, _Layered) else _Layered(mapping)
+
+
+class AttributeIndex:
+    """Precomputed lookups for structured filters over the catalog.
+
+    Every normalized brand, material, color, country and category value maps
+    to the sorted row positions that carry it, and prices are kept as a
+    sorted array (plus the row of each price) so a range is two binary
+    searches. mask() ANDs them into one boolean row mask, which the rankers
+    use to skip filtered-out rows before scoring. Rows are addressed by
+    position, matching ProductStore; removed rows are masked by the
+    snapshot's live array rather than dropped here. extended() layers the
+    values an ingest touches over the built lookups and keeps the added
+    prices in a small unsorted array, so it costs the size of the change.
+    """
+
+    def __init__(self):
+        self.n_rows = 0
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        self.sorted_prices = np.empty(0, dtype=np.float64)
+        self.price_order = np.empty(0, dtype=np.int32)
+        self.extra_prices = np.empty(0, dtype=np.float64)
+        self.extra_price_rows = np.empty(0, dtype=np.int32)
+        # Per attribute field: phrases that stand for a value in a message, the most words
+        # in one, and every run of words in a stored value mapped to the values containing it
+        self._terms = {field: {} for field in ATTRIBUTE_FIELDS}
+        self._term_words = {field: 0 for field in ATTRIBUTE_FIELDS}
+        self._ngrams = {field: {} for field in ATTRIBUTE_FIELDS}
+
+    @classmethod
+    def from_dataframe(cls, df, product_store):
+        index = cls()
+        index._append(df, product_store)
+        known = np.flatnonzero(~np.isnan(product_store.prices))
+        order = np.argsort(product_store.prices[known], kind='stable')
+        index.sorted_prices = product_store.prices[known][order]
+        index.price_order = known[order].astype(np.int32)
+        return index
+
+    def extended(self, df, product_store):
+        """Copy of the index with df's rows (parsed into product_store) appended"""
+        index = copy.copy(self)
+        index.postings = {field: _layered(values) for field, values in self.postings.items()}
+        index._terms = {field: _layered(terms) for field, terms in self._terms.items()}
+        index._term_words = dict(self._term_words)
+        index._ngrams = {field: _layered(ngrams) for field, ngrams in self._ngrams.items()}
+        start = self.n_rows
+        index._append(df, product_store)
+        known = np.flatnonzero(~np.isnan(product_store.prices))
+        index.extra_prices = np.concatenate([self.extra_prices, product_store.prices[known]])
+        index.extra_price_rows = np.concatenate([self.extra_price_rows, (known + start).astype(np.int32)])
+        return index
+
+    def _append(self, df, product_store):
+        start = self.n_rows
+        self.n_rows = start + len(product_store)
+        for field in ATTRIBUTE_FIELDS:
+            if field in df.columns:
+                values = np.array([normalize_value(v) for v in df[field]], dtype=object)
+                known = np.flatnonzero([v is not None for v in values])
+                self._add(field, values[known], known + start)
+
+        names = np.array([normalize_value(name) for name in product_store.category_names], dtype=object)
+        rows = np.repeat(np.arange(len(product_store)), np.diff(product_store.category_offsets))
+        names = names[product_store.category_codes]
+        known = np.flatnonzero([name is not None for name in names])
+        self._add('category', names[known], rows[known] + start)
+
+    def save(self, directory):
+        """Write the postings as one position array per field plus JSON value lists; only for
+        an index fresh from from_dataframe()"""
+        values = {}
+        for field, postings in self.postings.items():
+            values[field] = list(postings)
+            lists = list(postings.values())
+            np.save(os.path.join(directory, f"attributes_{field}.npy"),
+                    np.concatenate(lists) if lists else np.empty(0, dtype=np.int32))
+            np.save(os.path.join(directory, f"attributes_{field}.offsets.npy"),
+                    np.concatenate([[0], np.cumsum([len(rows) for rows in lists], dtype=np.int64)]))
+        np.save(os.path.join(directory, 'attributes_sorted_prices.npy'), self.sorted_prices)
+        np.save(os.path.join(directory, 'attributes_price_order.npy'), self.price_order)
+        with open(os.path.join(directory, 'attributes.json'), 'w') as f:
+            json.dump({'n_rows': self.n_rows, 'values': values}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Postings as views into memory-mapped arrays"""
+        with open(os.path.join(directory, 'attributes.json')) as f:
+            meta = json.load(f)
+        index = cls()
+        index.n_rows = meta['n_rows']
+        for field, values in meta['values'].items():
+            positions = np.load(os.path.join(directory, f"attributes_{field}.npy"), mmap_mode='r')
+            offsets = np.load(os.path.join(directory, f"attributes_{field}.offsets.npy"))
+            index.postings[field] = {value: positions[offsets[i]:offsets[i + 1]] for i, value in enumerate(values)}
+            if field in ATTRIBUTE_FIELDS:
+                index._index_values(field, values)
+        index.sorted_prices = np.load(os.path.join(directory, 'attributes_sorted_prices.npy'), mmap_mode='r')
+        index.price_order = np.load(os.path.join(directory, 'attributes_price_order.npy'), mmap_mode='r')
+        return index
+
+    def _add(self, field, keys, positions):
+        postings = self.postings[field]
+        added = []
+        for key, rows in _group_positions(keys, positions).items():
+            if key in postings:
+                postings[key] = np.concatenate([postings[key], rows])
+            else:
+                postings[key] = rows
+                added.append(key)
+        if field in ATTRIBUTE_FIELDS:
+            self._index_values(field, added)
+
+    def _index_values(self, field, values):
+        """Add values new to the field to the message terms and the word index"""
+        terms, ngrams = self._terms[field], self._ngrams[field]
+        grouped = {}
+        for value in values:
+            for gram in _ngrams(TOKEN_PATTERN.findall(value)):
+                grouped.setdefault(gram, []).append(value)
+            new_terms = {value}
+            if field == 'brand' and value.endswith(' store'):
+                # Amazon brands are scraped from "Visit the X Store" links
+                new_terms.add(value[:-len(' store')])
+            elif field != 'brand':
+                new_terms.update(word for word in TOKEN_PATTERN.findall(value)
+                                 if len(word) > 2 and word.isalpha() and word not in _GENERIC_WORDS)
+            for term in new_terms:
+                terms[term] = True
+            self._term_words[field] = max([self._term_words[field]] +
+                                          [len(TOKEN_PATTERN.findall(term)) for term in new_terms])
+        # New tuples rather than appends, so a copy made by extended() never changes the original
+        for gram, added in grouped.items():
+            ngrams[gram] = ngrams.get(gram, ()) + tuple(added)
+
+    def _matching_values(self, field, wanted):
+        """Stored values a filter value selects: categories by name, other fields by
+        whole words, so "white" also selects "black/white" and "off white"."""
+        if field == 'category':
+            return [wanted] if wanted in self.postings[field] else []
+        words = TOKEN_PATTERN.findall(wanted)
+        if not words:
+            return []
+        candidates = self._ngrams[field].get(' '.join(words[:MAX_NGRAM_WORDS]), ())
+        if len(words) <= MAX_NGRAM_WORDS:
+            return candidates
+        pattern = re.compile(rf'(?<!\w){re.escape(wanted)}(?!\w)')
+        return [value for value in candidates if pattern.search(value)]
+
+    def positions(self, field, wanted_values):
+        """Sorted rows whose field matches any of the wanted values"""
+        postings = self.postings[field]
+        lists = [postings[value]
+                 for wanted in wanted_values if normalize_value(wanted)
+                 for value in self._matching_values(field, normalize_value(wanted))]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(lists)) if len(lists) > 1 else lists[0]
+
+    def price_positions(self, min_price=None, max_price=None):
+        lo = 0 if min_price is None else np.searchsorted(self.sorted_prices, min_price, side='left')
+        hi = len(self.sorted_prices) if max_price is None else np.searchsorted(self.sorted_prices, max_price,
+                                                                                side='right')
+        if not len(self.extra_prices):
+            return self.price_order[lo:hi]
+        keep = np.ones(len(self.extra_prices), dtype=bool)
+        if min_price is not None:
+            keep &= self.extra_prices >= min_price
+        if max_price is not None:
+            keep &= self.extra_prices <= max_price
+        return np.concatenate([self.price_order[lo:hi], self.extra_price_rows[keep]])
+
+    def mask(self, filters):
+        """Boolean row mask selecting rows that pass every filter, or None when filters is empty.
+
+        filters maps FILTER_FIELDS to lists of values (any may match) plus
+        optional min_price / max_price; rows without a price fail a price filter.
+        """
+        selections = [self.positions(field, filters[field]) for field in FILTER_FIELDS if filters.get(field)]
+        if filters.get('min_price') is not None or filters.get('max_price') is not None:
+            selections.append(self.price_positions(filters.get('min_price'), filters.get('max_price')))
+        if not selections:
+            return None
+        selections.sort(key=len)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[selections[0]] = True
+        for positions in selections[1:]:
+            narrowed = np.zeros(self.n_rows, dtype=bool)
+            narrowed[positions] = mask[positions]
+            mask = narrowed
+        return mask
+
+    def _value_at(self, fields, text, position, before=False):
+        """The longest known value of one of fields starting at position in text (ending
+        there when before), as (field, value, start, end), or None.
+
+        When several fields know the value, the one storing it as a whole value
+        on the most rows wins, so "in wood" goes to material even though
+        "wood" is also a word of a color like "wood grain".
+        """
+        longest = max(self._term_words[field] for field in fields)
+        if not longest:
+            return None
+        if before:
+            words = list(TOKEN_PATTERN.finditer(text, 0, position))[-longest:]
+            spans = [(word.start(), position) for word in reversed(words)]
+        else:
+            words = []
+            for word in TOKEN_PATTERN.finditer(text, position):
+                if len(words) == longest:
+                    break
+                words.append(word)
+            if not words or words[0].start() != position:
+                return None
+            # A value may end in punctuation, as in "white (multi-colored)"
+            spans = [(position, end) for word in words
+                     for end in sorted({word.end(), _PUNCTUATION.match(text, word.end()).end()})]
+        for start, end in spans[::-1]:
+            value = text[start:end]
+            found = [field for field in fields if value in self._terms[field]]
+            if found:
+                field = max(found, key=lambda field: len(self.postings[field].get(value, ())))
+                return field, value, start, end
+        return None
+
+    def parse(self, message):
+        """Split simple constraints out of a shopper's message.
+
+        Returns (remaining text, filters): "metal shoe rack under $50 in white"
+        gives ("metal shoe rack", {'max_price': 50.0, 'color': ['white']}).
+        Only phrased constraints are taken (price words, "in <color>", "made of
+        <material>", "by <brand>", "made in <country>"); a bare "metal" stays a
+        search word.
+        """
+        text = ' '.join(message.lower().split())
+        filters = {}
+        for pattern, kind in PRICE_PATTERNS:
+            match = pattern.search(text)
+            if match is None:
+                continue
+            if kind == 'range':
+                low, high = sorted((_price(match.group(1)), _price(match.group(2))))
+                filters['min_price'], filters['max_price'] = low, high
+            elif kind == 'max' and 'max_price' not in filters:
+                filters['max_price'] = _price(match.group(1))
+            elif kind == 'min' and 'min_price' not in filters:
+                filters['min_price'] = _price(match.group(1))
+            text = text[:match.start()] + ' ' + text[match.end():]
+
+        for fields, pattern, before in ATTRIBUTE_PATTERNS:
+            # Right to left, skipping phrases inside a value already taken out
+            taken = len(text)
+            for match in list(pattern.finditer(text))[::-1]:
+                if match.end() > taken:
+                    continue
+                found = self._value_at(fields, text, match.start() if before else match.end(), before)
+                if found is None:
+                    continue
+                field, value, start, end = found
+                values = filters.setdefault(field, [])
+                if value not in values:
+                    values.insert(0, value)
+                taken = min(start, match.start())
+                text = text[:taken] + ' ' + text[max(end, match.end()):]
+        return ' '.join(text.split()), filters
@@ -0,0 +1,62 @@
+FUSION_METHODS = ('rrf', 'weighted')
+# Standard reciprocal-rank-fusion constant; larger values flatten the gap between top ranks
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, weights, k=DEFAULT_RRF_K, top_k=0):
+    """Fuse ranked (position, score) lists by weighted reciprocal rank.
+
+    Each list contributes weight / (k + rank) to the positions it holds,
+    so only ranks matter and scores on different scales mix safely. Ties
+    keep catalog order. top_k <= 0 returns the whole fused pool.
+    """
+    fused = {}
+    for ranked, weight in zip(rankings, weights):
+        if weight <= 0:
+            continue
+        for rank, (pos, _) in enumerate(ranked, start=1):
+            fused[pos] = fused.get(pos, 0.0) + weight / (k + rank)
+    return _best(fused, top_k)
+
+
+def weighted_score_fusion(rankings, weights, top_k=0):
+    """Fuse ranked (position, score) lists by a weighted sum of min-max normalized scores.
+
+    A position missing from a list gets 0 from it. Ties keep catalog order.
+    top_k <= 0 returns the whole fused pool.
+    """
+    fused = {}
+    for ranked, weight in zip(rankings, weights):
+        if weight <= 0 or not ranked:
+            continue
+        scores = [score for _, score in ranked]
+        low, high = min(scores), max(scores)
+        span = high - low
+        for pos, score in ranked:
+            normalized = (score - low) / span if span > 0 else 1.0
+            fused[pos] = fused.get(pos, 0.0) + weight * normalized
+    return _best(fused, top_k)
+
+
+def fuse(rankings, weights, method='rrf', k=DEFAULT_RRF_K, top_k=0):
+    if method == 'weighted':
+        return weighted_score_fusion(rankings, weights, top_k)
+    return reciprocal_rank_fusion(rankings, weights, k, top_k)
+
+
+def display_scores(fused, rankings, weights, method='rrf', k=DEFAULT_RRF_K):
+    """fused (position, score) pairs rescaled to 0-1 for display, order unchanged.
+
+    Raw fused scores are on the fusion method's own scale (about 0.03 at
+    best for RRF, up to the weight sum for weighted), so each is divided by
+    the score a position ranked first in every non-empty list would get.
+    """
+    best = sum(weight for ranked, weight in zip(rankings, weights) if weight > 0 and ranked)
+    if method != 'weighted':
+        best /= k + 1
+    return [(pos, score / best) for pos, score in fused] if best > 0 else fused
+
+
+def _best(fused, top_k):
+    ranked = sorted(fused.items(), key=lambda m: (-m[1], m[0]))
+    return ranked if top_k <= 0 else ranked[:top_k]
@@ -0,0 +1,189 @@
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.services.embedding_store import text_hash
+from app.services.vector_search import VectorSearchEngine
+
+logger = logging.getLogger(__name__)
+
+# A ~5M-parameter ViT (192-d output): same family as the notebook's classifier, small enough for CPU
+DEFAULT_IMAGE_MODEL = 'facebook/deit-tiny-patch16-224'
+MATRIX_FILE = 'image_embeddings.npy'
+INDEX_FILE = 'image_embeddings_index.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Decode JPEGs at a reduced scale; the model only sees 224x224
+DRAFT_SIZE = (448, 448)
+
+
+def cached_image_path(image_dir, url):
+    """Where the offline job keeps a product image: named by a hash of its URL"""
+    extension = os.path.splitext(url.split('?')[0])[1].lower()
+    return os.path.join(image_dir, text_hash(url) + (extension if extension in IMAGE_EXTENSIONS else '.jpg'))
+
+
+def open_image(source):
+    """RGB PIL image from a path or file object"""
+    from PIL import Image
+
+    image = Image.open(source)
+    image.draft('RGB', DRAFT_SIZE)
+    return image.convert('RGB')
+
+
+class ImageEncoder:
+    """Unit-length image embeddings from a vision transformer's [CLS] output on CPU"""
+
+    def __init__(self, model_name=DEFAULT_IMAGE_MODEL, threads=None):
+        import torch
+        from transformers import AutoImageProcessor, AutoModel
+
+        if threads:
+            torch.set_num_threads(threads)
+        self._torch = torch
+        self.model_name = model_name
+        self.processor = AutoImageProcessor.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+
+    def encode(self, images):
+        """float32 (len(images), dim) matrix for RGB PIL images"""
+        inputs = self.processor(images=images, return_tensors='pt')
+        with self._torch.inference_mode():
+            vectors = self.model(**inputs).last_hidden_state[:, 0].numpy().astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+# Set in each worker process by the pool initializer
+_worker_encoder = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_encoder
+    _worker_encoder = ImageEncoder(model_name, threads)
+
+
+def _ready():
+    return _worker_encoder.model_name
+
+
+def encode_image_bytes(data):
+    """Worker task: one uploaded photo -> float32 vector; ValueError when it isn't an image"""
+    try:
+        image = open_image(io.BytesIO(data))
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}") from None
+    return _worker_encoder.encode([image])[0]
+
+
+def encode_image_files(paths):
+    """Worker task: (indices into paths that could be read, float32 matrix of their vectors)"""
+    images, readable = [], []
+    for i, path in enumerate(paths):
+        try:
+            images.append(open_image(path))
+            readable.append(i)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable image {path}: {e}")
+    if not images:
+        return readable, None
+    return readable, _worker_encoder.encode(images)
+
+
+class ImageEncoderPool:
+    """Worker processes that each load an ImageEncoder once.
+
+    Inference runs outside the API process, so it never blocks the event
+    loop or holds the GIL against request handling. Torch threads are split
+    between the workers.
+    """
+
+    def __init__(self, model_name=DEFAULT_IMAGE_MODEL, workers=1):
+        self.model_name = model_name
+        self.workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn: forking a process that already runs threads (or torch) is unsafe
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(model_name, threads))
+
+    def warm(self, timeout=None):
+        """Start the workers and load the model now instead of on the first upload.
+
+        Waits until every worker has loaded it and raises the error of one that
+        failed (or TimeoutError), so a broken model never gets to serve uploads.
+        """
+        for future in [self.executor.submit(_ready) for _ in range(self.workers)]:
+            future.result(timeout=timeout)
+
+    async def encode(self, data):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, encode_image_bytes, data)
+
+    def encode_files(self, batches):
+        """(readable indices, vectors) per batch of paths, in order"""
+        return self.executor.map(encode_image_files, batches)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ImageEmbeddingIndex:
+    """Image embeddings keyed by uniq_id, built by scripts/build_image_embeddings.py.
+
+    The vectors are a memory-mapped float16 (n, dim) matrix. The JSON file next
+    to it lists the uniq_id and image URL hash of each row, so catalog edits
+    and re-orderings only re-encode changed images. Products without a
+    readable image have no row. search() goes through VectorSearchEngine like
+    the text embeddings.
+    """
+
+    def __init__(self, matrix, uniq_ids, sources, model_name, engine=None):
+        self.matrix = matrix
+        self.uniq_ids = list(uniq_ids)
+        self.sources = list(sources)
+        self.model_name = model_name
+        self.rows = {key: i for i, key in enumerate(zip(self.uniq_ids, self.sources))}
+        self.engine = engine
+
+    @classmethod
+    def load(cls, directory, search=False, **engine_kwargs):
+        """Memory-map the index; search=True also builds its VectorSearchEngine"""
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        matrix = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode='r')
+        if len(matrix) != len(index['uniq_ids']):
+            raise ValueError(f"Image embeddings in {directory} have {len(matrix)} rows "
+                             f"but {len(index['uniq_ids'])} ids")
+        engine = VectorSearchEngine(matrix, **engine_kwargs) if search and len(matrix) else None
+        return cls(matrix, index['uniq_ids'], index['sources'], index['model'], engine)
+
+    @staticmethod
+    def save(directory, matrix, uniq_ids, sources, model_name):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, MATRIX_FILE)
+        np.save(f"{path}.tmp.npy", np.asarray(matrix, dtype=np.float16))
+        os.replace(f"{path}.tmp.npy", path)
+        path = os.path.join(directory, INDEX_FILE)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump({'model': model_name, 'uniq_ids': list(uniq_ids), 'sources': list(sources)}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def __len__(self):
+        return len(self.uniq_ids)
+
+    def vector(self, uniq_id, source):
+        """Stored float32 vector for a product image, or None"""
+        row = self.rows.get((uniq_id, source))
+        return None if row is None else np.asarray(self.matrix[row], dtype=np.float32)
+
+    def search(self, vector, top_k):
+        """(uniq_id, cosine score) pairs of the closest product images, best first"""
+        if self.engine is None:
+            return []
+        return [(self.uniq_ids[row], score) for row, score in self.engine.search(vector, top_k)[0]]
@@ -0,0 +1,222 @@
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 1000000)
+
+# Stage timings of the request being handled, for its Server-Timing header
+request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+class Histogram:
+    """Prometheus-style histogram (cumulative buckets, count, sum) with one series per label set"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), count, total) for key, (counts, count, total) in self._series.items())
+        for key, counts, count, total in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels_text(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels_text(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_count{_labels_text(key)} {count}")
+            lines.append(f"{self.name}_sum{_labels_text(key)} {total}")
+        return lines
+
+
+class CounterMetric:
+    """Monotonic counter with one series per label set"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels_text(key)} {value}" for key, value in values)
+        return lines
+
+
+class Registry:
+    """Metrics plus gauge collectors that read current values (cache stats, dataset size) at scrape time"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text):
+        metric = CounterMetric(name, help_text)
+        self.metrics.append(metric)
+        return metric
+
+    def gauges(self, collect):
+        """collect() -> iterable of (name, help, labels dict, value); None values are skipped"""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        # Samples of one gauge must be contiguous, whichever collectors report them
+        families = {}
+        for collect in self.collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                continue
+            for name, help_text, labels, value in samples:
+                if value is not None:
+                    families.setdefault(name, (help_text, []))[1].append((labels, value))
+        for name, (help_text, samples) in families.items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+            lines.extend(f"{name}{_labels_text(tuple(sorted(labels.items())))} {float(value)}"
+                         for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+# Per worker process, like the query cache counters; served at /metrics
+registry = Registry()
+request_duration = registry.histogram('http_request_duration_seconds', 'Request latency by route')
+requests_total = registry.counter('http_requests_total', 'Requests by route and status')
+stage_duration = registry.histogram('stage_duration_seconds', 'Time spent in each pipeline stage')
+candidates = registry.histogram('search_candidates', 'Rows considered and returned per search', COUNT_BUCKETS)
+errors_total = registry.counter('errors_total', 'Unhandled errors by route and exception type')
+
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage into stage_duration_seconds and the request's Server-Timing header"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage=stage)
+        spans = request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def server_timing(spans, total):
+    """Server-Timing header value; repeated stages are summed"""
+    totals = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    parts = [f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in totals.items()]
+    return ', '.join(parts + [f"total;dur={total * 1000:.2f}"])
+
+
+def cache_gauges(name, stats):
+    """Gauge samples for an LRUCache-style stats() dict"""
+    labels = {'cache': name}
+    lookups = stats.get('hits', 0) + stats.get('misses', 0)
+    return [
+        ('cache_entries', 'Entries held by each cache', labels, stats.get('size')),
+        ('cache_hits', 'Cache hits since startup', labels, stats.get('hits')),
+        ('cache_misses', 'Cache misses since startup', labels, stats.get('misses')),
+        ('cache_hit_ratio', 'Hits / lookups since startup', labels, stats.get('hits', 0) / lookups if lookups else None),
+    ]
+
+
+class SamplingProfiler:
+    """Stack sampler for one request, enabled by the X-Profile header when PROFILER_ENABLED=1.
+
+    A background thread snapshots every thread's stack each interval and
+    keeps the ones running code under the app package, so samples of the
+    request's event loop and threadpool work are counted (concurrent requests
+    in the same worker are counted too). report() lists the hottest frames
+    and the folded stacks, ready for flamegraph tools.
+    """
+
+    def __init__(self, interval=0.001, root=None):
+        self.interval = interval
+        self.root = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or code.co_filename.startswith(self.root)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if in_app:
+                    self.stacks[';'.join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def report(self, top=30):
+        own_counts = Counter()
+        for stack, count in self.stacks.items():
+            for frame in set(stack.split(';')):
+                own_counts[frame] += count
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms", "",
+                 "Frames by share of samples:"]
+        lines.extend(f"{count / max(self.samples, 1):7.1%}  {frame}" for frame, count in own_counts.most_common(top))
+        lines.extend(["", "Folded stacks:"])
+        lines.extend(f"{stack} {count}" for stack, count in self.stacks.most_common())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDICES_FILE = 'neighbor_indices.npy'
+SCORES_FILE = 'neighbor_scores.npy'
+META_FILE = 'neighbor_table.json'
+# Query rows scored against their candidates per step, bounding the similarity block in memory
+CHUNK_ROWS = 2048
+
+
+def rows_fingerprint(uniq_ids):
+    """Hash of the catalog's uniq_id order; a table only fits a catalog with the same rows in the same order"""
+    digest = hashlib.sha256()
+    for uniq_id in uniq_ids:
+        digest.update(f"{uniq_id}\n".encode())
+    return digest.hexdigest()
+
+
+def _normalized(embeddings, rows):
+    vectors = np.asarray(embeddings[rows], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def fit_clusters(embeddings, kmeans=None, n_clusters=None):
+    """(labels, centroids) for every row; fits MiniBatchKMeans with ~sqrt(n) clusters
+    when no trained model (such as the notebook's kmeans_model.pkl) is given"""
+    if kmeans is None:
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_clusters = min(n_clusters or max(1, int(np.sqrt(len(embeddings)))), len(embeddings))
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3,
+                                 batch_size=max(1024, 4 * n_clusters))
+        kmeans.fit(np.asarray(embeddings, dtype=np.float32))
+    labels = np.concatenate([
+        kmeans.predict(np.asarray(embeddings[start:start + CHUNK_ROWS], dtype=np.float32))
+        for start in range(0, len(embeddings), CHUNK_ROWS)
+    ])
+    return labels.astype(np.int32), np.asarray(kmeans.cluster_centers_, dtype=np.float32)
+
+
+def build_neighbor_table(embeddings, labels, centroids, n_neighbors=50, probe=3):
+    """Top-n_neighbors most similar rows for every row, by cosine similarity.
+
+    KMeans clusters are the coarse prefilter: rows of a cluster are only
+    compared with rows of the probe clusters whose centroids are closest to
+    theirs, so the cost grows with cluster size instead of catalog size.
+    Rows with fewer candidates than n_neighbors are padded with -1.
+    """
+    n_rows = len(embeddings)
+    indices = np.full((n_rows, n_neighbors), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, n_neighbors), dtype=np.float16)
+
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+    members = [order[bounds[c]:bounds[c + 1]] for c in range(len(centroids))]
+    unit_centroids = _normalized(centroids, slice(None))
+    nearest_clusters = np.argsort(-(unit_centroids @ unit_centroids.T), axis=1, kind='stable')[:, :probe]
+
+    for cluster, rows in enumerate(members):
+        if not len(rows):
+            continue
+        candidates = np.sort(np.concatenate([members[c] for c in nearest_clusters[cluster]]))
+        candidate_vectors = _normalized(embeddings, candidates)
+        k = min(n_neighbors, len(candidates) - 1)
+        if k <= 0:
+            continue
+        for start in range(0, len(rows), CHUNK_ROWS):
+            chunk = rows[start:start + CHUNK_ROWS]
+            sims = _normalized(embeddings, chunk) @ candidate_vectors.T
+            # A row's own cluster is always among its nearest, so it is one of the candidates
+            sims[np.arange(len(chunk)), np.searchsorted(candidates, chunk)] = -np.inf
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_sims = np.take_along_axis(sims, top, axis=1)
+            ranked = np.argsort(-top_sims, axis=1, kind='stable')
+            indices[chunk, :k] = candidates[np.take_along_axis(top, ranked, axis=1)]
+            scores[chunk, :k] = np.take_along_axis(top_sims, ranked, axis=1)
+    return indices, scores
+
+
+class NeighborTable:
+    """Precomputed "similar products" for each catalog row.
+
+    indices holds the row positions of each row's nearest neighbors, best
+    first (int32, -1 padded), and scores their cosine similarity as float16,
+    so a product page is one row lookup. Both are memory-mapped .npy files
+    aligned with the catalog rows, like text_embeddings.npy; fingerprint is
+    rows_fingerprint() of the catalog they were built for (None for tables
+    written before it was recorded).
+    """
+
+    def __init__(self, indices, scores, fingerprint=None):
+        self.indices = indices
+        self.scores = scores
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def load(cls, directory):
+        fingerprint = None
+        if os.path.exists(os.path.join(directory, META_FILE)):
+            with open(os.path.join(directory, META_FILE)) as f:
+                fingerprint = json.load(f).get('rows_fingerprint')
+        return cls(np.load(os.path.join(directory, INDICES_FILE), mmap_mode='r'),
+                   np.load(os.path.join(directory, SCORES_FILE), mmap_mode='r'), fingerprint)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        # The fingerprint goes first and comes back last, so a save interrupted halfway is never trusted
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name, array in ((INDICES_FILE, self.indices), (SCORES_FILE, self.scores)):
+            path = os.path.join(directory, name)
+            tmp_path = f"{path}.tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump({'rows_fingerprint': self.fingerprint, 'rows': len(self)}, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def fits(self, uniq_ids):
+        """Whether the table was built for a catalog with exactly these rows"""
+        return self.fingerprint is not None and len(self) == len(uniq_ids) and \
+            self.fingerprint == rows_fingerprint(uniq_ids)
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def n_neighbors(self):
+        return self.indices.shape[1]
+
+    def neighbors(self, pos):
+        """(position, score) pairs for one row, best first"""
+        indices = self.indices[pos]
+        keep = indices >= 0
+        return list(zip(indices[keep].tolist(), self.scores[pos][keep].astype(np.float32).tolist()))
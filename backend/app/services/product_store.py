@@ -0,0 +1,226 @@
+import ast
+import copy
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+URL_PATTERN = re.compile(r'https?://[^\s\'"]+')
+
+
+def _literal_list(value):
+    """Parse a "['a', 'b']" string into a list, or None if it is not one"""
+    if value.startswith('[') and value.endswith(']'):
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+        if isinstance(parsed, (list, tuple)):
+            return list(parsed)
+    return None
+
+
+def parse_price(value):
+    """Convert a raw price like "$1,299.00" to float, or None"""
+    if pd.isnull(value) or not str(value).strip():
+        return None
+    try:
+        price_str = str(value).replace('$', '').replace(',', '').strip()
+        return float(price_str) if price_str else None
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_categories(value):
+    """Parse a categories cell (list literal or comma separated) into a list of names"""
+    if isinstance(value, list):
+        return value
+    if pd.isnull(value):
+        return []
+    cat_str = str(value)
+    parsed = _literal_list(cat_str)
+    if parsed is not None:
+        return [str(cat) for cat in parsed]
+    if cat_str.startswith('[') and cat_str.endswith(']'):
+        return [cat.strip().strip("'\"") for cat in cat_str.strip('[]').split(',') if cat.strip()]
+    return [cat.strip() for cat in cat_str.split(',') if cat.strip()]
+
+
+def parse_first_image(value):
+    """Extract the first image URL from an images cell"""
+    if pd.isnull(value):
+        return None
+    img_str = str(value).strip()
+    if img_str.startswith('[') and img_str.endswith(']'):
+        img_list = _literal_list(img_str)
+        if img_list is None:
+            urls = URL_PATTERN.findall(img_str)
+            return urls[0] if urls else None
+        return str(img_list[0]).strip().strip("'\"") if img_list else None
+    return img_str.strip("'\"")
+
+
+def _text_or_none(values):
+    return np.array([str(v) if pd.notnull(v) else None for v in values], dtype=object)
+
+
+class StringColumn:
+    """Read-only text column: one UTF-8 buffer plus int64 offsets, decoded per access.
+
+    Loaded memory-mapped from a shared build, so every worker process reads
+    the same pages instead of holding its own Python strings. Rows appended
+    by ingest are kept in a plain list after the shared ones.
+    """
+
+    def __init__(self, data, offsets, nulls, extra=()):
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+        self.extra = list(extra)
+        self.n_base = len(offsets) - 1
+
+    @staticmethod
+    def save(directory, name, values):
+        encoded = [None if v is None else str(v).encode('utf-8') for v in values]
+        lengths = np.fromiter((0 if v is None else len(v) for v in encoded), dtype=np.int64, count=len(encoded))
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), np.concatenate([[0], np.cumsum(lengths)]))
+        np.save(os.path.join(directory, f"{name}.nulls.npy"), np.array([v is None for v in encoded], dtype=bool))
+        np.save(os.path.join(directory, f"{name}.data.npy"),
+                np.frombuffer(b''.join(v for v in encoded if v is not None), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, directory, name):
+        return cls(*(np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode='r')
+                     for part in ('data', 'offsets', 'nulls')))
+
+    def __len__(self):
+        return self.n_base + len(self.extra)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, (int, np.integer)):
+            pos = int(pos) + len(self) if pos < 0 else int(pos)
+            if pos >= self.n_base:
+                return self.extra[pos - self.n_base]
+            if self.nulls[pos]:
+                return None
+            return self.data[self.offsets[pos]:self.offsets[pos + 1]].tobytes().decode('utf-8')
+        return np.array([self[p] for p in np.arange(len(self))[pos].tolist()], dtype=object)
+
+    def __iter__(self):
+        return (self[pos] for pos in range(len(self)))
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(list(self), dtype=object)
+
+    def concatenate(self, values):
+        return StringColumn(self.data, self.offsets, self.nulls, self.extra + list(values))
+
+
+def _concatenate(column, values):
+    if isinstance(column, StringColumn):
+        return column.concatenate(values)
+    return np.concatenate([column, values])
+
+
+class ProductStore:
+    """Parse-once, columnar view of the catalog used to build API responses.
+
+    Prices are a float64 array (NaN when unknown), categories are dictionary
+    encoded as int32 codes with CSR-style offsets, and text columns are plain
+    object arrays, or StringColumns when loaded from a shared build. Rows are
+    addressed by position, matching InvertedIndex.
+    """
+
+    TEXT_COLUMNS = ('uniq_ids', 'titles', 'descriptions', 'images')
+
+    def __init__(self, uniq_ids, titles, descriptions, prices, category_lists, images):
+        self.uniq_ids = np.asarray(uniq_ids, dtype=object)
+        self.titles = np.asarray(titles, dtype=object)
+        self.descriptions = np.asarray(descriptions, dtype=object)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.images = np.asarray(images, dtype=object)
+
+        vocabulary = {}
+        codes = []
+        offsets = [0]
+        for cats in category_lists:
+            for cat in cats:
+                codes.append(vocabulary.setdefault(cat, len(vocabulary)))
+            offsets.append(len(codes))
+        self.category_names = np.array(list(vocabulary), dtype=object)
+        self.category_codes = np.asarray(codes, dtype=np.int32)
+        self.category_offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build the store, reusing the notebook's preprocessed columns when present"""
+        if 'cleaned_price' in df.columns:
+            prices = pd.to_numeric(df['cleaned_price'], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            prices = np.array([parse_price(v) for v in df['price']], dtype=np.float64)
+
+        source = df['parsed_categories'] if 'parsed_categories' in df.columns else df['categories']
+        category_lists = [parse_categories(v) for v in source]
+
+        if 'cleaned_image' in df.columns:
+            images = [str(v).strip() if pd.notnull(v) else parse_first_image(raw)
+                      for v, raw in zip(df['cleaned_image'], df['images'])]
+        else:
+            images = [parse_first_image(v) for v in df['images']]
+
+        return cls(
+            uniq_ids=df['uniq_id'].astype(str).tolist(),
+            titles=[str(t) if pd.notnull(t) else "" for t in df['title']],
+            descriptions=_text_or_none(df['description']),
+            prices=prices,
+            category_lists=category_lists,
+            images=images,
+        )
+
+    def save(self, directory):
+        """Write the store as .npy arrays that load() memory-maps"""
+        for name in self.TEXT_COLUMNS:
+            StringColumn.save(directory, f"products_{name}", getattr(self, name))
+        for name in ('prices', 'category_codes', 'category_offsets'):
+            np.save(os.path.join(directory, f"products_{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'products_category_names.json'), 'w') as f:
+            json.dump(self.category_names.tolist(), f)
+
+    @classmethod
+    def load(cls, directory):
+        store = cls.__new__(cls)
+        for name in cls.TEXT_COLUMNS:
+            setattr(store, name, StringColumn.load(directory, f"products_{name}"))
+        for name in ('prices', 'category_codes', 'category_offsets'):
+            setattr(store, name, np.load(os.path.join(directory, f"products_{name}.npy"), mmap_mode='r'))
+        with open(os.path.join(directory, 'products_category_names.json')) as f:
+            store.category_names = np.array(json.load(f), dtype=object)
+        return store
+
+    def __len__(self):
+        return len(self.uniq_ids)
+
+    def extended(self, other):
+        """Copy of the store with other's rows appended after this store's rows"""
+        vocabulary = {name: i for i, name in enumerate(self.category_names.tolist())}
+        remap = np.array([vocabulary.setdefault(name, len(vocabulary)) for name in other.category_names.tolist()],
+                         dtype=np.int32)
+        store = copy.copy(self)
+        for name in self.TEXT_COLUMNS:
+            setattr(store, name, _concatenate(getattr(self, name), getattr(other, name)))
+        store.prices = np.concatenate([self.prices, other.prices])
+        store.category_names = np.array(list(vocabulary), dtype=object)
+        store.category_codes = np.concatenate([self.category_codes, remap[other.category_codes]])
+        store.category_offsets = np.concatenate([self.category_offsets,
+                                                 other.category_offsets[1:] + self.category_offsets[-1]])
+        return store
+
+    def price(self, pos):
+        value = self.prices[pos]
+        return None if np.isnan(value) else float(value)
+
+    def categories(self, pos):
+        start, end = self.category_offsets[pos], self.category_offsets[pos + 1]
+        return self.category_names[self.category_codes[start:end]].tolist()
@@ -0,0 +1,220 @@
+import copy
+import heapq
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split lowercased text into the set of word tokens used for matching"""
+    return set(TOKEN_PATTERN.findall(text))
+
+
+def _final_score(weighted_matches, n_query_words, boosted):
+    """Turn title_matches * 3 + desc_matches into the 0-1 display score"""
+    score = weighted_matches / max(n_query_words, 1)
+
+    # Boost score for products that contain the entire query as substring
+    if boosted:
+        score *= 2
+
+    # Normalize score to be between 0 and 1 for percentage display
+    return min(score / 10.0, 1.0)
+
+
+def _rank(matches, top_k):
+    """Order (position, score) pairs best first, keeping catalog order on ties.
+
+    A bounded heap picks the top_k without sorting every match; top_k <= 0
+    sorts them all.
+    """
+    if top_k <= 0:
+        return sorted(matches, key=lambda m: m[1], reverse=True)
+    return heapq.nlargest(top_k, matches, key=lambda m: m[1])
+
+
+def _lower_text(value):
+    return str(value).lower() if pd.notnull(value) else ""
+
+
+class InvertedIndex:
+    """Token -> posting list index over product titles and descriptions.
+
+    Built once at startup so a query only scores the rows that share at least
+    one token with it, instead of re-tokenizing the whole catalog per request.
+    Rows are addressed by position in the source DataFrame.
+    """
+
+    def __init__(self, titles, descriptions):
+        self.titles = [_lower_text(t) for t in titles]
+        self.descriptions = [_lower_text(d) for d in descriptions]
+        self.title_tokens = [tokenize(t) for t in self.titles]
+        self.desc_tokens = [tokenize(d) for d in self.descriptions]
+
+        postings = defaultdict(list)
+        for pos, (title_words, desc_words) in enumerate(zip(self.title_tokens, self.desc_tokens)):
+            for token in title_words | desc_words:
+                postings[token].append(pos)
+        self.postings = {token: np.asarray(rows, dtype=np.int32) for token, rows in postings.items()}
+        self.vocabulary = {token: i for i, token in enumerate(self.postings)}
+        self.match_matrix = self._build_match_matrix(0, len(self.titles))
+
+    def _build_match_matrix(self, start, stop):
+        """Sparse token x row matrix of per-field weights (title 3 + description 1)
+        for rows start..stop.
+
+        Multiplying a binary query x token matrix by it yields
+        title_matches * 3 + desc_matches for every query/row pair at once.
+        """
+        rows, cols, weights = [], [], []
+        for pos in range(start, stop):
+            title_words, desc_words = self.title_tokens[pos], self.desc_tokens[pos]
+            for token in title_words | desc_words:
+                rows.append(self.vocabulary[token])
+                cols.append(pos - start)
+                weights.append(3 * (token in title_words) + (token in desc_words))
+        return sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float64), (rows, cols)),
+            shape=(len(self.vocabulary), stop - start)
+        )
+
+    def updated(self, df, removed=()):
+        """Copy of the index with df's rows appended and the removed positions dropped.
+
+        Positions never move: new rows go after the existing ones and removed
+        rows simply stop matching. Only the posting lists of touched tokens are
+        rebuilt, and this index is left as it was for requests still using it.
+        """
+        index = copy.copy(self)
+        start = len(self.titles)
+        index.titles = self.titles + [_lower_text(t) for t in df['title']]
+        index.descriptions = self.descriptions + [_lower_text(d) for d in df['description']]
+        index.title_tokens = self.title_tokens + [tokenize(t) for t in index.titles[start:]]
+        index.desc_tokens = self.desc_tokens + [tokenize(d) for d in index.descriptions[start:]]
+
+        dropped = defaultdict(list)
+        for pos in removed:
+            for token in self.title_tokens[pos] | self.desc_tokens[pos]:
+                dropped[token].append(pos)
+        added = defaultdict(list)
+        for pos in range(start, len(index.titles)):
+            for token in index.title_tokens[pos] | index.desc_tokens[pos]:
+                added[token].append(pos)
+
+        index.postings = dict(self.postings)
+        index.vocabulary = dict(self.vocabulary)
+        for token in dropped.keys() | added.keys():
+            rows = index.postings.get(token, np.empty(0, dtype=np.int32))
+            if token in dropped:
+                rows = rows[~np.isin(rows, dropped[token])]
+            if token in added:
+                rows = np.concatenate([rows, np.asarray(added[token], dtype=np.int32)])
+                index.vocabulary.setdefault(token, len(index.vocabulary))
+            if len(rows):
+                index.postings[token] = rows
+            else:
+                index.postings.pop(token, None)
+
+        matrix = self.match_matrix
+        if len(removed):
+            keep = np.ones(start)
+            keep[list(removed)] = 0
+            matrix = (matrix @ sparse.diags(keep)).tocsr()
+            matrix.eliminate_zeros()
+        new_tokens = len(index.vocabulary) - matrix.shape[0]
+        if new_tokens:
+            matrix = sparse.vstack([matrix, sparse.csr_matrix((new_tokens, start))])
+        index.match_matrix = sparse.hstack(
+            [matrix, index._build_match_matrix(start, len(index.titles))], format='csr')
+        return index
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls(df['title'].tolist(), df['description'].tolist())
+
+    def __len__(self):
+        return len(self.titles)
+
+    def candidates(self, query_words):
+        """Sorted row positions containing at least one of the query words"""
+        lists = [self.postings[w] for w in query_words if w in self.postings]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(lists))
+
+    def score(self, pos, query_lower, query_words):
+        title = self.titles[pos]
+        description = self.descriptions[pos]
+
+        title_matches = len(query_words.intersection(self.title_tokens[pos]))
+        desc_matches = len(query_words.intersection(self.desc_tokens[pos]))
+
+        boosted = query_lower in title or query_lower in description
+
+        # Title matches count three times as much as description matches
+        return _final_score(title_matches * 3 + desc_matches, len(query_words), boosted)
+
+    def search(self, query, top_k=5, mask=None):
+        """Return (position, score) pairs ordered by score, best first.
+
+        Ties keep catalog order. top_k <= 0 returns every match. mask is an
+        optional boolean row array; candidates outside it are never scored.
+        """
+        query_lower = query.lower()
+        query_words = tokenize(query_lower)
+
+        candidates = self.candidates(query_words)
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        matches = []
+        for pos in candidates.tolist():
+            score = self.score(pos, query_lower, query_words)
+            if score > 0:
+                matches.append((pos, score))
+
+        return _rank(matches, top_k)
+
+    def search_batch(self, queries, top_ks, masks=None):
+        """Score many queries in one sparse matrix multiply.
+
+        Returns one list of (position, score) pairs per query, ranked exactly
+        as search() would rank it. masks holds an optional boolean row array
+        per query.
+        """
+        masks = masks or [None] * len(queries)
+        queries_lower = [q.lower() for q in queries]
+        query_words = [tokenize(q) for q in queries_lower]
+
+        rows, cols = [], []
+        for i, words in enumerate(query_words):
+            for w in words:
+                if w in self.vocabulary:
+                    rows.append(i)
+                    cols.append(self.vocabulary[w])
+        query_matrix = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary))
+        )
+        weighted = (query_matrix @ self.match_matrix).tocsr()
+        weighted.sort_indices()
+
+        results = []
+        for i, (query_lower, words, top_k, mask) in enumerate(zip(queries_lower, query_words, top_ks, masks)):
+            start, end = weighted.indptr[i], weighted.indptr[i + 1]
+            positions, weights = weighted.indices[start:end], weighted.data[start:end]
+            if mask is not None:
+                positions, weights = positions[mask[positions]], weights[mask[positions]]
+            positions = positions.tolist()
+            scores = [
+                _final_score(w, len(words),
+                             query_lower in self.titles[pos] or query_lower in self.descriptions[pos])
+                for pos, w in zip(positions, weights.tolist())
+            ]
+            matches = [(pos, score) for pos, score in zip(positions, scores) if score > 0]
+            results.append(_rank(matches, top_k))
+        return results
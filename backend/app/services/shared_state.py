@@ -0,0 +1,168 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.services.catalog import build_catalog, catalog_fingerprint, read_catalog
+from app.services.neighbors import INDICES_FILE, META_FILE as NEIGHBORS_META_FILE, SCORES_FILE, NeighborTable
+from app.services.snapshot import CatalogSnapshot
+from app.services.vector_search import VectorSearchEngine
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'build.lock'
+CATALOG_FILE = 'catalog.arrow'
+EMBEDDINGS_FILE = 'text_embeddings.npy'
+FAISS_FILE = 'text_embeddings.faiss'
+# Older generations stay on disk for workers still switching away from them
+KEEP_GENERATIONS = 2
+
+
+def generation_dir(root, generation):
+    return os.path.join(root, f"gen-{generation:06d}")
+
+
+def current_generation(root):
+    """Number of the published generation, or None before the first build"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+@contextmanager
+def build_lock(root):
+    """Exclusive lock across processes, so workers starting together build a generation once"""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _link_or_copy(source, target):
+    # A hard link shares the source's pages; the source is replaced atomically, never rewritten in place
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _publish(root, generation):
+    path = os.path.join(root, CURRENT_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        f.write(f"{generation}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def _prune(root, generation):
+    for name in os.listdir(root):
+        if not name.startswith('gen-'):
+            continue
+        number = name[len('gen-'):]
+        # Unfinished builds left by a crash, and generations older than the ones kept
+        if name.endswith('.tmp') or int(number) <= generation - KEEP_GENERATIONS:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def build_key(source_path, ranker='bm25', field_weights=None, embeddings_path=None, backend='auto',
+              brute_force_max_rows=50000, neighbors_dir=None):
+    """What a generation is built from; a published generation with another key is rebuilt"""
+    return {
+        'catalog_version': catalog_fingerprint(source_path),
+        'ranker': ranker,
+        'field_weights': field_weights,
+        'embeddings_version': catalog_fingerprint(embeddings_path) if embeddings_path else None,
+        'backend': backend,
+        'brute_force_max_rows': brute_force_max_rows,
+        'neighbors_version': catalog_fingerprint(os.path.join(neighbors_dir, INDICES_FILE)) if neighbors_dir else None,
+    }
+
+
+def build_generation(root, source_path, ranker='bm25', field_weights=None, embeddings_path=None, backend='auto',
+                     brute_force_max_rows=50000, neighbors_dir=None):
+    """Build the catalog, keyword and attribute indexes and vector index into a new
+    generation directory, add the neighbor table when it was built for this catalog,
+    and publish it; returns the generation number.
+
+    Everything is written to a .tmp directory first and renamed into place,
+    then CURRENT is replaced, so readers only ever see finished generations.
+    Call under build_lock().
+    """
+    key = build_key(source_path, ranker, field_weights, embeddings_path, backend, brute_force_max_rows, neighbors_dir)
+    generation = (current_generation(root) or 0) + 1
+    directory = generation_dir(root, generation)
+    tmp = f"{directory}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    catalog_path = os.path.join(tmp, CATALOG_FILE)
+    if source_path.endswith('.arrow'):
+        _link_or_copy(source_path, catalog_path)
+    else:
+        build_catalog(source_path, catalog_path)
+    df = read_catalog(catalog_path)
+    CatalogSnapshot.build(df, ranker=ranker, field_weights=field_weights).save(tmp)
+
+    embeddings, faiss_index = False, False
+    if embeddings_path:
+        matrix = np.load(embeddings_path, mmap_mode='r')
+        if len(matrix) == len(df):
+            _link_or_copy(embeddings_path, os.path.join(tmp, EMBEDDINGS_FILE))
+            engine = VectorSearchEngine(matrix, backend=backend, brute_force_max_rows=brute_force_max_rows)
+            if engine.faiss_index is not None:
+                engine.save_faiss_index(os.path.join(tmp, FAISS_FILE))
+            embeddings, faiss_index = True, engine.faiss_index is not None
+        else:
+            logger.warning(f"Embeddings in {embeddings_path} have {len(matrix)} rows but dataset has {len(df)}. "
+                           "Building without semantic search.")
+
+    neighbors = False
+    if neighbors_dir:
+        if NeighborTable.load(neighbors_dir).fits(df['uniq_id'].tolist()):
+            for name in (INDICES_FILE, SCORES_FILE, NEIGHBORS_META_FILE):
+                _link_or_copy(os.path.join(neighbors_dir, name), os.path.join(tmp, name))
+            neighbors = True
+        else:
+            logger.warning(f"Neighbor table in {neighbors_dir} was not built for this catalog's rows. "
+                           "Building without it.")
+
+    with open(os.path.join(tmp, MANIFEST_FILE), 'w') as f:
+        json.dump({**key, 'generation': generation, 'products': len(df), 'embeddings': embeddings,
+                   'faiss_index': faiss_index, 'neighbors': neighbors}, f)
+    os.replace(tmp, directory)
+    _publish(root, generation)
+    _prune(root, generation)
+    logger.info(f"Published shared generation {generation} with {len(df)} products in {directory}")
+    return generation
+
+
+def ensure_generation(root, source_path, **options):
+    """The published generation if it was built from the current inputs, else a new one.
+
+    Safe to call from every worker at startup: the first one builds while
+    the others wait on the lock, then reuse its generation.
+    """
+    with build_lock(root):
+        generation = current_generation(root)
+        if generation is not None:
+            manifest = read_manifest(generation_dir(root, generation))
+            if all(manifest.get(name) == value for name, value in build_key(source_path, **options).items()):
+                return generation
+        return build_generation(root, source_path, **options)
@@ -0,0 +1,349 @@
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from app.services.bm25 import BM25FIndex
+from app.services.embedding_store import embedding_text
+from app.services.filters import AttributeIndex
+from app.services.product_store import ProductStore, parse_categories, parse_first_image
+from app.services.search_index import InvertedIndex
+
+
+def _price_text(price):
+    return f"${price:,.2f}" if price is not None else None
+
+
+def _catalog_row(current, update, columns):
+    """Merge an update into a catalog row, keeping derived columns in step.
+
+    update holds API values: price as a number, categories and images as
+    lists. They are stored in the dataset's raw formats, and the notebook's
+    cleaned_* / parsed_* columns are recomputed from them when present.
+    """
+    row = dict(current)
+    for field, value in update.items():
+        if field == 'price':
+            row['price'] = _price_text(value)
+            row['cleaned_price'] = value
+        elif field in ('categories', 'images'):
+            row[field] = str(list(value)) if value is not None else None
+            if field == 'categories':
+                row['parsed_categories'] = parse_categories(value)
+            else:
+                row['cleaned_image'] = parse_first_image(row['images'])
+        else:
+            row[field] = value
+    if 'description' in update and 'filled_description' in columns:
+        row['filled_description'] = update['description']
+    return {column: row.get(column) for column in columns}
+
+
+def _rows_frame(rows, like, start):
+    """DataFrame of new catalog rows with the dtypes and row labels of the catalog they extend"""
+    frame = pd.DataFrame(rows, columns=like.columns, index=pd.RangeIndex(start, start + len(rows)))
+    for column, dtype in like.dtypes.items():
+        values = frame[column]
+        if column == 'parsed_categories' and not isinstance(dtype, pd.ArrowDtype):
+            # CSV catalogs keep parsed categories as their list repr
+            values = values.map(lambda v: str(v) if isinstance(v, list) else v)
+        try:
+            frame[column] = values.astype(dtype)
+        except (TypeError, ValueError):
+            frame[column] = values
+    return frame
+
+
+class SortedPositions:
+    """uniq_id -> position lookup over a shared build, for CatalogSnapshot.load.
+
+    Binary search over the build's row positions sorted by uniq_id, so no
+    per-worker dict of every id is built. Duplicated ids resolve to their
+    first row, like the dict otherwise.
+    """
+
+    def __init__(self, uniq_ids, order):
+        self.uniq_ids = uniq_ids
+        self.order = order
+
+    def _search(self, uniq_id):
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.uniq_ids[int(self.order[mid])] < uniq_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self.uniq_ids[int(self.order[lo])] == uniq_id:
+            return int(self.order[lo])
+        return None
+
+    def get(self, uniq_id, default=None):
+        pos = self._search(uniq_id)
+        return default if pos is None else pos
+
+
+class PositionOverlay:
+    """uniq_id -> position lookup: ingest changes over the lookup the snapshot was built with.
+
+    The base (a dict or SortedPositions) is shared by every snapshot applied
+    from it and never changes; None in the overlay marks a removed id, and
+    copy() copies only the overlay.
+    """
+
+    def __init__(self, base, overlay=None):
+        self.base = base
+        self.overlay = {} if overlay is None else overlay
+
+    def get(self, uniq_id, default=None):
+        pos = self.overlay[uniq_id] if uniq_id in self.overlay else self.base.get(uniq_id)
+        return default if pos is None else pos
+
+    def __contains__(self, uniq_id):
+        return self.get(uniq_id) is not None
+
+    def __getitem__(self, uniq_id):
+        pos = self.get(uniq_id)
+        if pos is None:
+            raise KeyError(uniq_id)
+        return pos
+
+    def __setitem__(self, uniq_id, pos):
+        self.overlay[uniq_id] = pos
+
+    def pop(self, uniq_id, default=None):
+        pos = self.get(uniq_id, default)
+        self.overlay[uniq_id] = None
+        return pos
+
+    def copy(self):
+        return PositionOverlay(self.base, dict(self.overlay))
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog and every structure derived from it.
+
+    Requests read the current snapshot once and use only that object, so an
+    ingest that swaps in a new one never exposes half-applied changes.
+    apply() is copy-on-write: upserted products are appended and the rows
+    they replace are tombstoned in live, so positions in the search index,
+    product store and embeddings never move between snapshots. df stays the
+    catalog the snapshot was built from; appended rows are kept in added.
+    """
+
+    def __init__(self, df, search_index, product_store, vector_engine=None, live=None, version=None,
+                 base_version=None, position_by_id=None, attributes=None, added=None, duplicates=None):
+        self.df = df
+        self.added = df.iloc[:0] if added is None else added
+        self.search_index = search_index
+        self.product_store = product_store
+        self.attributes = AttributeIndex.from_dataframe(df, product_store) if attributes is None else attributes
+        self.vector_engine = vector_engine
+        self.live = np.ones(len(df), dtype=bool) if live is None else live
+        self.version = version
+        # Version of the catalog file this snapshot was built from, before any ingest
+        self.base_version = version if base_version is None else base_version
+        if position_by_id is None:
+            # Products are addressed by uniq_id; duplicated ids resolve to their first live row
+            position_by_id, duplicates = {}, {}
+            for pos in np.flatnonzero(self.live).tolist():
+                uniq_id = product_store.uniq_ids[pos]
+                if position_by_id.setdefault(uniq_id, pos) != pos:
+                    duplicates.setdefault(uniq_id, []).append(pos)
+        if not isinstance(position_by_id, PositionOverlay):
+            position_by_id = PositionOverlay(position_by_id)
+        self.position_by_id = position_by_id
+        # uniq_id -> its live rows after the first, which an ingest of that id also replaces
+        self.duplicates = duplicates or {}
+
+    @classmethod
+    def build(cls, df, version=None, vector_engine=None, ranker='bm25', field_weights=None):
+        """Snapshot with a freshly built keyword index: "bm25" (BM25F) or "legacy"
+        (the original title/description match counting)"""
+        if ranker == 'legacy':
+            search_index = InvertedIndex.from_dataframe(df)
+        elif ranker == 'bm25':
+            search_index = BM25FIndex.from_dataframe(df, field_weights)
+        else:
+            raise ValueError(f"Unknown keyword ranker '{ranker}', expected 'bm25' or 'legacy'")
+        return cls(df, search_index, ProductStore.from_dataframe(df), vector_engine=vector_engine, version=version)
+
+    def save(self, directory):
+        """Write the product store, keyword and attribute indexes for load(); only for a snapshot fresh from build()"""
+        if len(self.product_store) != len(self.df) or not self.live.all():
+            raise ValueError("Only a snapshot built straight from a catalog file can be saved")
+        self.product_store.save(directory)
+        self.attributes.save(directory)
+        if isinstance(self.search_index, BM25FIndex):
+            self.search_index.save(directory)
+        order = np.argsort(np.asarray(self.product_store.uniq_ids, dtype=object), kind='stable')
+        np.save(os.path.join(directory, 'uniq_id_order.npy'), order.astype(np.int64))
+        with open(os.path.join(directory, 'uniq_id_duplicates.json'), 'w') as f:
+            json.dump(self.duplicates, f)
+
+    @classmethod
+    def load(cls, directory, df, version=None, vector_engine=None, ranker='bm25'):
+        """Snapshot over arrays written by save(), memory-mapped read-only.
+
+        The legacy ranker keeps per-row Python token lists, so it isn't
+        saved and is rebuilt from df here.
+        """
+        product_store = ProductStore.load(directory)
+        if ranker == 'legacy':
+            search_index = InvertedIndex.from_dataframe(df)
+        elif ranker == 'bm25':
+            search_index = BM25FIndex.load(directory)
+        else:
+            raise ValueError(f"Unknown keyword ranker '{ranker}', expected 'bm25' or 'legacy'")
+        order = np.load(os.path.join(directory, 'uniq_id_order.npy'), mmap_mode='r')
+        with open(os.path.join(directory, 'uniq_id_duplicates.json')) as f:
+            duplicates = json.load(f)
+        return cls(df, search_index, product_store, vector_engine=vector_engine, version=version,
+                   position_by_id=SortedPositions(product_store.uniq_ids, order), duplicates=duplicates,
+                   attributes=AttributeIndex.load(directory))
+
+    def __len__(self):
+        return int(self.live.sum())
+
+    def row(self, pos):
+        """Catalog row at a position, as a dict of its columns"""
+        if pos < len(self.df):
+            return self.df.iloc[pos].to_dict()
+        return self.added.iloc[pos - len(self.df)].to_dict()
+
+    def rows(self, positions):
+        """Catalog rows at sorted positions, as a frame labelled by position"""
+        positions = np.asarray(positions, dtype=np.int64)
+        split = np.searchsorted(positions, len(self.df))
+        return pd.concat([self.df.iloc[positions[:split]], self.added.iloc[positions[split:] - len(self.df)]])
+
+    def filter_mask(self, filters):
+        """Boolean mask of live rows passing the structured filters, or None without filters"""
+        mask = self.attributes.mask(filters) if filters else None
+        return None if mask is None else mask & self.live
+
+    def apply(self, upserts=(), deletes=(), encode=None, version=None):
+        """New snapshot with products upserted and deleted by uniq_id; this one is unchanged.
+
+        upserts are dicts with a uniq_id; fields left out of an update keep
+        their current values, unless the same call also deletes that uniq_id,
+        which recreates the product from scratch. encode(texts) embeds the new
+        rows when semantic search is enabled.
+        """
+        columns = self.df.columns
+        deletes = {str(uniq_id) for uniq_id in deletes}
+        merged = {}
+        for update in upserts:
+            uniq_id = str(update['uniq_id'])
+            if uniq_id in merged:
+                current = merged[uniq_id]
+            elif uniq_id in self.position_by_id and uniq_id not in deletes:
+                current = self.row(self.position_by_id[uniq_id])
+            else:
+                current = {}
+            merged[uniq_id] = _catalog_row(current, {**update, 'uniq_id': uniq_id}, columns)
+
+        touched = set(merged) | deletes
+        removed = [pos for uniq_id in touched if uniq_id in self.position_by_id
+                   for pos in [self.position_by_id[uniq_id], *self.duplicates.get(uniq_id, ())]]
+        removed = np.array(sorted(removed), dtype=np.int64)
+        start = len(self.live)
+        added = _rows_frame(list(merged.values()), self.df, start)
+
+        live = np.concatenate([self.live, np.ones(len(added), dtype=bool)])
+        live[removed] = False
+        position_by_id = self.position_by_id.copy()
+        for uniq_id in touched:
+            position_by_id.pop(uniq_id, None)
+        duplicates = {uniq_id: rows for uniq_id, rows in self.duplicates.items() if uniq_id not in touched}
+        for offset, uniq_id in enumerate(merged):
+            position_by_id[uniq_id] = start + offset
+
+        added_store = ProductStore.from_dataframe(added)
+        vector_engine = self.vector_engine
+        if vector_engine is not None:
+            texts = [embedding_text(t, d) for t, d in zip(added_store.titles, added_store.descriptions)]
+            vectors = encode(texts) if texts else np.empty((0, vector_engine.dimension), dtype=np.float32)
+            vector_engine = vector_engine.updated(vectors, removed)
+
+        return CatalogSnapshot(
+            self.df,
+            self.search_index.updated(added, removed),
+            self.product_store.extended(added_store),
+            vector_engine=vector_engine,
+            live=live,
+            version=version,
+            base_version=self.base_version,
+            position_by_id=position_by_id,
+            attributes=self.attributes.extended(added, added_store),
+            added=pd.concat([self.added, added]) if len(self.added) else added,
+            duplicates=duplicates,
+        )
+
+
+@contextmanager
+def locked_changelog(path):
+    """The changelog opened for appending, locked against other worker processes"""
+    with open(path, 'a') as log:
+        fcntl.flock(log, fcntl.LOCK_EX)
+        try:
+            yield log
+        finally:
+            fcntl.flock(log, fcntl.LOCK_UN)
+
+
+def append_changelog(log, base_version, upserts, deletes):
+    """Record an ingest so every worker, and this one after a restart, replays it on
+    top of the same catalog file. Returns the entry's byte offset, which names
+    the snapshot version it produces."""
+    entry = {'base': base_version, 'at': time.time(), 'upserts': list(upserts), 'deletes': list(deletes)}
+    offset = log.seek(0, os.SEEK_END)
+    log.write(json.dumps(entry) + '\n')
+    log.flush()
+    os.fsync(log.fileno())
+    return offset
+
+
+def changelog_version(base_version, offset):
+    return f"{base_version}+{offset}"
+
+
+def read_changelog(path, base_version, start=0):
+    """Fold the changelog entries recorded against base_version from byte offset start.
+
+    Returns (upserts, deletes, offset of the last folded entry or None, offset
+    just past the complete lines read). Entries for other catalog versions are
+    skipped: a replaced catalog file is assumed to include them already. A
+    line still being written by another worker is left for the next read.
+    """
+    if not os.path.exists(path):
+        return [], [], None, start
+    pending = {}
+    last = None
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            entry_offset, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('base') != base_version:
+                continue
+            last = entry_offset
+            # uniq_id -> (deleted from the base catalog, merged fields upserted since)
+            for uniq_id in entry['deletes']:
+                pending[str(uniq_id)] = (True, None)
+            for update in entry['upserts']:
+                uniq_id = str(update['uniq_id'])
+                deleted, fields = pending.get(uniq_id, (False, None))
+                pending[uniq_id] = (deleted, {**(fields or {}), **update})
+    upserts = [fields for _, fields in pending.values() if fields is not None]
+    deletes = [uniq_id for uniq_id, (deleted, _) in pending.items() if deleted]
+    return upserts, deletes, last, offset
@@ -0,0 +1,243 @@
+import copy
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "numpy", "ivf", "hnsw")
+# Matrix rows upcast to float32 at a time by brute-force search, bounding the temporary copy
+BLOCK_ROWS = 16384
+
+
+def _top_k(scores, top_k):
+    """Indices of the top_k largest scores, best first"""
+    if top_k <= 0 or top_k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, top_k - 1)[:top_k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def read_faiss_index(path):
+    """Load an index written by save_faiss_index, memory-mapped read-only where FAISS
+    supports it, so every process that loads the same file shares its pages"""
+    import faiss
+
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except (AttributeError, RuntimeError) as e:
+        logger.warning(f"Could not memory-map {path} ({e}); reading it into memory")
+        return faiss.read_index(path)
+
+
+class VectorSearchEngine:
+    """In-process cosine top-k search over the product embedding matrix.
+
+    The matrix is memory-mapped and searched with a brute-force NumPy matmul
+    for small catalogs. Large catalogs (or an explicit "ivf"/"hnsw" backend)
+    use a FAISS inner-product index over L2-normalized copies of the vectors.
+    Rows are addressed by position, matching the catalog DataFrame.
+    """
+
+    def __init__(self, embeddings, backend="auto", brute_force_max_rows=50000,
+                 ivf_nlist=None, ivf_nprobe=16, hnsw_m=32, hnsw_ef_search=64, faiss_index=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown vector search backend '{backend}', expected one of {BACKENDS}")
+
+        self.embeddings = embeddings
+        self.dimension = embeddings.shape[1]
+        self.brute_force_max_rows = brute_force_max_rows
+
+        # Keep the mmap zero-copy: cosine = (E @ q) / |E| with the row norms precomputed once
+        norms = np.concatenate([np.zeros(0, dtype=np.float32)] + [
+            np.linalg.norm(np.asarray(embeddings[start:start + BLOCK_ROWS], dtype=np.float32), axis=1)
+            for start in range(0, len(embeddings), BLOCK_ROWS)
+        ])
+        norms[norms == 0] = 1.0
+        self.inv_norms = 1.0 / norms
+
+        # Rows appended by updated(): brute-forced next to the base matrix until the next rebuild
+        self.extra = np.empty((0, self.dimension), dtype=np.float32)
+        self.extra_inv_norms = np.empty(0, dtype=np.float32)
+        # None while every row is live; removed rows are masked out of results
+        self.live = None
+
+        if faiss_index is not None:
+            # Prebuilt by a shared-state loader (see read_faiss_index)
+            backend = "ivf" if hasattr(faiss_index, "nprobe") else "hnsw"
+        elif backend == "auto":
+            backend = "numpy" if len(embeddings) <= brute_force_max_rows else "hnsw"
+        self.faiss_index = faiss_index
+        if faiss_index is None and backend != "numpy":
+            self.faiss_index = self._build_faiss_index(backend, ivf_nlist, ivf_nprobe, hnsw_m, hnsw_ef_search)
+            if self.faiss_index is None:
+                backend = "numpy"
+        self.backend = backend
+        logger.info(f"Vector search ready: {len(embeddings)} x {self.dimension} using {backend} backend")
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(np.load(path, mmap_mode="r"), **kwargs)
+
+    def __len__(self):
+        return len(self.embeddings) + len(self.extra)
+
+    def save_faiss_index(self, path):
+        import faiss
+
+        faiss.write_index(self.faiss_index, path)
+
+    def vector(self, pos):
+        """The stored embedding of one row"""
+        base_rows = len(self.embeddings)
+        return np.asarray(self.embeddings[pos] if pos < base_rows else self.extra[pos - base_rows], dtype=np.float32)
+
+    def updated(self, vectors, removed=()):
+        """Copy of the engine with vectors appended and the removed positions masked out.
+
+        The base matrix and FAISS index are shared rather than copied, so this
+        is cheap for a handful of changed products and leaves this engine as it
+        was for requests still using it.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+
+        engine = copy.copy(self)
+        engine.extra = np.concatenate([self.extra, vectors])
+        engine.extra_inv_norms = np.concatenate([self.extra_inv_norms, 1.0 / norms]).astype(np.float32)
+        live = np.ones(len(self), dtype=bool) if self.live is None else self.live
+        engine.live = np.concatenate([live, np.ones(len(vectors), dtype=bool)])
+        engine.live[list(removed)] = False
+        return engine
+
+    def _build_faiss_index(self, backend, ivf_nlist, ivf_nprobe, hnsw_m, hnsw_ef_search):
+        try:
+            import faiss
+        except ImportError:
+            logger.warning("faiss is not installed. Falling back to NumPy brute-force search.")
+            return None
+
+        vectors = np.ascontiguousarray(self.embeddings, dtype=np.float32) * self.inv_norms[:, None]
+        if backend == "ivf":
+            nlist = ivf_nlist or max(1, int(4 * np.sqrt(len(vectors))))
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.nprobe = min(ivf_nprobe, nlist)
+        else:
+            index = faiss.IndexHNSWFlat(self.dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = hnsw_ef_search
+        index.add(vectors)
+        return index
+
+    def search(self, query_vectors, top_k=5, min_score=None, mask=None):
+        """Return one list of (position, cosine score) pairs per query vector.
+
+        query_vectors may be a single vector or a (n_queries, dim) matrix; all
+        queries are answered with one matrix multiply. top_k <= 0 returns every
+        row, and min_score drops results below that similarity. mask is an
+        optional boolean row array shared by all the queries; only rows inside
+        it are scored.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        q_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        q_norms[q_norms == 0] = 1.0
+        queries = queries / q_norms
+
+        base_rows = len(self.embeddings)
+        if mask is not None:
+            allowed = mask if self.live is None else mask & self.live
+            positions = np.flatnonzero(allowed)
+            if self.faiss_index is None or len(positions) <= self.brute_force_max_rows:
+                ranked = self._search_rows(queries, positions, top_k)
+            else:
+                ranked = self._search_faiss_filtered(queries, allowed, top_k)
+        elif self.faiss_index is not None:
+            # Over-fetch by the number of removed rows so masking them out still leaves top_k
+            dead = 0 if self.live is None else int(base_rows - self.live[:base_rows].sum())
+            k = base_rows if top_k <= 0 else min(top_k + dead, base_rows)
+            scores, positions = self.faiss_index.search(queries, k)
+            ranked = [
+                [(int(p), float(s)) for p, s in zip(pos_row, score_row) if p >= 0 and self._is_live(p)]
+                for pos_row, score_row in zip(positions, scores)
+            ]
+            if len(self.extra):
+                extra_scores = (queries @ self.extra.T) * self.extra_inv_norms
+                ranked = [self._merge_extra(matches, scores, top_k)
+                          for matches, scores in zip(ranked, extra_scores)]
+            elif top_k > 0:
+                ranked = [matches[:top_k] for matches in ranked]
+        else:
+            all_scores = self._base_scores(queries) * self.inv_norms
+            if len(self.extra):
+                all_scores = np.hstack([all_scores, (queries @ self.extra.T) * self.extra_inv_norms])
+            if self.live is not None:
+                all_scores[:, ~self.live] = -np.inf
+            ranked = []
+            for scores in all_scores:
+                order = _top_k(scores, top_k)
+                ranked.append([(int(p), float(scores[p])) for p in order if self._is_live(p)])
+
+        if min_score is not None:
+            ranked = [[(p, s) for p, s in matches if s >= min_score] for matches in ranked]
+        return ranked
+
+    def _search_rows(self, queries, positions, top_k):
+        """Brute-force scores of just the given rows"""
+        base_rows = len(self.embeddings)
+        split = np.searchsorted(positions, base_rows)
+        base, extra = positions[:split], positions[split:] - base_rows
+        all_scores = np.hstack([self._base_scores(queries, base), queries @ self.extra[extra].T])
+        inv_norms = np.concatenate([self.inv_norms[base], self.extra_inv_norms[extra]])
+        ranked = []
+        for scores in all_scores * inv_norms:
+            order = _top_k(scores, top_k)
+            ranked.append([(int(positions[i]), float(scores[i])) for i in order])
+        return ranked
+
+    def _base_scores(self, queries, rows=None):
+        """queries @ the base matrix rows (all of them when rows is None), upcast one block
+        at a time, so a float16 matrix stays memory-mapped and shared between workers"""
+        n_rows = len(self.embeddings) if rows is None else len(rows)
+        scores = np.empty((len(queries), n_rows), dtype=np.float32)
+        for start in range(0, n_rows, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, n_rows)
+            block = self.embeddings[start:end] if rows is None else self.embeddings[rows[start:end]]
+            scores[:, start:end] = queries @ np.asarray(block, dtype=np.float32).T
+        return scores
+
+    def _search_faiss_filtered(self, queries, allowed, top_k):
+        """FAISS search restricted to allowed rows with an ID selector, so filtered-out
+        rows are skipped during the index scan instead of crowding out the top_k"""
+        import faiss
+
+        base_rows = len(self.embeddings)
+        bitmap = np.packbits(allowed[:base_rows], bitorder='little')
+        selector = faiss.IDSelectorBitmap(base_rows, faiss.swig_ptr(bitmap))
+        if isinstance(self.faiss_index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.faiss_index.hnsw.efSearch)
+        else:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.faiss_index.nprobe)
+        k = base_rows if top_k <= 0 else min(top_k, base_rows)
+        scores, positions = self.faiss_index.search(queries, k, params=params)
+        ranked = [[(int(p), float(s)) for p, s in zip(pos_row, score_row) if p >= 0]
+                  for pos_row, score_row in zip(positions, scores)]
+
+        extra = np.flatnonzero(allowed[base_rows:])
+        if len(extra):
+            extra_ranked = self._search_rows(queries, extra + base_rows, top_k)
+            ranked = [sorted(matches + more, key=lambda m: m[1], reverse=True)[:top_k if top_k > 0 else None]
+                      for matches, more in zip(ranked, extra_ranked)]
+        return ranked
+
+    def _is_live(self, pos):
+        return self.live is None or self.live[pos]
+
+    def _merge_extra(self, matches, extra_scores, top_k):
+        """Merge FAISS matches with brute-force scores of the appended rows"""
+        offset = len(self.embeddings)
+        extra = [(offset + i, float(score)) for i, score in enumerate(extra_scores.tolist())
+                 if self._is_live(offset + i)]
+        merged = sorted(matches + extra, key=lambda m: m[1], reverse=True)
+        return merged if top_k <= 0 else merged[:top_k]
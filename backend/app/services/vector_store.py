@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pinecone caps topK per query
+MAX_TOP_K = 10000
+
+
+class VectorStoreError(Exception):
+    pass
+
+
+def resolve_index_host(api_key, index_name, control_plane_url="https://api.pinecone.io", timeout=5.0):
+    """Look up an index's data-plane host from the Pinecone control plane"""
+    response = httpx.get(f"{control_plane_url}/indexes/{index_name}",
+                         headers={"Api-Key": api_key}, timeout=timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    host = response.json()["host"]
+    return host if host.startswith("http") else f"https://{host}"
+
+
+class AsyncVectorStoreClient:
+    """Async Pinecone data-plane client with pooled connections and bounded latency.
+
+    Every query has a hard deadline. When the remote index is slow or failing,
+    search() answers from the local fallback instead, and after
+    failure_threshold consecutive failures the remote is skipped entirely for
+    cooldown seconds so a degraded index cannot drag p99 latency along with it.
+    After the cooldown the circuit is half-open: one more failure opens it
+    again, a success closes it.
+    Works against any server speaking the /query REST API, including
+    scripts/mock_pinecone_server.py.
+    """
+
+    def __init__(self, host, api_key="", namespaces=("",), timeout=0.25, max_connections=20,
+                 failure_threshold=5, cooldown=30.0, transport=None):
+        self.host = host.rstrip("/")
+        self.namespaces = list(namespaces) or [""]
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._client = httpx.AsyncClient(
+            base_url=self.host,
+            headers={"Api-Key": api_key, "Content-Type": "application/json"},
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self.remote_hits = 0
+        self.fallbacks = 0
+
+    @property
+    def available(self):
+        """False while the circuit is open after repeated failures"""
+        return time.monotonic() >= self._open_until
+
+    async def query(self, vector, top_k, namespace=""):
+        """Top-k (id, score) pairs from one namespace"""
+        response = await self._client.post("/query", json={
+            "vector": [float(v) for v in vector],
+            "topK": min(top_k, MAX_TOP_K),
+            "namespace": namespace,
+            "includeValues": False,
+            "includeMetadata": False,
+        })
+        if response.status_code != 200:
+            raise VectorStoreError(f"Vector store returned {response.status_code}: {response.text[:200]}")
+        return [(m["id"], float(m["score"])) for m in response.json().get("matches", [])]
+
+    async def query_namespaces(self, vector, top_k):
+        """Query every configured namespace concurrently and merge by score"""
+        results = await asyncio.gather(*(self.query(vector, top_k, ns) for ns in self.namespaces))
+        best = {}
+        for matches in results:
+            for uniq_id, score in matches:
+                if score > best.get(uniq_id, float("-inf")):
+                    best[uniq_id] = score
+        return sorted(best.items(), key=lambda m: m[1], reverse=True)[:top_k]
+
+    async def query_many(self, vectors, top_k, max_concurrency=8):
+        """Query a batch of vectors with bounded concurrency; one result list per vector"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded(vector):
+            async with semaphore:
+                return await self.query_namespaces(vector, top_k)
+
+        return await asyncio.gather(*(bounded(v) for v in vectors))
+
+    async def search(self, vector, top_k, fallback):
+        """Remote top-k within the deadline, else the result of awaiting fallback().
+
+        Returns (matches, source) where source is "remote" or "local".
+        """
+        if top_k <= 0 or not self.available:
+            self.fallbacks += 1
+            return await fallback(), "local"
+        try:
+            matches = await asyncio.wait_for(self.query_namespaces(vector, top_k), self.timeout)
+        except (asyncio.TimeoutError, httpx.HTTPError, VectorStoreError) as e:
+            self._record_failure(e)
+            self.fallbacks += 1
+            return await fallback(), "local"
+        self._consecutive_failures = 0
+        self.remote_hits += 1
+        return matches, "remote"
+
+    def _record_failure(self, error):
+        self._consecutive_failures += 1
+        logger.warning(f"Vector store query failed ({type(error).__name__}: {error}). Using local search.")
+        if self._consecutive_failures >= self.failure_threshold:
+            self._open_until = time.monotonic() + self.cooldown
+            # Half-open once the cooldown ends: the first query then decides
+            self._consecutive_failures = self.failure_threshold - 1
+            logger.warning(f"Vector store disabled for {self.cooldown}s after repeated failures")
+
+    def stats(self):
+        return {
+            "host": self.host,
+            "namespaces": self.namespaces,
+            "available": self.available,
+            "remote_hits": self.remote_hits,
+            "fallbacks": self.fallbacks,
+        }
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,229 @@
+"""Benchmark the search and analytics hot paths on synthetic catalogs.
+
+Each catalog size runs in its own process, so peak memory is per size. The
+process records p50/p95/p99 latency and throughput for the benchmarks below,
+with the process's peak RSS so far and how far each benchmark raised it:
+
+- search_similar_products, called directly
+- POST /api/recommendations/chat through FastAPI's TestClient, with the query cache off,
+  in the server's default search mode and in hybrid mode (skipped without embeddings,
+  where hybrid is plain keyword search)
+- every GET /api/analytics/* endpoint, served from the aggregate cache and recomputed
+
+    python scripts/benchmark.py --sizes 1000,100000,1000000 --output benchmark_results.json
+    python scripts/benchmark.py --sizes 1000 --compare benchmark_results.json   # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic_catalog import ensure_catalog
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUERIES = [
+    "modern sofa", "wooden dining table", "office chair ergonomic", "black metal shoe rack",
+    "rustic brown coffee table", "storage cabinet with doors", "floor lamp", "velvet ottoman",
+    "small computer desk for home office", "mid-century nightstand", "gaming chair", "white bookcase",
+]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def summarize(timings, elapsed, peak_before):
+    ms = np.asarray(timings) * 1000.0
+    peak = peak_rss_mb()
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "iterations": len(timings),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "throughput_per_s": round(len(timings) / elapsed, 2) if elapsed > 0 else None,
+        # ru_maxrss only grows: growth is 0 unless this benchmark went past every earlier peak
+        "process_peak_rss_mb": peak,
+        "peak_rss_growth_mb": round(peak - peak_before, 1),
+    }
+
+
+def measure(call, iterations, warmup=5, before=None):
+    """Time call(i) iterations times after warmup calls; before(i) runs untimed ahead of each call"""
+    peak_before = peak_rss_mb()
+    for i in range(warmup):
+        call(i)
+    timings = []
+    elapsed = 0.0
+    for i in range(iterations):
+        if before is not None:
+            before(i)
+        start = time.perf_counter()
+        call(i)
+        timings.append(time.perf_counter() - start)
+        elapsed += timings[-1]
+    return summarize(timings, elapsed, peak_before)
+
+
+def run_size(args):
+    """Benchmark one catalog size in this process; returns the result dict"""
+    path = ensure_catalog(args.run_size, args.catalog_dir, args.seed, args.format)
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    # Local search only, nothing cached between iterations, no files written next to the app
+    os.environ.update({
+        'CATALOG_PATH': path,
+        'QUERY_CACHE_SIZE': '0',
+        'DESCRIPTION_CACHE_PATH': '',
+        'CATALOG_CHANGELOG_PATH': os.path.join(workdir, 'catalog_changes.jsonl'),
+        'PINECONE_API_KEY': '',
+        'PINECONE_INDEX_HOST': '',
+    })
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import analytics, recommendations
+
+    result = {"size": args.run_size, "catalog": os.path.basename(path)}
+    start = time.perf_counter()
+    with TestClient(app) as client:
+        while client.get('/ready').status_code != 200:
+            if app.state.startup_error:
+                raise RuntimeError(app.state.startup_error)
+            time.sleep(0.05)
+        result["load_seconds"] = round(time.perf_counter() - start, 3)
+        result["load_peak_rss_mb"] = peak_rss_mb()
+        result["search_backend"] = "vector" if recommendations.snapshot.vector_engine is not None else \
+            type(recommendations.snapshot.search_index).__name__
+        logger.info(f"{args.run_size} rows loaded in {result['load_seconds']}s")
+
+        benchmarks = {}
+        benchmarks["search_similar_products"] = measure(
+            lambda i: recommendations.search_similar_products(QUERIES[i % len(QUERIES)], args.top_k),
+            args.iterations)
+
+        def chat(i):
+            response = client.post('/api/recommendations/chat',
+                                   json={"message": QUERIES[i % len(QUERIES)], "top_k": args.top_k})
+            response.raise_for_status()
+        benchmarks["POST /chat"] = measure(chat, args.iterations)
+
+        def chat_hybrid(i):
+            response = client.post('/api/recommendations/chat', json={
+                "message": QUERIES[i % len(QUERIES)], "top_k": args.top_k, "search_mode": "hybrid"})
+            response.raise_for_status()
+        if recommendations.snapshot.vector_engine is not None:
+            benchmarks["POST /chat (hybrid)"] = measure(chat_hybrid, args.iterations)
+        else:
+            # Without embeddings hybrid requests fall back to keyword search; timing them would mislabel it
+            result["skipped"] = {"POST /chat (hybrid)": "no local embeddings"}
+            logger.info("No local embeddings: skipping POST /chat (hybrid)")
+
+        routes = [route.path for route in analytics.router.routes if 'GET' in getattr(route, 'methods', ())]
+        for route in routes:
+            url = f"/api{route}"
+
+            def get(i, url=url):
+                client.get(url).raise_for_status()
+            benchmarks[f"GET {route} (cached)"] = measure(get, args.iterations)
+            benchmarks[f"GET {route} (uncached)"] = measure(
+                get, args.cold_iterations, warmup=0, before=lambda i: analytics.aggregates.clear())
+        result["benchmarks"] = benchmarks
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def compare(results, baseline_path, threshold):
+    """Print p50/p95 ratios against a baseline file; returns the regressions beyond threshold"""
+    with open(baseline_path) as f:
+        baseline = {r["size"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get(result["size"])
+        if old is None:
+            continue
+        for name, new_stats in result["benchmarks"].items():
+            old_stats = old["benchmarks"].get(name)
+            if old_stats is None:
+                continue
+            ratios = {key: new_stats[key] / old_stats[key] if old_stats[key] else 1.0 for key in ("p50_ms", "p95_ms")}
+            flag = " REGRESSION" if max(ratios.values()) > 1 + threshold else ""
+            print(f"{result['size']:>9} {name:<45} p50 x{ratios['p50_ms']:.2f}  p95 x{ratios['p95_ms']:.2f}{flag}")
+            if flag:
+                regressions.append((result["size"], name))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search and analytics on synthetic catalogs")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--cold-iterations", type=int, default=5, help="Iterations of uncached analytics")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["arrow", "csv"], default="arrow")
+    parser.add_argument("--catalog-dir", default='../data/synthetic')
+    parser.add_argument("--output", default='benchmark_results.json')
+    parser.add_argument("--compare", help="Earlier results file to compare p50/p95 against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        with open(args.result_file, 'w') as f:
+            json.dump(run_size(args), f)
+        return
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            result_file = f.name
+        command = [sys.executable, os.path.abspath(__file__), "--run-size", str(size), "--result-file", result_file,
+                   "--iterations", str(args.iterations), "--cold-iterations", str(args.cold_iterations),
+                   "--top-k", str(args.top_k), "--seed", str(args.seed), "--format", args.format,
+                   "--catalog-dir", args.catalog_dir]
+        subprocess.run(command, check=True)
+        with open(result_file) as f:
+            results.append(json.load(f))
+        os.remove(result_file)
+        logger.info(f"Finished {size} rows")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "keyword_ranker": os.getenv('KEYWORD_RANKER', 'bm25'),
+            "iterations": args.iterations,
+            "top_k": args.top_k,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            logger.error(f"{len(regressions)} benchmarks slowed down by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import build_catalog
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    # Convert the processed dataset into the binary catalog both routers load at startup
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else '../data/furniture_dataset_processed.csv'
+    out_path = sys.argv[2] if len(sys.argv) > 2 else '../data/furniture_catalog.arrow'
+
+    if not os.path.exists(csv_path):
+        csv_path = '../data/furniture_dataset_cleaned.csv'
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError("Dataset not found")
+
+    build_catalog(csv_path, out_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import find_catalog_path, read_catalog
+from app.services.descriptions import DEFAULT_CACHE_PATH, DEFAULT_MODEL, DescriptionStore, LLMDescriber, description_key
+from app.services.product_store import ProductStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    # Fill the description cache offline so the API never waits on the model
+    parser = argparse.ArgumentParser(description="Generate creative product descriptions with a local model")
+    parser.add_argument("--dataset", help="Catalog file (default: the one the API loads)")
+    parser.add_argument("--cache", default=os.getenv('DESCRIPTION_CACHE_PATH', DEFAULT_CACHE_PATH))
+    parser.add_argument("--model", default=os.getenv('DESCRIPTION_MODEL', DEFAULT_MODEL))
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, help="Stop after this many products")
+    args = parser.parse_args()
+
+    dataset_path = args.dataset or find_catalog_path()
+    store = ProductStore.from_dataframe(read_catalog(dataset_path))
+    logger.info(f"Loaded dataset from {dataset_path} with {len(store)} products")
+
+    cache = DescriptionStore(args.cache)
+    pending = {}
+    for uniq_id, title, desc in zip(store.uniq_ids, store.titles, store.descriptions):
+        pending.setdefault(description_key(uniq_id, title, desc), (title, desc))
+    cached = cache.get_many(pending)
+    pending = [(key, item) for key, item in pending.items() if key not in cached][:args.limit]
+    logger.info(f"{len(cached)} descriptions cached, {len(pending)} to generate")
+    if not pending:
+        return
+
+    generator = LLMDescriber(args.model)
+    start = time.perf_counter()
+    for offset in range(0, len(pending), args.batch_size):
+        batch = pending[offset:offset + args.batch_size]
+        texts = generator.generate([item for _, item in batch])
+        cache.set_many({key: text for (key, _), text in zip(batch, texts) if text}, args.model)
+        done = offset + len(batch)
+        logger.info(f"Generated {done}/{len(pending)} ({done / (time.perf_counter() - start):.1f}/s)")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import find_catalog_path, read_catalog
+from app.services.embedding_store import DEFAULT_MODEL, embed_catalog
+from app.services.product_store import ProductStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    # Encode only new or changed products, then rewrite the row-aligned matrix the API loads
+    parser = argparse.ArgumentParser(description="Incrementally embed the product catalog")
+    parser.add_argument("--dataset", help="Catalog file (default: the one the API loads)")
+    parser.add_argument("--store", default='../models/embedding_store')
+    parser.add_argument("--output", default='../models/text_embeddings.npy')
+    parser.add_argument("--model", default=os.getenv('SENTENCE_MODEL', DEFAULT_MODEL))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    dataset_path = args.dataset or find_catalog_path()
+    store = ProductStore.from_dataframe(read_catalog(dataset_path))
+    logger.info(f"Loaded dataset from {dataset_path} with {len(store)} products")
+
+    start = time.perf_counter()
+    embed_catalog(store, args.store, args.output, args.model, args.workers, args.batch_size)
+    logger.info(f"Wrote {args.output} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import find_catalog_path, read_catalog
+from app.services.embedding_store import text_hash
+from app.services.image_search import DEFAULT_IMAGE_MODEL, INDEX_FILE, ImageEmbeddingIndex, ImageEncoderPool, \
+    cached_image_path
+from app.services.product_store import ProductStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def download(url, path, timeout=10.0):
+    import requests
+
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not download {url}: {e}")
+        return False
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp_path, path)
+    return True
+
+def main():
+    # Embed locally cached product images for POST /recommendations/image-search
+    parser = argparse.ArgumentParser(description="Compute image embeddings for the catalog on CPU")
+    parser.add_argument("--dataset", help="Catalog file (default: the one the API loads)")
+    parser.add_argument("--image-dir", default='../data/images', help="Local image cache, one file per image URL")
+    parser.add_argument("--output-dir", default='../models')
+    parser.add_argument("--model", default=os.getenv('IMAGE_MODEL', DEFAULT_IMAGE_MODEL))
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Encoder processes")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--download", action="store_true", help="Fetch images missing from --image-dir first")
+    parser.add_argument("--download-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    dataset_path = args.dataset or find_catalog_path()
+    store = ProductStore.from_dataframe(read_catalog(dataset_path))
+    logger.info(f"Loaded dataset from {dataset_path} with {len(store)} products")
+
+    products = []
+    seen = set()
+    for uniq_id, url in zip(store.uniq_ids, store.images):
+        if url and uniq_id not in seen:
+            seen.add(uniq_id)
+            products.append((uniq_id, text_hash(url), url, cached_image_path(args.image_dir, url)))
+
+    os.makedirs(args.image_dir, exist_ok=True)
+    if args.download:
+        missing = {url: path for _, _, url, path in products if not os.path.exists(path)}
+        logger.info(f"Downloading {len(missing)} images into {args.image_dir}")
+        with ThreadPoolExecutor(max_workers=args.download_workers) as pool:
+            fetched = sum(pool.map(download, missing.keys(), missing.values()))
+        logger.info(f"Downloaded {fetched}/{len(missing)} images")
+    cached = [product for product in products if os.path.exists(product[3])]
+    logger.info(f"{len(cached)} of {len(products)} product images are cached locally")
+
+    # Vectors of unchanged images are reused from the previous run with the same model
+    previous = None
+    if os.path.exists(os.path.join(args.output_dir, INDEX_FILE)):
+        previous = ImageEmbeddingIndex.load(args.output_dir)
+        if previous.model_name != args.model:
+            logger.info(f"Image embeddings were built with {previous.model_name}; re-encoding with {args.model}")
+            previous = None
+    vectors = {}
+    pending = []
+    for uniq_id, source, _, path in cached:
+        vector = previous.vector(uniq_id, source) if previous is not None else None
+        if vector is None:
+            pending.append((uniq_id, source, path))
+        else:
+            vectors[uniq_id] = vector
+    logger.info(f"{len(vectors)} embeddings reused, {len(pending)} images to encode")
+
+    if pending:
+        encoders = ImageEncoderPool(args.model, args.workers)
+        batches = [pending[offset:offset + args.batch_size] for offset in range(0, len(pending), args.batch_size)]
+        start = time.perf_counter()
+        done = 0
+        try:
+            for batch, (readable, encoded) in zip(batches, encoders.encode_files([[p for _, _, p in b]
+                                                                                   for b in batches])):
+                for i, vector in zip(readable, encoded if encoded is not None else []):
+                    vectors[batch[i][0]] = vector
+                done += len(batch)
+                logger.info(f"Encoded {done}/{len(pending)} ({done / (time.perf_counter() - start):.1f}/s)")
+        finally:
+            encoders.close()
+
+    rows = [(uniq_id, source) for uniq_id, source, _, _ in cached if uniq_id in vectors]
+    if not rows:
+        logger.warning("No image embeddings to write")
+        return
+    matrix = np.stack([vectors[uniq_id] for uniq_id, _ in rows])
+    ImageEmbeddingIndex.save(args.output_dir, matrix, [u for u, _ in rows], [s for _, s in rows], args.model)
+    logger.info(f"Wrote {matrix.shape[0]} x {matrix.shape[1]} float16 image embeddings to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
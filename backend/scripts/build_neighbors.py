@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import find_catalog_path, read_catalog
+from app.services.neighbors import NeighborTable, build_neighbor_table, fit_clusters, rows_fingerprint
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    # Precompute the "similar products" table served by /api/recommendations/similar/{uniq_id}
+    parser = argparse.ArgumentParser(description="Build the item-to-item nearest neighbor table")
+    parser.add_argument("--embeddings", default='../models/text_embeddings.npy')
+    parser.add_argument("--dataset", help="Catalog the embeddings are aligned with (default: the one the API loads)")
+    parser.add_argument("--kmeans", default='../models/kmeans_model.pkl',
+                        help="Trained KMeans model used as the prefilter; fitted here if missing")
+    parser.add_argument("--clusters", type=int, help="Clusters to fit when there is no model (default: sqrt(rows))")
+    parser.add_argument("--neighbors", type=int, default=50)
+    parser.add_argument("--probe", type=int, default=3, help="Nearest clusters searched per row")
+    parser.add_argument("--output-dir", default='../models')
+    args = parser.parse_args()
+
+    embeddings = np.load(args.embeddings, mmap_mode='r')
+    logger.info(f"Loaded {embeddings.shape[0]} x {embeddings.shape[1]} embeddings from {args.embeddings}")
+    # The table is stamped with the catalog's row order; the API ignores it for any other catalog
+    dataset_path = args.dataset or find_catalog_path()
+    uniq_ids = read_catalog(dataset_path)['uniq_id'].tolist()
+    if len(uniq_ids) != len(embeddings):
+        parser.error(f"{dataset_path} has {len(uniq_ids)} products but the embeddings have {len(embeddings)} rows; "
+                     "rebuild the embeddings first")
+
+    kmeans = None
+    if os.path.exists(args.kmeans):
+        import joblib
+        kmeans = joblib.load(args.kmeans)
+        if kmeans.cluster_centers_.shape[1] != embeddings.shape[1]:
+            logger.warning(f"{args.kmeans} was trained on other embeddings; fitting new clusters")
+            kmeans = None
+
+    start = time.perf_counter()
+    labels, centroids = fit_clusters(embeddings, kmeans, args.clusters)
+    logger.info(f"Assigned rows to {len(centroids)} clusters in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    indices, scores = build_neighbor_table(embeddings, labels, centroids, args.neighbors, args.probe)
+    NeighborTable(indices, scores, rows_fingerprint(uniq_ids)).save(args.output_dir)
+    logger.info(f"Wrote {args.neighbors} neighbors per product to {args.output_dir} "
+                f"in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dotenv import load_dotenv
+
+from app.routers.recommendations import shared_build_options
+from app.services.catalog import find_catalog_path
+from app.services.shared_state import build_generation, build_lock, ensure_generation
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    # Build the catalog and indexes once for every worker started with SHARED_STATE_DIR.
+    # Running workers switch to the new generation on their next poll.
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build and publish a shared catalog generation")
+    parser.add_argument("--root", default=os.getenv('SHARED_STATE_DIR'), help="Shared state directory")
+    parser.add_argument("--dataset", help="Catalog file (default: the one the API loads)")
+    parser.add_argument("--force", action="store_true",
+                        help="Publish a new generation even if the current one matches the inputs")
+    args = parser.parse_args()
+    if not args.root:
+        parser.error("--root or SHARED_STATE_DIR is required")
+
+    # Same settings as the API, so workers reuse this build instead of rebuilding
+    source_path = args.dataset or find_catalog_path()
+    options = shared_build_options()
+    if args.force:
+        with build_lock(args.root):
+            generation = build_generation(args.root, source_path, **options)
+    else:
+        generation = ensure_generation(args.root, source_path, **options)
+    logger.info(f"Generation {generation} of {source_path} is current in {args.root}")
+
+if __name__ == "__main__":
+    main()
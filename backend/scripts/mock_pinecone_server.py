@@ -0,0 +1,131 @@
+"""Local stand-in for the Pinecone data-plane REST API.
+
+Implements /vectors/upsert, /vectors/fetch, /vectors/delete, /query and
+/describe_index_stats over in-memory NumPy arrays, with optional injected
+latency and failures for exercising timeouts and fallbacks:
+
+    python scripts/mock_pinecone_server.py --port 8100 --latency-ms 50 --failure-rate 0.1
+
+Then point the backend at it with PINECONE_INDEX_HOST=http://localhost:8100.
+"""
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+
+class Vector(BaseModel):
+    id: str
+    values: List[float]
+    metadata: Optional[Dict[str, Any]] = None
+
+
+class UpsertRequest(BaseModel):
+    vectors: List[Vector]
+    namespace: str = ""
+
+
+class QueryRequest(BaseModel):
+    vector: List[float]
+    topK: int = 10
+    namespace: str = ""
+    includeValues: bool = False
+    includeMetadata: bool = False
+
+
+class DeleteRequest(BaseModel):
+    ids: List[str] = []
+    namespace: str = ""
+    deleteAll: bool = False
+
+
+def create_app(latency_ms=0.0, failure_rate=0.0):
+    app = FastAPI(title="Mock Pinecone")
+    namespaces = defaultdict(dict)  # namespace -> id -> (values, metadata)
+    app.state.latency_ms = latency_ms
+    app.state.failure_rate = failure_rate
+    app.state.namespaces = namespaces
+
+    async def degrade():
+        if app.state.latency_ms:
+            await asyncio.sleep(app.state.latency_ms / 1000.0)
+        if app.state.failure_rate and random.random() < app.state.failure_rate:
+            raise HTTPException(status_code=503, detail="Injected failure")
+
+    @app.post("/vectors/upsert")
+    async def upsert(payload: UpsertRequest):
+        await degrade()
+        store = namespaces[payload.namespace]
+        for v in payload.vectors:
+            store[v.id] = (np.asarray(v.values, dtype=np.float32), v.metadata or {})
+        return {"upsertedCount": len(payload.vectors)}
+
+    @app.get("/vectors/fetch")
+    async def fetch(ids: List[str] = Query(...), namespace: str = ""):
+        await degrade()
+        store = namespaces[namespace]
+        return {"namespace": namespace, "vectors": {
+            i: {"id": i, "values": store[i][0].tolist(), "metadata": store[i][1]} for i in ids if i in store
+        }}
+
+    @app.post("/vectors/delete")
+    async def delete(payload: DeleteRequest):
+        await degrade()
+        store = namespaces[payload.namespace]
+        if payload.deleteAll:
+            store.clear()
+        for i in payload.ids:
+            store.pop(i, None)
+        return {}
+
+    @app.post("/query")
+    async def query(payload: QueryRequest):
+        await degrade()
+        store = namespaces[payload.namespace]
+        if not store:
+            return {"namespace": payload.namespace, "matches": []}
+        ids = list(store)
+        matrix = np.stack([store[i][0] for i in ids])
+        q = np.asarray(payload.vector, dtype=np.float32)
+        scores = matrix @ q / (np.linalg.norm(matrix, axis=1) * (np.linalg.norm(q) or 1.0) + 1e-12)
+        order = np.argsort(-scores)[:payload.topK]
+        matches = []
+        for i in order:
+            match = {"id": ids[i], "score": float(scores[i])}
+            if payload.includeValues:
+                match["values"] = store[ids[i]][0].tolist()
+            if payload.includeMetadata:
+                match["metadata"] = store[ids[i]][1]
+            matches.append(match)
+        return {"namespace": payload.namespace, "matches": matches}
+
+    @app.post("/describe_index_stats")
+    @app.get("/describe_index_stats")
+    async def describe_index_stats():
+        dims = {len(v[0]) for store in namespaces.values() for v in store.values()}
+        return {
+            "dimension": dims.pop() if len(dims) == 1 else 0,
+            "totalVectorCount": sum(len(store) for store in namespaces.values()),
+            "namespaces": {ns: {"vectorCount": len(store)} for ns, store in namespaces.items()},
+        }
+
+    return app
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.failure_rate), host=args.host, port=args.port)
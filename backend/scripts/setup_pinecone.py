@@ -1,110 +1,359 @@
+"""Bulk-load product embeddings into the Pinecone index.
+
+Batches are built lazily and upserted concurrently by a bounded worker pool,
+with retry and exponential backoff on throttling, server errors and dropped
+connections. Progress is checkpointed per uniq_id with a content hash of
+title + description, so a rerun only sends products that are missing from
+the index or whose text changed. Products that were indexed but have left the
+catalog are deleted from the index. Batches that still fail after retrying
+are reported and left out of the checkpoint for the next run.
+
+    python scripts/setup_pinecone.py                      # uses PINECONE_API_KEY
+    python scripts/setup_pinecone.py --host http://localhost:8100   # mock index
+"""
+import argparse
+import hashlib
+import json
 import os
-import pandas as pd
+import random
+import sys
+import threading
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
 import numpy as np
-import pinecone
-from sentence_transformers import SentenceTransformer
+import pandas as pd
 from dotenv import load_dotenv
-import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import find_catalog_path, read_catalog
+from app.services.embedding_store import embed_catalog
+from app.services.product_store import ProductStore
+from app.services.vector_store import resolve_index_host
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def setup_pinecone():
-    # Load environment variables
-    pinecone_api_key = os.getenv('PINECONE_API_KEY')
-    pinecone_env = os.getenv('PINECONE_ENVIRONMENT', 'gcp-starter')
-
-    if not pinecone_api_key:
-        raise ValueError("PINECONE_API_KEY not found in environment variables")
-
-    # Initialize Pinecone
-    pinecone.init(api_key=pinecone_api_key, environment=pinecone_env)
-    logger.info("Pinecone initialized")
-
-    # Define index name and dimension
-    index_name = "furniture-recommendations"
-    dimension = 384  # all-MiniLM-L6-v2 dimension
-
-    # Create index if it doesn't exist
-    if index_name not in pinecone.list_indexes():
-        pinecone.create_index(
-            name=index_name,
-            dimension=dimension,
-            metric="cosine",
-            pods=1,
-            replicas=1
-        )
-        logger.info(f"Created Pinecone index: {index_name}")
-    else:
+INDEX_NAME = "furniture-recommendations"
+DIMENSION = 384  # all-MiniLM-L6-v2 dimension
+CONTROL_PLANE_URL = "https://api.pinecone.io"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class UpsertError(Exception):
+    pass
+
+
+def content_hash(title, description):
+    """Checkpoint key for a product's embedded text; changes when title or description does"""
+    text = f"{title or ''}\n{description or ''}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def ensure_index(api_key, index_name, dimension):
+    """Return the index's data-plane host, creating a serverless index if it doesn't exist"""
+    host = resolve_index_host(api_key, index_name, CONTROL_PLANE_URL)
+    if host is not None:
         logger.info(f"Pinecone index {index_name} already exists")
+        return host
 
-    # Connect to index
-    index = pinecone.Index(index_name)
+    response = httpx.post(f"{CONTROL_PLANE_URL}/indexes", headers={"Api-Key": api_key}, timeout=30.0, json={
+        "name": index_name,
+        "dimension": dimension,
+        "metric": "cosine",
+        "spec": {"serverless": {
+            "cloud": os.getenv('PINECONE_CLOUD', 'aws'),
+            "region": os.getenv('PINECONE_REGION', 'us-east-1'),
+        }},
+    })
+    response.raise_for_status()
+    logger.info(f"Created Pinecone index: {index_name}")
 
-    # Load dataset
-    df_path = '../data/furniture_dataset_final.csv'
-    if not os.path.exists(df_path):
-        df_path = '../data/furniture_dataset_cleaned.csv'
-        if not os.path.exists(df_path):
-            raise FileNotFoundError("Dataset not found")
-
-    df = pd.read_csv(df_path)
-    logger.info(f"Loaded dataset with {len(df)} products")
-
-    # Load or create embeddings
-    embeddings_path = '../models/text_embeddings.npy'
-    if os.path.exists(embeddings_path):
-        embeddings = np.load(embeddings_path)
-        logger.info(f"Loaded embeddings from {embeddings_path}")
-    else:
-        # Generate embeddings
-        logger.info("Generating embeddings...")
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        df['text_for_embedding'] = df['title'].fillna('') + '. ' + df['description'].fillna('')
-        embeddings = model.encode(df['text_for_embedding'].tolist(), show_progress_bar=True)
-        np.save(embeddings_path, embeddings)
-        logger.info(f"Generated and saved embeddings to {embeddings_path}")
-
-    # Prepare vectors for Pinecone
+    # A new index takes a moment before it accepts writes
+    while True:
+        status = httpx.get(f"{CONTROL_PLANE_URL}/indexes/{index_name}",
+                           headers={"Api-Key": api_key}, timeout=30.0).json()
+        if status.get("status", {}).get("ready"):
+            host = status["host"]
+            return host if host.startswith("http") else f"https://{host}"
+        time.sleep(2)
+
+
+class Checkpoint:
+    """uniq_id -> content hash of everything confirmed written to one index namespace.
+
+    The file is a JSON-lines log: a compacted {"target", "hashes"} line, then
+    one line per confirmed batch ({"hashes": ...}) or deletion ({"deleted":
+    ...}). Recording a batch appends one short line instead of rewriting the
+    whole checkpoint, and compact() folds the log back into one line, written
+    atomically (write then rename). A line cut off by a crash is ignored, so
+    at worst the batches in flight are sent again.
+    """
+
+    def __init__(self, path, host, namespace, resume=True):
+        self.path = path
+        self.target = f"{host}|{namespace}"
+        self.hashes = {}
+        self._lock = threading.Lock()
+        self._log = None
+        if resume and os.path.exists(path):
+            self._load()
+        self.compact()
+
+    def _load(self):
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        for i, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning(f"Ignoring truncated line {i + 1} of checkpoint {self.path}")
+                continue
+            if i == 0:
+                if entry.get("target") != self.target:
+                    logger.info(f"Checkpoint {self.path} is for {entry.get('target')}; starting fresh")
+                    return
+                self.hashes = entry.get("hashes", {})
+                continue
+            self.hashes.update(entry.get("hashes", {}))
+            for uniq_id in entry.get("deleted", []):
+                self.hashes.pop(uniq_id, None)
+
+    def is_current(self, uniq_id, digest):
+        return self.hashes.get(uniq_id) == digest
+
+    def mark(self, entries):
+        self._append({"hashes": entries})
+
+    def forget(self, uniq_ids):
+        self._append({"deleted": list(uniq_ids)})
+
+    def _append(self, entry):
+        with self._lock:
+            self.hashes.update(entry.get("hashes", {}))
+            for uniq_id in entry.get("deleted", []):
+                self.hashes.pop(uniq_id, None)
+            self._log.write(json.dumps(entry) + '\n')
+            self._log.flush()
+
+    def compact(self):
+        """Rewrite the log as a single line and reopen it for appending"""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps({"target": self.target, "hashes": self.hashes}) + '\n')
+            os.replace(tmp_path, self.path)
+            self._log = open(self.path, 'a')
+
+    def close(self):
+        self.compact()
+        with self._lock:
+            self._log.close()
+
+
+def pending_batches(store, brands, embeddings, checkpoint, batch_size):
+    """Yield (vectors, {uniq_id: hash}) batches for products missing from the checkpoint.
+
+    Vector dicts are only materialized one batch at a time. Duplicate uniq_ids
+    keep their first row, matching how the API maps remote matches back to rows.
+    """
+    seen = set()
+    batch = []
+    for pos, uniq_id in enumerate(store.uniq_ids):
+        if uniq_id in seen:
+            continue
+        seen.add(uniq_id)
+        digest = content_hash(store.titles[pos], store.descriptions[pos])
+        if checkpoint.is_current(uniq_id, digest):
+            continue
+        batch.append((pos, uniq_id, digest))
+        if len(batch) == batch_size:
+            yield _build_batch(store, brands, embeddings, batch)
+            batch = []
+    if batch:
+        yield _build_batch(store, brands, embeddings, batch)
+
+
+def _build_batch(store, brands, embeddings, batch):
+    positions = [pos for pos, _, _ in batch]
+    values = np.asarray(embeddings[positions], dtype=np.float32).tolist()
     vectors = []
-    for i, row in df.iterrows():
-        # Clean metadata
-        metadata = {
-            "title": str(row['title']) if pd.notnull(row['title']) else "",
-            "description": str(row['description']) if pd.notnull(row['description']) else "",
-            "price": float(row['price']) if pd.notnull(row['price']) else 0.0,
-            "brand": str(row['brand']) if pd.notnull(row['brand']) else "",
-            "categories": str(row['categories']) if pd.notnull(row['categories']) else "",
-            "image": str(row['images']) if pd.notnull(row['images']) else "",
-        }
-
-        vector = {
-            "id": str(row['uniq_id']),
-            "values": embeddings[i].tolist(),
-            "metadata": metadata
-        }
-        vectors.append(vector)
-
-    # Upload vectors in batches
-    batch_size = 100
-    total_batches = (len(vectors) + batch_size - 1) // batch_size
-
-    for i in range(0, len(vectors), batch_size):
-        batch = vectors[i:i+batch_size]
+    for (pos, uniq_id, _), vector in zip(batch, values):
+        price = store.price(pos)
+        vectors.append({
+            "id": uniq_id,
+            "values": vector,
+            "metadata": {
+                "title": store.titles[pos] or "",
+                "description": store.descriptions[pos] or "",
+                "price": price if price is not None else 0.0,
+                "brand": brands[pos],
+                "categories": store.categories(pos),
+                "image": store.images[pos] or "",
+            },
+        })
+    return vectors, {uniq_id: digest for _, uniq_id, digest in batch}
+
+
+def post_with_retry(client, path, body, max_retries=5, backoff=0.5):
+    """POST one batch, retrying throttling, 5xx and connection errors with jittered backoff"""
+    for attempt in range(max_retries + 1):
         try:
-            index.upsert(vectors=batch)
-            logger.info(f"Uploaded batch {i//batch_size + 1}/{total_batches}")
+            response = client.post(path, json=body)
+            if response.status_code == 200:
+                return
+            error = UpsertError(f"{path} returned {response.status_code}: {response.text[:200]}")
+            if response.status_code not in RETRY_STATUS:
+                raise error
+        except httpx.TransportError as e:
+            error = e
+        if attempt < max_retries:
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+    raise error
+
+
+def upsert_with_retry(client, vectors, namespace, max_retries=5, backoff=0.5):
+    post_with_retry(client, "/vectors/upsert", {"vectors": vectors, "namespace": namespace}, max_retries, backoff)
+
+
+def delete_removed(client, store, checkpoint, namespace="", batch_size=100, max_retries=5, backoff=0.5):
+    """Delete vectors of products no longer in the catalog; returns (deleted, batches that failed)"""
+    current = set(store.uniq_ids)
+    stale = [uniq_id for uniq_id in checkpoint.hashes if uniq_id not in current]
+    deleted = failed = 0
+    for offset in range(0, len(stale), batch_size):
+        ids = stale[offset:offset + batch_size]
+        try:
+            post_with_retry(client, "/vectors/delete", {"ids": ids, "namespace": namespace}, max_retries, backoff)
         except Exception as e:
-            logger.error(f"Error uploading batch {i//batch_size + 1}: {e}")
+            failed += 1
+            logger.error(f"Deleting {len(ids)} removed products failed after {max_retries} retries: {e}")
             continue
+        checkpoint.forget(ids)
+        deleted += len(ids)
+    return deleted, failed
+
 
-    # Verify upload
-    stats = index.describe_index_stats()
-    logger.info(f"Index stats: {stats}")
+def index_catalog(client, store, brands, embeddings, checkpoint, namespace="", batch_size=100, workers=8,
+                  max_retries=5, backoff=0.5, log_every=10):
+    """Upsert every pending batch with at most 2 * workers batches in flight.
 
+    Returns (vectors written, batches that failed after retrying).
+    """
+    written = 0
+    failed = 0
+    completed = 0
+    in_flight = {}
+
+    def finish(done):
+        nonlocal written, failed, completed
+        for future in done:
+            vectors, hashes = in_flight.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"Batch of {len(vectors)} vectors failed after {max_retries} retries: {e}")
+                continue
+            checkpoint.mark(hashes)
+            written += len(vectors)
+            completed += 1
+            if completed % log_every == 0:
+                logger.info(f"Upserted {written} vectors")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for vectors, hashes in pending_batches(store, brands, embeddings, checkpoint, batch_size):
+            if len(in_flight) >= 2 * workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                finish(done)
+            future = pool.submit(upsert_with_retry, client, vectors, namespace, max_retries, backoff)
+            in_flight[future] = (vectors, hashes)
+        finish(wait(in_flight).done)
+    return written, failed
+
+
+def setup_pinecone(args):
+    api_key = os.getenv('PINECONE_API_KEY', '')
+    host = args.host or os.getenv('PINECONE_INDEX_HOST')
+    if not host:
+        if not api_key:
+            raise ValueError("PINECONE_API_KEY not found in environment variables")
+        host = ensure_index(api_key, args.index_name, DIMENSION)
+    logger.info(f"Indexing into {host}")
+
+    # Load dataset
+    dataset_path = args.dataset or find_catalog_path()
+    df = read_catalog(dataset_path)
+    store = ProductStore.from_dataframe(df)
+    brands = [str(b) if pd.notnull(b) else "" for b in df['brand']]
+    logger.info(f"Loaded dataset from {dataset_path} with {len(store)} products")
+
+    # Vectors come from the embedding store, so only new or edited products get encoded
+    # and the matrix always lines up with the catalog rows
+    embeddings = embed_catalog(store, args.embedding_store, args.embeddings, workers=args.encode_workers)
+    checkpoint = Checkpoint(args.checkpoint, host, args.namespace, resume=not args.full)
+
+    client = httpx.Client(
+        base_url=host.rstrip('/'),
+        headers={"Api-Key": api_key, "Content-Type": "application/json"},
+        timeout=httpx.Timeout(args.timeout),
+        limits=httpx.Limits(max_connections=args.workers, max_keepalive_connections=args.workers),
+    )
+    try:
+        start = time.perf_counter()
+        written, failed = index_catalog(client, store, brands, embeddings, checkpoint, args.namespace,
+                                        args.batch_size, args.workers, args.max_retries, args.backoff)
+        logger.info(f"Upserted {written} vectors in {time.perf_counter() - start:.1f}s")
+        if not args.keep_removed:
+            deleted, delete_failed = delete_removed(client, store, checkpoint, args.namespace, args.batch_size,
+                                                    args.max_retries, args.backoff)
+            failed += delete_failed
+            logger.info(f"Deleted {deleted} products removed from the catalog")
+        logger.info(f"{len(checkpoint.hashes)} products indexed in total")
+
+        # Verify upload
+        try:
+            logger.info(f"Index stats: {client.post('/describe_index_stats', json={}).json()}")
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not fetch index stats: {e}")
+    finally:
+        client.close()
+        checkpoint.close()
+
+    if failed:
+        logger.error(f"{failed} batches failed; rerun to retry them")
+        sys.exit(1)
     logger.info("Pinecone setup completed successfully!")
 
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load product embeddings into Pinecone")
+    parser.add_argument("--host", help="Index data-plane URL (default: PINECONE_INDEX_HOST or control-plane lookup)")
+    parser.add_argument("--index-name", default=os.getenv('PINECONE_INDEX_NAME', INDEX_NAME))
+    parser.add_argument("--namespace", default="")
+    parser.add_argument("--dataset", help="Catalog file (default: the one the API loads)")
+    parser.add_argument("--embeddings", default='../models/text_embeddings.npy')
+    parser.add_argument("--embedding-store", default='../models/embedding_store')
+    parser.add_argument("--encode-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", default='../models/pinecone_checkpoint.json')
+    parser.add_argument("--full", action="store_true", help="Ignore the checkpoint and resend everything")
+    parser.add_argument("--keep-removed", action="store_true",
+                        help="Don't delete vectors of products that left the catalog")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--backoff", type=float, default=0.5, help="Initial retry delay in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    setup_pinecone()
+    setup_pinecone(parse_args())
@@ -0,0 +1,155 @@
+"""Generate synthetic furniture catalogs with the processed dataset's schema.
+
+Used by scripts/benchmark.py to measure the backend at catalog sizes the
+real dataset doesn't reach:
+
+    python scripts/synthetic_catalog.py --rows 100000 --output ../data/synthetic/synthetic_100000.csv
+"""
+import argparse
+import os
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.catalog import build_catalog
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (product type, category path) pairs in the shape of the Amazon breadcrumbs in the real data
+PRODUCT_TYPES = [
+    ("Sofa", ["Home & Kitchen", "Furniture", "Living Room Furniture", "Sofas & Couches"]),
+    ("Loveseat", ["Home & Kitchen", "Furniture", "Living Room Furniture", "Sofas & Couches"]),
+    ("Coffee Table", ["Home & Kitchen", "Furniture", "Living Room Furniture", "Tables", "Coffee Tables"]),
+    ("End Table", ["Home & Kitchen", "Furniture", "Living Room Furniture", "Tables", "End Tables"]),
+    ("TV Stand", ["Home & Kitchen", "Furniture", "Living Room Furniture", "Television Stands & Entertainment Centers"]),
+    ("Dining Table", ["Home & Kitchen", "Furniture", "Dining Room Furniture", "Tables"]),
+    ("Dining Chairs Set of 2", ["Home & Kitchen", "Furniture", "Dining Room Furniture", "Chairs"]),
+    ("Bar Stool", ["Home & Kitchen", "Furniture", "Game & Recreation Room Furniture", "Home Bar Furniture",
+                   "Barstools"]),
+    ("Office Chair", ["Home & Kitchen", "Furniture", "Home Office Furniture", "Home Office Chairs", "Desk Chairs"]),
+    ("Computer Desk", ["Home & Kitchen", "Furniture", "Home Office Furniture", "Home Office Desks"]),
+    ("Bookcase", ["Home & Kitchen", "Furniture", "Home Office Furniture", "Bookcases"]),
+    ("Bed Frame", ["Home & Kitchen", "Furniture", "Bedroom Furniture", "Beds, Frames & Bases", "Beds"]),
+    ("Nightstand", ["Home & Kitchen", "Furniture", "Bedroom Furniture", "Nightstands"]),
+    ("Dresser", ["Home & Kitchen", "Furniture", "Bedroom Furniture", "Dressers"]),
+    ("Shoe Rack", ["Home & Kitchen", "Storage & Organization", "Clothing & Closet Storage", "Shoe Organizers",
+                   "Free Standing Shoe Racks"]),
+    ("Storage Cabinet", ["Home & Kitchen", "Furniture", "Kitchen Furniture", "Storage Cabinets"]),
+    ("Floor Lamp", ["Home & Kitchen", "Lighting & Ceiling Fans", "Lamps & Shades", "Floor Lamps"]),
+    ("Ottoman", ["Home & Kitchen", "Furniture", "Living Room Furniture", "Ottomans"]),
+    ("Area Rug", ["Home & Kitchen", "Home Décor Products", "Area Rugs, Runners & Pads", "Area Rugs"]),
+    ("Gaming Chair", ["Home & Kitchen", "Furniture", "Game & Recreation Room Furniture", "Gaming Chairs"]),
+]
+ADJECTIVES = ["Modern", "Rustic", "Mid-Century", "Industrial", "Farmhouse", "Minimalist", "Vintage",
+              "Contemporary", "Scandinavian", "Classic", "Compact", "Ergonomic", "Foldable", "Upholstered",
+              "Adjustable", "Outdoor", "Luxury", "Small", "Large", "Convertible"]
+MATERIALS = ["Wood", "Engineered Wood", "Metal", "Iron", "Solid Wood", "Bamboo", "Plastic", "Fabric",
+             "Velvet", "Leather", "Faux Leather", "Glass", "Marble", "Rattan", "Stainless Steel", "Foam"]
+COLORS = ["Black", "White", "Grey", "Brown", "Beige", "Walnut", "Oak", "Navy Blue", "Green", "Rustic Brown",
+          "Espresso", "Natural", "Cream", "Dark Gray", "Gold", "Pink"]
+COUNTRIES = ["China", "China", "China", "USA", "Taiwan", "Vietnam", "Malaysia", "India", "Thailand"]
+FEATURES = ["easy to assemble", "sturdy frame", "space saving design", "soft cushion", "storage shelf",
+            "anti-slip feet", "water resistant surface", "high load capacity", "padded seat", "open shelves",
+            "hidden drawer", "tool-free assembly", "removable cover", "adjustable height", "cable management",
+            "perfect for small spaces", "living room", "bedroom", "home office", "entryway", "apartment",
+            "durable finish", "weight capacity up to 300 lbs", "includes all hardware", "wipe clean"]
+SYLLABLES = ["ka", "lo", "mi", "ven", "tor", "sa", "ri", "do", "zen", "fy", "mo", "ra", "lux", "nor", "hom",
+             "el", "vi", "ta", "gro", "on"]
+
+
+def _brands(rng, n_brands):
+    parts = rng.integers(len(SYLLABLES), size=(n_brands, 3))
+    names = {''.join(SYLLABLES[p] for p in row).upper() for row in parts}
+    return sorted(names)
+
+
+def generate_catalog(n_rows, seed=42):
+    """DataFrame with the columns of furniture_dataset_processed.csv.
+
+    Titles, descriptions, brands, prices and category paths follow the shape
+    of the real data, and ~10% of prices, materials and colors are missing.
+    """
+    rng = np.random.default_rng(seed)
+    brands = _brands(rng, max(50, n_rows // 200))
+
+    types = rng.integers(len(PRODUCT_TYPES), size=n_rows)
+    brand = np.asarray(brands, dtype=object)[rng.integers(len(brands), size=n_rows)]
+    adjective = np.asarray(ADJECTIVES, dtype=object)[rng.integers(len(ADJECTIVES), size=n_rows)]
+    material = np.asarray(MATERIALS, dtype=object)[rng.integers(len(MATERIALS), size=n_rows)]
+    color = np.asarray(COLORS, dtype=object)[rng.integers(len(COLORS), size=n_rows)]
+    country = np.asarray(COUNTRIES, dtype=object)[rng.integers(len(COUNTRIES), size=n_rows)]
+
+    titles = [f"{b} {a} {m} {PRODUCT_TYPES[t][0]}, {c}"
+              for b, a, m, t, c in zip(brand, adjective, material, types.tolist(), color)]
+
+    n_features = rng.integers(3, 8, size=n_rows)
+    feature_words = np.asarray(FEATURES, dtype=object)[rng.integers(len(FEATURES), size=int(n_features.sum()))]
+    bounds = np.concatenate([[0], np.cumsum(n_features)]).tolist()
+    descriptions = [f"{m} {PRODUCT_TYPES[t][0].lower()} in {c.lower()}: " + ', '.join(feature_words[s:e])
+                    for m, t, c, s, e in zip(material, types.tolist(), color, bounds[:-1], bounds[1:])]
+
+    prices = np.round(rng.lognormal(mean=4.6, sigma=0.9, size=n_rows), 2)
+    prices[rng.random(n_rows) < 0.1] = np.nan
+    price_text = [f"${p:,.2f}" if p == p else None for p in prices.tolist()]
+
+    category_text = {t: str(path) for t, (_, path) in enumerate(PRODUCT_TYPES)}
+    ids = rng.integers(0, 2 ** 63, size=(n_rows, 2), dtype=np.int64)
+    uniq_ids = [f"{a:016x}{b:016x}" for a, b in ids.tolist()]
+    images = [f"https://example.com/images/{uniq_id[:12]}.jpg" for uniq_id in uniq_ids]
+
+    material = np.where(rng.random(n_rows) < 0.1, None, material)
+    color = np.where(rng.random(n_rows) < 0.1, None, color)
+    return pd.DataFrame({
+        'title': titles,
+        'brand': brand,
+        'description': descriptions,
+        'price': price_text,
+        'categories': [category_text[t] for t in types.tolist()],
+        'images': [f"['{url} ']" for url in images],
+        'manufacturer': brand,
+        'package_dimensions': [f"{a} x {b} x {c} inches" for a, b, c in
+                               rng.integers(5, 80, size=(n_rows, 3)).tolist()],
+        'country_of_origin': country,
+        'material': material,
+        'color': color,
+        'uniq_id': uniq_ids,
+        'cleaned_image': images,
+        'parsed_categories': [category_text[t] for t in types.tolist()],
+        'cleaned_price': prices,
+        'filled_description': descriptions,
+    })
+
+
+def ensure_catalog(n_rows, directory, seed=42, fmt='arrow'):
+    """Path of a synthetic catalog with n_rows, generating (and converting) it on first use"""
+    os.makedirs(directory, exist_ok=True)
+    csv_path = os.path.join(directory, f"synthetic_{n_rows}_{seed}.csv")
+    if not os.path.exists(csv_path):
+        logger.info(f"Generating {n_rows} synthetic products")
+        tmp_path = f"{csv_path}.tmp"
+        generate_catalog(n_rows, seed).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, csv_path)
+    if fmt == 'csv':
+        return csv_path
+    arrow_path = csv_path[:-len('.csv')] + '.arrow'
+    if not os.path.exists(arrow_path):
+        build_catalog(csv_path, arrow_path)
+    return arrow_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic furniture catalog")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--output", required=True, help="CSV path")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate_catalog(args.rows, args.seed).to_csv(args.output, index=False)
+    logger.info(f"Wrote {args.rows} products to {args.output}")
+
+if __name__ == "__main__":
+    main()
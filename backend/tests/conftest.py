@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'scripts'))
+
+PRODUCTS = [
+    # uniq_id, title, description, brand, material, color, price, categories
+    ('p1', 'Black Metal Shoe Rack', 'Free standing rack for 20 pairs of shoes', 'GOYMFK', 'Metal', 'Black', '$24.99',
+     "['Home & Kitchen', 'Shoe Organizers']"),
+    ('p2', 'Oak Dining Table', 'Solid wood table that seats six', 'Acme Store', 'Wood', 'Natural Wood Grain', '$349.00',
+     "['Home & Kitchen', 'Furniture', 'Tables']"),
+    ('p3', 'Velvet Accent Chair', 'Soft chair with a metal frame, great next to a dining table', 'Acme Store',
+     'Velvet', 'White', '$129.50', "['Home & Kitchen', 'Furniture', 'Chairs']"),
+    ('p4', 'White Bookcase', 'Five shelf bookcase', 'Shelfco', 'Engineered Wood', 'Off White', '$89.99',
+     "['Home & Kitchen', 'Furniture', 'Bookcases']"),
+]
+
+
+@pytest.fixture
+def catalog():
+    """A small catalog with the processed dataset's columns"""
+    return pd.DataFrame([
+        {'uniq_id': uniq_id, 'title': title, 'description': description, 'brand': brand, 'material': material,
+         'color': color, 'price': price, 'categories': categories, 'images': '[]', 'manufacturer': None,
+         'package_dimensions': None, 'country_of_origin': 'China'}
+        for uniq_id, title, description, brand, material, color, price, categories in PRODUCTS
+    ])
+
+
+@pytest.fixture
+def client(catalog, monkeypatch):
+    """TestClient for the recommendations router serving the catalog with keyword search and a query cache"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import recommendations
+    from app.services.cache import LRUCache
+    from app.services.snapshot import CatalogSnapshot
+
+    monkeypatch.setattr(recommendations, 'snapshot', CatalogSnapshot.build(catalog, version='v1'))
+    monkeypatch.setattr(recommendations, 'description_service', None)
+    monkeypatch.setattr(recommendations, 'pinecone_index', None)
+    monkeypatch.setattr(recommendations, 'query_cache', LRUCache(maxsize=16, ttl=60))
+    recommendations.init_search_defaults()
+    app = FastAPI()
+    app.include_router(recommendations.router)
+    return TestClient(app)
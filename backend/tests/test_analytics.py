@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+from app.routers import admin, analytics, recommendations
+from app.services.catalog import catalog_fingerprint
+from app.services.snapshot import CatalogSnapshot
+
+
+def test_ingest_only_invalidates_aggregates_over_changed_columns(catalog):
+    snapshot = CatalogSnapshot.build(catalog, version='v1')
+    analytics.set_dataset(catalog, 'v1')
+    updated = snapshot.apply([{'uniq_id': 'p1', 'color': 'Red'}], version='v1+0')
+    removed = np.flatnonzero(snapshot.live & ~updated.live[:len(snapshot.live)])
+    analytics.apply_changes(snapshot.rows(removed), updated.added, 'v1+0')
+
+    assert analytics.aggregate_versions['top-brands'] == 'v1'
+    assert analytics.aggregate_versions['color-distribution'] == 'v1+0'
+    colors = {row['color']: row['count'] for row in analytics.get_color_distribution()}
+    assert colors == {'Red': 1, 'Natural Wood Grain': 1, 'White': 1, 'Off White': 1}
+    assert analytics.get_dataset_summary()['total_products'] == 4
+    assert list(analytics.df.index) == [1, 2, 3, 4]
+
+
+def test_changed_catalog_file_reloads_both_routers(catalog, tmp_path, monkeypatch):
+    path = str(tmp_path / 'catalog.csv')
+    catalog.to_csv(path, index=False)
+    monkeypatch.setenv('CATALOG_CHANGELOG_PATH', str(tmp_path / 'changes.jsonl'))
+    monkeypatch.setattr(recommendations, 'snapshot', CatalogSnapshot.build(catalog, catalog_fingerprint(path)))
+    analytics.set_dataset(catalog, recommendations.snapshot.base_version)
+
+    catalog.loc[0, 'brand'] = 'Newco'
+    catalog.to_csv(path, index=False)
+    os.utime(path, ns=(0, 0))
+    admin.reload_catalog(path)
+
+    snap = recommendations.snapshot
+    assert snap.base_version == analytics.dataset_version == catalog_fingerprint(path)
+    assert snap.row(snap.position_by_id['p1'])['brand'] == 'Newco'
+    assert {row['brand'] for row in analytics.get_top_brands()} == {'Newco', 'Acme Store', 'Shelfco'}
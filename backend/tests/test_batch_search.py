@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from app.routers import recommendations
+from app.services.snapshot import CatalogSnapshot
+from app.services.vector_search import VectorSearchEngine
+
+WORDS = ['metal', 'wood', 'white', 'chair', 'table', 'shoe']
+
+
+class WordEncoder:
+    """Stand-in sentence model: one dimension per word in WORDS, plus a constant one"""
+
+    def encode(self, texts):
+        return np.array([[text.lower().count(word) for word in WORDS] + [0.1] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def semantic_client(client, catalog, monkeypatch):
+    encoder = WordEncoder()
+    engine = VectorSearchEngine(encoder.encode(catalog['title'] + ' ' + catalog['description']), backend='numpy')
+    monkeypatch.setattr(recommendations, 'snapshot', CatalogSnapshot.build(catalog, version='v1', vector_engine=engine))
+    monkeypatch.setattr(recommendations, 'sentence_model', encoder)
+    monkeypatch.setattr(recommendations, 'hybrid_candidates', 2)
+    return client
+
+
+QUERIES = [
+    {'message': 'metal chair', 'search_mode': 'hybrid', 'top_k': 2},
+    {'message': 'white table', 'search_mode': 'hybrid', 'fusion': 'weighted', 'semantic_weight': 2, 'top_k': 0},
+    {'message': 'wood table', 'search_mode': 'hybrid', 'top_k': 3, 'brand': ['Acme Store']},
+    {'message': 'shoe rack', 'search_mode': 'semantic', 'top_k': 2},
+    {'message': 'table', 'search_mode': 'keyword', 'top_k': 0},
+]
+
+
+def test_batch_matches_single_queries(semantic_client):
+    response = semantic_client.post('/recommendations/chat/batch', json={'queries': QUERIES})
+    batch = [result['recommendations'] for result in response.json()['results']]
+
+    single = [semantic_client.post('/recommendations/chat', json=query).json()['recommendations']
+              for query in QUERIES]
+    assert batch == single
+    assert all(batch)
+
+
+def test_unfiltered_hybrid_queries_share_one_vector_search(semantic_client, monkeypatch):
+    snap = recommendations.snapshot
+    searches, keyword_batches = [], []
+    vector_search, search_batch = snap.vector_engine.search, snap.search_index.search_batch
+
+    def counting_search(query_vectors, *args, **kwargs):
+        searches.append(np.atleast_2d(query_vectors).shape[0])
+        return vector_search(query_vectors, *args, **kwargs)
+
+    def counting_batch(queries, *args, **kwargs):
+        keyword_batches.append(len(queries))
+        return search_batch(queries, *args, **kwargs)
+
+    monkeypatch.setattr(snap.vector_engine, 'search', counting_search)
+    monkeypatch.setattr(snap.search_index, 'search_batch', counting_batch)
+    semantic_client.post('/recommendations/chat/batch', json={'queries': QUERIES[:2] + QUERIES[3:]})
+
+    # One batched candidate search, then one re-score of each hybrid query's pool
+    assert searches == [3, 1, 1]
+    assert keyword_batches == [3]
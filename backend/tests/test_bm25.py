@@ -0,0 +1,23 @@
+import numpy as np
+
+from app.services.bm25 import BM25FIndex
+
+
+def test_title_match_outranks_description_match(catalog):
+    index = BM25FIndex.from_dataframe(catalog)
+    ranked = index.search("dining table", 5)
+    # The table has both words in its title; the chair only mentions them in its description
+    assert [pos for pos, _ in ranked] == [1, 2]
+    assert 0 < ranked[1][1] < ranked[0][1] <= 1
+
+
+def test_mask_limits_scored_rows(catalog):
+    index = BM25FIndex.from_dataframe(catalog)
+    mask = np.array([False, False, True, True])
+    assert [pos for pos, _ in index.search("dining table", 5, mask=mask)] == [2]
+
+
+def test_batch_search_matches_single_queries(catalog):
+    index = BM25FIndex.from_dataframe(catalog)
+    queries = ["shoe rack", "white bookcase", "no such words"]
+    assert index.search_batch(queries, [3, 3, 3]) == [index.search(query, 3) for query in queries]
@@ -0,0 +1,39 @@
+import numpy as np
+
+from app.services.snapshot import CatalogSnapshot
+
+
+def test_parse_takes_price_and_phrased_attributes(catalog):
+    attributes = CatalogSnapshot.build(catalog).attributes
+    assert attributes.parse("Metal shoe rack under $50 in black") == \
+        ("metal shoe rack", {'max_price': 50.0, 'color': ['black']})
+    assert attributes.parse("chair by acme between $100 and $200") == \
+        ("chair", {'min_price': 100.0, 'max_price': 200.0, 'brand': ['acme']})
+
+
+def test_in_goes_to_the_field_that_stores_the_value(catalog):
+    # "wood" is a material and also a word of the color "natural wood grain"
+    attributes = CatalogSnapshot.build(catalog).attributes
+    assert attributes.parse("table in wood") == ("table", {'material': ['wood']})
+    assert attributes.parse("bookcase in white") == ("bookcase", {'color': ['white']})
+
+
+def test_unknown_values_and_sizes_stay_in_the_query(catalog):
+    attributes = CatalogSnapshot.build(catalog).attributes
+    assert attributes.parse("rack in the hallway for 20 pairs") == ("rack in the hallway for 20 pairs", {})
+    assert attributes.parse("shelf up to 300 lbs") == ("shelf up to 300 lbs", {})
+
+
+def test_mask_matches_whole_words_and_prices(catalog):
+    attributes = CatalogSnapshot.build(catalog).attributes
+    assert np.flatnonzero(attributes.mask({'color': ['white']})).tolist() == [2, 3]
+    assert np.flatnonzero(attributes.mask({'color': ['white'], 'max_price': 100})).tolist() == [3]
+    assert np.flatnonzero(attributes.mask({'category': ['furniture']})).tolist() == [1, 2, 3]
+    assert attributes.mask({}) is None
+
+
+def test_extended_index_learns_new_values_without_changing_the_original(catalog):
+    snapshot = CatalogSnapshot.build(catalog)
+    updated = snapshot.apply([{'uniq_id': 'p5', 'title': 'Teak Bench', 'material': 'Teak', 'color': 'Brown'}])
+    assert updated.attributes.parse("bench in teak") == ("bench", {'material': ['teak']})
+    assert snapshot.attributes.parse("bench in teak") == ("bench in teak", {})
@@ -0,0 +1,35 @@
+import pytest
+
+from app.services.fusion import display_scores, fuse
+
+KEYWORD = [(1, 9.0), (2, 5.0), (3, 1.0)]
+SEMANTIC = [(2, 0.8), (4, 0.7), (1, 0.3)]
+
+
+def test_rrf_rewards_positions_ranked_by_both_lists():
+    fused = fuse([KEYWORD, SEMANTIC], [1, 1], 'rrf', k=60)
+    assert [pos for pos, _ in fused] == [2, 1, 4, 3]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_weighted_fusion_normalizes_each_list():
+    fused = fuse([KEYWORD, SEMANTIC], [1, 1], 'weighted')
+    assert fused == [(2, pytest.approx(1.5)), (1, pytest.approx(1.0)), (4, pytest.approx(0.8)),
+                     (3, pytest.approx(0.0))]
+
+
+def test_zero_weight_ignores_a_list():
+    assert [pos for pos, _ in fuse([KEYWORD, SEMANTIC], [1, 0], top_k=2)] == [1, 2]
+
+
+@pytest.mark.parametrize('method', ['rrf', 'weighted'])
+def test_display_scores_are_between_0_and_1_in_fused_order(method):
+    fused = fuse([KEYWORD, SEMANTIC], [2, 1], method)
+    shown = display_scores(fused, [KEYWORD, SEMANTIC], [2, 1], method)
+    assert [pos for pos, _ in shown] == [pos for pos, _ in fused]
+    assert all(0 <= score <= 1 for _, score in shown)
+
+
+def test_display_score_is_1_for_first_in_every_list():
+    fused = fuse([[(7, 3.0)], [(7, 0.9)]], [1, 1], 'rrf')
+    assert display_scores(fused, [[(7, 3.0)], [(7, 0.9)]], [1, 1], 'rrf') == [(7, pytest.approx(1.0))]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.routers import recommendations
+from app.services.image_search import ImageEmbeddingIndex
+
+# Product image vectors: p1..p4 along their own axis
+VECTORS = np.eye(4, dtype=np.float32)
+
+
+class Encoder:
+    """Stands in for ImageEncoderPool: b'p<n>' photos look like product n's image"""
+
+    async def encode(self, data):
+        if not data.startswith(b'p'):
+            raise ValueError("Unreadable image")
+        vector = VECTORS[int(data[1:]) - 1] * 2
+        vector[2] = 1
+        return vector
+
+
+@pytest.fixture
+def image_client(client, tmp_path, monkeypatch):
+    ImageEmbeddingIndex.save(str(tmp_path), VECTORS, ['p1', 'p2', 'p3', 'p4'], ['a', 'b', 'c', 'd'], 'model')
+    monkeypatch.setattr(recommendations, 'image_index', ImageEmbeddingIndex.load(str(tmp_path), search=True))
+    monkeypatch.setattr(recommendations, 'image_encoder', Encoder())
+    return client
+
+
+def search(client, photo, **params):
+    return client.post('/recommendations/image-search', params=params, files={'file': ('room.jpg', photo)})
+
+
+def test_photo_finds_products_with_similar_images(image_client):
+    response = search(image_client, b'p2', top_k=2)
+    assert response.status_code == 200
+    assert [product['uniq_id'] for product in response.json()['recommendations']] == ['p2', 'p3']
+
+    # Deleted products drop out and the next closest image takes their place
+    snap = recommendations.snapshot
+    recommendations.set_snapshot(snap.apply(deletes=['p3']))
+    assert [product['uniq_id'] for product in search(image_client, b'p2', top_k=2).json()['recommendations']] == \
+        ['p2', 'p1']
+
+
+def test_bad_uploads_are_rejected(image_client, monkeypatch):
+    assert search(image_client, b'junk').status_code == 400
+    assert search(image_client, b'').status_code == 400
+    assert image_client.post('/recommendations/image-search').status_code == 422
+    monkeypatch.setenv('IMAGE_UPLOAD_MAX_BYTES', '2')
+    assert search(image_client, b'p12').status_code == 413
+
+
+def test_image_search_is_disabled_when_the_encoder_fails_to_load(client, tmp_path, monkeypatch):
+    ImageEmbeddingIndex.save(str(tmp_path / 'models'), VECTORS, ['p1', 'p2', 'p3', 'p4'], ['a', 'b', 'c', 'd'],
+                             'no-such/model')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(recommendations, 'image_index', None)
+    monkeypatch.setattr(recommendations, 'image_encoder', None)
+    recommendations.init_image_search()
+
+    assert recommendations.image_index is None and recommendations.image_encoder is None
+    assert search(client, b'p1').status_code == 503
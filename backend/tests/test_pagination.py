@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+
+def all_matches(client, message):
+    response = client.post('/recommendations/chat', json={'message': message, 'top_k': 0})
+    return response.json()['recommendations']
+
+
+@pytest.mark.parametrize('top_k', [0, 3])
+def test_cursor_pages_walk_the_ranked_results(client, top_k):
+    pages, cursor = [], None
+    while True:
+        body = {'message': 'table', 'top_k': top_k, 'page_size': 1, **({'cursor': cursor} if cursor else {})}
+        response = client.post('/recommendations/chat', json=body).json()
+        pages.append(response['recommendations'])
+        cursor = response['next_cursor']
+        if cursor is None:
+            break
+
+    expected = all_matches(client, 'table')
+    expected = expected[:top_k] if top_k else expected
+    assert [product for page in pages for product in page] == expected
+    assert all(len(page) == 1 for page in pages)
+
+
+def test_pages_are_sliced_from_one_cached_ranking(client, monkeypatch):
+    from app.routers import recommendations
+
+    calls = []
+    rank = recommendations.rank_products_async
+
+    async def counting_rank(*args):
+        calls.append(args[2])
+        return await rank(*args)
+
+    monkeypatch.setattr(recommendations, 'rank_products_async', counting_rank)
+    body = {'message': 'table', 'top_k': 0, 'page_size': 1}
+    first = client.post('/recommendations/chat', json=body).json()
+    second = client.post('/recommendations/chat', json={**body, 'cursor': first['next_cursor']}).json()
+
+    assert calls == [0]
+    assert first['recommendations'] + second['recommendations'] == all_matches(client, 'table')[:2]
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.post('/recommendations/chat', json={'message': 'table', 'cursor': 'not a cursor'})
+    assert response.status_code == 400
+
+
+def test_stream_sends_one_product_per_line(client):
+    response = client.post('/recommendations/chat/stream', json={'message': 'white', 'top_k': 0})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == all_matches(client, 'white')
+    assert len(lines) == 2
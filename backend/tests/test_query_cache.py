@@ -0,0 +1,44 @@
+import time
+
+from app.routers import recommendations
+from app.services import cache
+
+
+def chat(client, message, **fields):
+    response = client.post('/recommendations/chat', json={'message': message, **fields})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_repeated_query_is_served_from_the_cache(client, monkeypatch):
+    ranked = []
+    rank = recommendations.rank_products_async
+
+    async def counting(*args, **kwargs):
+        ranked.append(args[1])
+        return await rank(*args, **kwargs)
+    monkeypatch.setattr(recommendations, 'rank_products_async', counting)
+
+    first = chat(client, 'oak table')
+    assert chat(client, 'Oak Table') == {**first, 'query': 'Oak Table'}
+    assert chat(client, 'oak table', top_k=1)['recommendations'] == first['recommendations'][:1]
+    # Case doesn't change the key; top_k does
+    assert ranked == ['oak table', 'oak table']
+    assert client.get('/recommendations/cache/stats').json()['hits'] == 1
+
+
+def test_entries_expire_after_the_ttl(client, monkeypatch):
+    chat(client, 'shoe rack')
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now + 61)
+    chat(client, 'shoe rack')
+    stats = client.get('/recommendations/cache/stats').json()
+    assert (stats['hits'], stats['expirations']) == (0, 1)
+
+
+def test_a_new_catalog_version_is_not_served_old_results(client):
+    assert chat(client, 'oak table')['recommendations'][0]['price'] == 349.0
+    snap = recommendations.snapshot
+    recommendations.set_snapshot(snap.apply([{'uniq_id': 'p2', 'price': 299.0}], version='v1+0'))
+    assert chat(client, 'oak table')['recommendations'][0]['price'] == 299.0
+    assert client.get('/recommendations/cache/stats').json()['hits'] == 0
@@ -0,0 +1,44 @@
+import re
+
+import pandas as pd
+import pytest
+
+from app.services.search_index import InvertedIndex
+
+QUERIES = ["dining table", "Oak Dining Table", "metal", "white", "chair with a metal frame", "sofa", "shoe rack"]
+
+
+def baseline_search(df, query, top_k):
+    """The per-request df.iterrows() scan the index replaces"""
+    query_lower = query.lower()
+    query_words = set(re.findall(r'\w+', query_lower))
+    matches = []
+    for idx, row in df.iterrows():
+        title = str(row['title']).lower() if pd.notnull(row['title']) else ""
+        description = str(row['description']).lower() if pd.notnull(row['description']) else ""
+        title_matches = len(query_words.intersection(re.findall(r'\w+', title)))
+        desc_matches = len(query_words.intersection(re.findall(r'\w+', description)))
+        score = (title_matches * 3 + desc_matches) / max(len(query_words), 1)
+        if query_lower in title or query_lower in description:
+            score *= 2
+        score = min(score / 10.0, 1.0)
+        if score > 0:
+            matches.append((idx, score))
+    matches.sort(key=lambda m: m[1], reverse=True)
+    return matches[:top_k] if top_k > 0 else matches
+
+
+@pytest.mark.parametrize('top_k', [2, 5, 0])
+def test_index_ranks_like_the_baseline_scan(catalog, top_k):
+    index = InvertedIndex.from_dataframe(catalog)
+    expected = [baseline_search(catalog, query, top_k) for query in QUERIES]
+    assert [index.search(query, top_k) for query in QUERIES] == expected
+    assert index.search_batch(QUERIES, [top_k] * len(QUERIES)) == expected
+
+
+def test_updated_index_ranks_like_a_scan_of_the_new_rows(catalog):
+    added = pd.DataFrame([{'title': 'Metal Dining Table', 'description': None}], index=[4])
+    index = InvertedIndex.from_dataframe(catalog).updated(added, removed=[1])
+    current = pd.concat([catalog.drop(index=[1]), added])
+    for query in QUERIES:
+        assert index.search(query, 0) == baseline_search(current, query, 0)
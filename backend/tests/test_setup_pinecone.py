@@ -0,0 +1,38 @@
+import json
+
+from setup_pinecone import Checkpoint
+
+
+def test_checkpoint_resumes_from_the_log(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(path, 'http://index', 'products')
+    checkpoint.mark({'a': 'h1', 'b': 'h2'})
+    checkpoint.mark({'c': 'h3'})
+    checkpoint.forget(['b'])
+    # Each batch is one appended line until the log is compacted
+    with open(path) as f:
+        assert len(f.read().splitlines()) == 4
+
+    resumed = Checkpoint(path, 'http://index', 'products')
+    assert resumed.hashes == {'a': 'h1', 'c': 'h3'}
+    assert resumed.is_current('a', 'h1') and not resumed.is_current('a', 'changed')
+    resumed.close()
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [
+            {'target': 'http://index|products', 'hashes': {'a': 'h1', 'c': 'h3'}}]
+
+
+def test_checkpoint_ignores_a_torn_line(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(path, 'http://index', 'products')
+    checkpoint.mark({'a': 'h1'})
+    with open(path, 'a') as f:
+        f.write('{"hashes": {"b": ')
+    assert Checkpoint(path, 'http://index', 'products').hashes == {'a': 'h1'}
+
+
+def test_checkpoint_for_another_index_starts_fresh(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    Checkpoint(path, 'http://index', 'products').mark({'a': 'h1'})
+    assert Checkpoint(path, 'http://other', 'products').hashes == {}
+    assert Checkpoint(path, 'http://index', 'products', resume=False).hashes == {}
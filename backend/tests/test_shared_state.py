@@ -0,0 +1,48 @@
+import os
+
+from app.routers import admin, analytics, recommendations
+from app.services.shared_state import build_generation, current_generation, generation_dir, read_manifest
+from app.services.snapshot import append_changelog, locked_changelog
+
+
+def test_switching_generation_serves_it_with_recorded_changes(catalog, tmp_path, monkeypatch):
+    source = str(tmp_path / 'catalog.csv')
+    catalog.to_csv(source, index=False)
+    root = str(tmp_path / 'shared')
+    changelog = str(tmp_path / 'changes.jsonl')
+    monkeypatch.setenv('CATALOG_CHANGELOG_PATH', changelog)
+    monkeypatch.setattr(recommendations, 'snapshot', None)
+
+    generation = build_generation(root, source)
+    base = read_manifest(generation_dir(root, generation))['catalog_version']
+    with locked_changelog(changelog) as log:
+        offset = append_changelog(log, base, [{'uniq_id': 'p1', 'color': 'Red'}], ['p4'])
+
+    published = []
+    set_snapshot = recommendations.set_snapshot
+
+    def record(snap):
+        published.append(snap)
+        set_snapshot(snap)
+    monkeypatch.setattr(recommendations, 'set_snapshot', record)
+    admin.switch_generation(root, generation)
+    # Only the build with the changes applied is ever served
+    [snap] = published
+    assert recommendations.snapshot is snap
+    assert recommendations.shared_generation == generation
+    assert snap.version == f"{base}+{offset}" and len(snap) == 3
+    assert snap.row(snap.position_by_id['p1'])['color'] == 'Red'
+    assert admin.changelog_offset == os.path.getsize(changelog)
+    assert analytics.get_dataset_summary()['total_products'] == 3
+    assert {row['color'] for row in analytics.get_color_distribution()} == {'Red', 'Natural Wood Grain', 'White'}
+
+
+def test_publishing_prunes_old_generations(catalog, tmp_path):
+    source = str(tmp_path / 'catalog.csv')
+    catalog.to_csv(source, index=False)
+    root = str(tmp_path / 'shared')
+    for _ in range(3):
+        generation = build_generation(root, source)
+
+    assert current_generation(root) == generation == 3
+    assert sorted(os.listdir(root)) == ['CURRENT', 'gen-000002', 'gen-000003']
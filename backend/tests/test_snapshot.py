@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+from app.services.snapshot import CatalogSnapshot, append_changelog, locked_changelog, read_changelog
+
+
+def test_apply_is_copy_on_write(catalog):
+    snapshot = CatalogSnapshot.build(catalog, version='v1')
+    updated = snapshot.apply([{'uniq_id': 'p2', 'price': 299.0}], deletes=['p4'], version='v1+0')
+
+    assert len(snapshot) == 4 and snapshot.position_by_id['p2'] == 1
+    assert len(updated) == 3 and 'p4' not in updated.position_by_id
+    pos = updated.position_by_id['p2']
+    # The update is appended and the old row tombstoned; unchanged fields carry over
+    assert pos == 4 and not updated.live[1]
+    assert updated.product_store.titles[pos] == 'Oak Dining Table'
+    assert updated.product_store.prices[pos] == 299.0
+    assert [p for p, _ in updated.search_index.search("oak", 5) if updated.live[p]] == [pos]
+    assert updated.base_version == 'v1'
+
+
+def test_changelog_replays_entries_for_the_base_version(tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    with locked_changelog(path) as log:
+        first = append_changelog(log, 'v1', [{'uniq_id': 'a', 'title': 'A', 'price': '$1'}], [])
+        append_changelog(log, 'v0', [{'uniq_id': 'old'}], [])
+        second = append_changelog(log, 'v1', [{'uniq_id': 'a', 'price': '$2'}], ['b'])
+
+    upserts, deletes, last, end = read_changelog(path, 'v1')
+    assert upserts == [{'uniq_id': 'a', 'title': 'A', 'price': '$2'}]
+    assert deletes == ['b']
+    assert (first, last) == (0, second)
+
+    # A worker that has read up to end only sees what was written after it
+    with locked_changelog(path) as log:
+        third = append_changelog(log, 'v1', [], ['a'])
+    assert third == end
+    assert read_changelog(path, 'v1', end) == ([], ['a'], third, os.path.getsize(path))
+
+
+def test_changelog_leaves_a_partly_written_line(tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    with locked_changelog(path) as log:
+        append_changelog(log, 'v1', [], ['a'])
+    _, _, _, end = read_changelog(path, 'v1')
+    with open(path, 'a') as f:
+        f.write('{"base": "v1", "upse')
+    assert read_changelog(path, 'v1', end) == ([], [], None, end)
+
+
+def test_replaying_the_changelog_rebuilds_the_same_catalog(catalog, tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    snapshot = CatalogSnapshot.build(catalog, version='v1')
+    changes = [([{'uniq_id': 'p5', 'title': 'Teak Bench'}], []), ([{'uniq_id': 'p1', 'color': 'Red'}], ['p3'])]
+    for upserts, deletes in changes:
+        with locked_changelog(path) as log:
+            append_changelog(log, 'v1', upserts, deletes)
+        snapshot = snapshot.apply(upserts, deletes)
+
+    upserts, deletes, _, _ = read_changelog(path, 'v1')
+    replayed = CatalogSnapshot.build(catalog, version='v1').apply(upserts, deletes)
+    for current in (snapshot, replayed):
+        assert [uniq_id in current.position_by_id for uniq_id in ('p1', 'p2', 'p3', 'p4', 'p5')] == \
+            [True, True, False, True, True]
+        assert current.row(current.position_by_id['p1'])['color'] == 'Red'
+
+
+def test_apply_replaces_every_row_of_a_duplicated_id(catalog):
+    catalog.loc[3, 'uniq_id'] = 'p1'
+    snapshot = CatalogSnapshot.build(catalog, version='v1')
+    assert snapshot.position_by_id['p1'] == 0 and snapshot.duplicates == {'p1': [3]}
+
+    updated = snapshot.apply([{'uniq_id': 'p1', 'color': 'Walnut', 'price': 15.0}])
+    assert updated.live.tolist() == [False, True, True, False, True]
+    assert updated.position_by_id['p1'] == 4 and updated.duplicates == {}
+    # Appended rows are found by attribute and price filters alongside the built ones
+    assert np.flatnonzero(updated.filter_mask({'color': ['walnut']})).tolist() == [4]
+    assert np.flatnonzero(updated.filter_mask({'max_price': 130})).tolist() == [2, 4]
+    assert updated.rows([2, 4])['color'].tolist() == ['White', 'Walnut']
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from app.services.vector_search import VectorSearchEngine
+
+pytest.importorskip('faiss')
+
+FAISS_OPTIONS = {'ivf': dict(ivf_nlist=8, ivf_nprobe=8), 'hnsw': dict(hnsw_ef_search=512)}
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(400, 16)).astype(np.float32), rng.normal(size=(3, 16)).astype(np.float32)
+
+
+def assert_same_results(got, expected):
+    assert [[p for p, _ in matches] for matches in got] == [[p for p, _ in matches] for matches in expected]
+    assert [[s for _, s in matches] for matches in got] == \
+        [[pytest.approx(s, abs=1e-5) for _, s in matches] for matches in expected]
+
+
+@pytest.mark.parametrize('backend', ['ivf', 'hnsw'])
+def test_faiss_backend_agrees_with_numpy(vectors, backend):
+    embeddings, queries = vectors
+    numpy_engine = VectorSearchEngine(embeddings, backend='numpy')
+    faiss_engine = VectorSearchEngine(embeddings, backend=backend, brute_force_max_rows=0, **FAISS_OPTIONS[backend])
+    assert faiss_engine.faiss_index is not None
+
+    assert_same_results(faiss_engine.search(queries, 10), numpy_engine.search(queries, 10))
+    mask = np.arange(len(embeddings)) % 3 == 0
+    assert_same_results(faiss_engine.search(queries, 10, mask=mask), numpy_engine.search(queries, 10, mask=mask))
+
+
+@pytest.mark.parametrize('backend', ['ivf', 'hnsw'])
+def test_faiss_backend_agrees_with_numpy_after_updates(vectors, backend):
+    embeddings, queries = vectors
+    added = np.vstack([queries[0] * 2, queries[1]])
+    removed = [int(p) for p, _ in VectorSearchEngine(embeddings, backend='numpy').search(queries[2], 3)[0]]
+    numpy_engine = VectorSearchEngine(embeddings, backend='numpy').updated(added, removed)
+    faiss_engine = VectorSearchEngine(embeddings, backend=backend, brute_force_max_rows=0,
+                                      **FAISS_OPTIONS[backend]).updated(added, removed)
+
+    expected = numpy_engine.search(queries, 10)
+    assert expected[0][0][0] == 400 and expected[1][0][0] == 401
+    assert not {p for p, _ in expected[2]} & set(removed)
+    assert_same_results(faiss_engine.search(queries, 10), expected)
+    mask = np.ones(len(embeddings) + 2, dtype=bool)
+    assert_same_results(faiss_engine.search(queries, 10, mask=mask), expected)
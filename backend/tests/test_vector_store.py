@@ -0,0 +1,95 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from app.routers import recommendations
+from app.services import vector_store
+from app.services.snapshot import CatalogSnapshot
+from app.services.vector_store import AsyncVectorStoreClient
+from mock_pinecone_server import create_app
+
+# p1..p4 lie at falling cosine similarity to QUERY
+VECTORS = {'p1': [1.0, 0.0], 'p2': [0.8, 0.6], 'p3': [0.5, 1.0], 'p4': [-1.0, 0.2]}
+QUERY = [1.0, 0.0]
+LOCAL = [(0, 1.0)]
+
+
+@pytest.fixture
+def server():
+    app = create_app()
+    for uniq_id, values in VECTORS.items():
+        app.state.namespaces[''][uniq_id] = (np.asarray(values, dtype=np.float32), {})
+    return app
+
+
+def client_for(server, **options):
+    return AsyncVectorStoreClient('http://mock', transport=httpx.ASGITransport(app=server), **options)
+
+
+async def local():
+    return LOCAL
+
+
+def test_slow_store_falls_back_to_local_search(server):
+    async def run():
+        client = client_for(server, timeout=0.05)
+        fast = await client.search(QUERY, 2, fallback=local)
+        server.state.latency_ms = 500
+        slow = await client.search(QUERY, 2, fallback=local)
+        await client.aclose()
+        return fast, slow
+
+    fast, slow = asyncio.run(run())
+    assert fast == ([('p1', pytest.approx(1.0)), ('p2', pytest.approx(0.8))], 'remote')
+    assert slow == (LOCAL, 'local')
+
+
+def test_circuit_opens_after_repeated_failures_and_half_opens_after_cooldown(server, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vector_store.time, 'monotonic', lambda: now[0])
+
+    async def run():
+        client = client_for(server, failure_threshold=2, cooldown=30)
+        sources = []
+
+        async def search():
+            sources.append((await client.search(QUERY, 1, fallback=local))[1])
+
+        server.state.failure_rate = 1.0
+        await search()
+        await search()
+        assert not client.available
+        # While open the store isn't queried, even once it recovers
+        server.state.failure_rate = 0.0
+        await search()
+        # Half-open after the cooldown: one failure opens the circuit again...
+        now[0] += 30
+        server.state.failure_rate = 1.0
+        await search()
+        assert not client.available
+        # ...and one success closes it
+        now[0] += 30
+        server.state.failure_rate = 0.0
+        await search()
+        await search()
+        await client.aclose()
+        return sources
+
+    assert asyncio.run(run()) == ['local', 'local', 'local', 'local', 'remote', 'remote']
+
+
+def test_remote_matches_below_the_min_score_are_dropped(server, catalog, monkeypatch):
+    snap = CatalogSnapshot.build(catalog, version='v1').apply(deletes=['p2'])
+    monkeypatch.setattr(recommendations, 'vector_min_score', 0.2)
+
+    async def run():
+        client = client_for(server)
+        monkeypatch.setattr(recommendations, 'pinecone_index', client)
+        ranked = await recommendations.remote_candidates(snap, QUERY, 4, local)
+        await client.aclose()
+        return ranked
+
+    # p2 is deleted, p4 scores below 0.2
+    assert asyncio.run(run()) == [(0, pytest.approx(1.0)), (2, pytest.approx(0.4472, abs=1e-4))]